@@ -0,0 +1,104 @@
+"""
+Memory per entry and encode/decode time of the cache formats.
+
+    python benchmarks/cache_bench.py
+    python benchmarks/cache_bench.py --sources 8 --chunk-chars 2400 --hits 50 --dim 1024
+
+Builds a response, a retrieval result and an embedding of realistic size and
+stores each one the way the old cache did (json.dumps text), as plain orjson,
+and through text_rag.codec (compressed above CACHE_COMPRESS_MIN_BYTES, float32
+embeddings, chunk texts split into shared entries). For the split formats the
+entry and the chunk bytes are reported separately: chunk entries are shared by
+every response and retrieval entry that references the same chunk, so the
+entry column is the marginal cost of one more cached query.
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+from typing import Callable, Dict, List, Tuple
+
+import orjson
+
+from text_rag import codec
+from text_rag.cache import _split_chunks
+
+WORDS = ("the service retrieves relevant passages from the index and reranks them before the model "
+         "answers using only the provided context about billing accounts regions latency quotas limits "
+         "requests tokens embeddings vectors documents sections policies configuration deployment").split()
+
+
+def text(rng: random.Random, chars: int) -> str:
+    out, size = [], 0
+    while size < chars:
+        word = rng.choice(WORDS)
+        out.append(word)
+        size += len(word) + 1
+    return " ".join(out)
+
+
+def fixtures(sources: int, chunk_chars: int, hits: int, dim: int) -> Dict[str, object]:
+    rng = random.Random(3)
+    chunks = [{"doc_id": f"doc-{i:05d}#{i % 7}", "text": text(rng, chunk_chars), "score": round(rng.random(), 6)}
+              for i in range(hits)]
+    return {
+        "response": {"answer": text(rng, 900), "sources": [dict(c) for c in chunks[:sources]], "timings": {"total": 812.4}},
+        "retrieval": [dict(c) for c in chunks],
+        "embedding": [rng.uniform(-0.1, 0.1) for _ in range(dim)],
+    }
+
+
+def timed(fn: Callable[[], object], repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1e6)
+    return statistics.median(samples)
+
+
+def formats(name: str, value) -> List[Tuple[str, Callable[[], Tuple[bytes, List[bytes]]], Callable[[bytes], object]]]:
+    def split():
+        refs, chunks = _split_chunks(value)
+        return codec.encode(refs), list(chunks.values())
+
+    def split_response():
+        refs, chunks = _split_chunks(value["sources"])
+        return codec.encode({**value, "sources": refs}), list(chunks.values())
+
+    out = [
+        ("json text", lambda: (json.dumps(value).encode(), []), lambda b: json.loads(b.decode())),
+        ("orjson", lambda: (orjson.dumps(value), []), orjson.loads),
+    ]
+    if name == "embedding":
+        out.append(("codec float32", lambda: (codec.encode_vector(value), []), codec.decode))
+    else:
+        out.append(("codec", lambda: (codec.encode(value), []), codec.decode))
+        out.append(("codec + chunk refs", split_response if name == "response" else split, codec.decode))
+    return out
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sources", type=int, default=5, help="chunks in a cached response")
+    parser.add_argument("--chunk-chars", type=int, default=1600)
+    parser.add_argument("--hits", type=int, default=30, help="chunks in a cached retrieval result")
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+
+    compressor = "zstd" if codec.zstandard is not None else "zlib"
+    print(f"compression: {compressor} above {codec.CACHE_COMPRESS_MIN_BYTES} bytes, level {codec.CACHE_COMPRESS_LEVEL}")
+    print(f"  {'value':<10} {'format':<20} {'entry B':>9} {'chunks B':>9} {'encode us':>10} {'decode us':>10}")
+    for name, value in fixtures(args.sources, args.chunk_chars, args.hits, args.dim).items():
+        for label, encode, decode in formats(name, value):
+            entry, chunks = encode()
+            encode_us = timed(encode, args.repeat)
+            decode_us = timed(lambda: [decode(entry), *map(codec.decode, chunks)], args.repeat)
+            print(f"  {name:<10} {label:<20} {len(entry):>9} {sum(map(len, chunks)):>9} "
+                  f"{encode_us:>10.1f} {decode_us:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,95 @@
+"""In-memory stand-in for the subset of redis.asyncio the cache layer uses."""
+import asyncio
+import time
+from typing import Dict, Optional, Tuple
+
+
+class InMemoryRedis:
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency_ms = latency_ms
+        self._data: Dict[str, Tuple[str, Optional[float]]] = {}
+
+    async def _rtt(self) -> None:
+        await asyncio.sleep(self.latency_ms / 1000 if self.latency_ms else 0)
+
+    def _live(self, key: str):
+        item = self._data.get(key)
+        if item is None:
+            return None
+        value, expires_at = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self._data[key]
+            return None
+        return item
+
+    async def get(self, key: str):
+        await self._rtt()
+        item = self._live(key)
+        return item[0] if item else None
+
+    def _store(self, key: str, value, ex: Optional[int]) -> None:
+        self._data[key] = (value, time.monotonic() + ex if ex else None)
+
+    async def set(self, key: str, value, ex: Optional[int] = None):
+        await self._rtt()
+        self._store(key, value, ex)
+        return True
+
+    async def mget(self, keys):
+        await self._rtt()
+        return [item[0] if item else None for item in map(self._live, keys)]
+
+    def pipeline(self, transaction: bool = True) -> "_Pipeline":
+        return _Pipeline(self)
+
+    async def ttl(self, key: str) -> int:
+        await self._rtt()
+        item = self._live(key)
+        if item is None:
+            return -2
+        return -1 if item[1] is None else int(item[1] - time.monotonic())
+
+    async def ping(self) -> bool:
+        return True
+
+    async def flushall(self) -> bool:
+        self._data.clear()
+        return True
+
+    async def close(self) -> None:
+        pass
+
+    aclose = close
+
+
+class _Pipeline:
+    """Queues set() calls and applies them in one round trip on execute()."""
+
+    def __init__(self, redis: InMemoryRedis):
+        self._redis = redis
+        self._ops = []
+
+    def set(self, key: str, value, ex: Optional[int] = None) -> "_Pipeline":
+        self._ops.append((key, value, ex))
+        return self
+
+    async def execute(self) -> list:
+        await self._redis._rtt()
+        for key, value, ex in self._ops:
+            self._redis._store(key, value, ex)
+        results = [True] * len(self._ops)
+        self._ops = []
+        return results
+
+    async def __aenter__(self) -> "_Pipeline":
+        return self
+
+    async def __aexit__(self, *exc) -> None:
+        self._ops = []
+
+
+class NullRedis(InMemoryRedis):
+    """Accepts writes and never returns them, to measure the uncached path."""
+
+    def _store(self, key: str, value, ex: Optional[int]) -> None:
+        pass
@@ -0,0 +1,239 @@
+"""
+Local stand-ins for the services handle_query depends on, for hermetic benchmarks.
+
+One aiohttp app serves all three APIs on a single port:
+    OpenSearch   POST /{index}/_search, POST /{index}/_msearch, POST /_bulk
+    OpenAI       POST /v1/embeddings, POST /v1/chat/completions (incl. stream=true)
+    Bedrock      POST /model/{model_id}/invoke
+
+Every endpoint sleeps for a configurable latency (with jitter) and fails a
+configurable fraction of requests, so provider slowness and errors can be
+injected. Responses are synthetic but shaped like the real APIs.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import re
+import time
+from dataclasses import dataclass, asdict
+
+import numpy as np
+from aiohttp import web
+
+_DOC_ID = re.compile(r"doc-\d+")
+
+
+@dataclass
+class FakeConfig:
+    dim: int = 1536
+    corpus_size: int = 5000
+    opensearch_latency_ms: float = 8.0
+    embed_latency_ms: float = 25.0
+    rerank_latency_ms: float = 400.0
+    generate_latency_ms: float = 900.0
+    token_latency_ms: float = 15.0
+    answer_tokens: int = 60
+    jitter: float = 0.2
+    error_rate: float = 0.0
+
+    def to_dict(self):
+        return asdict(self)
+
+
+class FakeServices:
+    def __init__(self, config: FakeConfig):
+        self.config = config
+        rng = np.random.default_rng(42)
+        vectors = rng.standard_normal((config.corpus_size, config.dim)).astype(np.float32)
+        self.vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        self.texts = [f"Passage {i}. " + "The quick brown fox jumps over the lazy dog. " * 12
+                      for i in range(config.corpus_size)]
+        self.requests = 0
+        self.injected_errors = 0
+
+    # ---- helpers -------------------------------------------------------
+
+    async def _delay(self, base_ms: float) -> None:
+        jitter = self.config.jitter
+        await asyncio.sleep(max(0.0, base_ms * random.uniform(1 - jitter, 1 + jitter)) / 1000)
+
+    def _fail(self) -> bool:
+        self.requests += 1
+        if random.random() < self.config.error_rate:
+            self.injected_errors += 1
+            return True
+        return False
+
+    def _error(self) -> web.Response:
+        return web.json_response({"error": {"message": "injected failure", "type": "server_error"}}, status=500)
+
+    def _embed(self, text: str, dimensions: int | None = None) -> list:
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        v = np.random.default_rng(seed).standard_normal(dimensions or self.config.dim).astype(np.float32)
+        return (v / np.linalg.norm(v)).tolist()
+
+    def _hits(self, seed_text: str, size: int, source: list | None) -> dict:
+        seed = int.from_bytes(hashlib.sha256(seed_text.encode("utf-8")).digest()[:8], "little")
+        rng = np.random.default_rng(seed)
+        size = min(size, self.config.corpus_size)
+        ids = rng.choice(self.config.corpus_size, size=size, replace=False)
+        fields = source if isinstance(source, list) else ["text", "embedding"]
+        hits = []
+        for rank, i in enumerate(ids):
+            src = {}
+            if "text" in fields:
+                src["text"] = self.texts[i]
+            for field in ("embedding", "embedding_full"):
+                if field in fields:
+                    src[field] = self.vectors[i].tolist()
+            hits.append({"_id": f"doc-{i}", "_score": round(0.95 - rank * (0.4 / max(size, 1)), 4), "_source": src})
+        return {"hits": {"hits": hits}}
+
+    def _search_response(self, body: dict) -> dict:
+        query = body.get("query", {})
+        if "knn" in query:
+            vector = query["knn"]["embedding"]["vector"]
+            seed_text = json.dumps(vector[:8])
+        else:
+            seed_text = json.dumps(query)
+        return self._hits(seed_text, body.get("size", 10), body.get("_source"))
+
+    def _answer(self) -> list:
+        return [f"token{i} " for i in range(self.config.answer_tokens)]
+
+    # ---- OpenSearch ----------------------------------------------------
+
+    async def search(self, request: web.Request) -> web.Response:
+        body = json.loads(await request.read())
+        await self._delay(self.config.opensearch_latency_ms)
+        if self._fail():
+            return web.json_response({"error": "injected failure"}, status=500)
+        return web.json_response(self._search_response(body))
+
+    async def msearch(self, request: web.Request) -> web.Response:
+        lines = [l for l in (await request.read()).split(b"\n") if l.strip()]
+        bodies = [json.loads(l) for l in lines[1::2]]
+        await self._delay(self.config.opensearch_latency_ms * (1 + 0.1 * len(bodies)))
+        if self._fail():
+            return web.json_response({"error": "injected failure"}, status=500)
+        return web.json_response({"responses": [self._search_response(b) for b in bodies]})
+
+    async def bulk(self, request: web.Request) -> web.Response:
+        lines = [l for l in (await request.read()).split(b"\n") if l.strip()]
+        await self._delay(self.config.opensearch_latency_ms * (1 + len(lines) / 1000))
+        if self._fail():
+            return web.json_response({"error": "injected failure"}, status=429)
+        items, i = [], 0
+        while i < len(lines):
+            action = json.loads(lines[i])
+            kind = next(iter(action))
+            i += 1 if kind == "delete" else 2
+            items.append({kind: {"status": 200 if kind == "delete" else 201}})
+        return web.json_response({"errors": False, "items": items})
+
+    # ---- OpenAI --------------------------------------------------------
+
+    async def embeddings(self, request: web.Request) -> web.Response:
+        body = await request.json()
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        await self._delay(self.config.embed_latency_ms)
+        if self._fail():
+            return self._error()
+        return web.json_response({
+            "object": "list",
+            "model": body.get("model"),
+            "data": [{"object": "embedding", "index": i, "embedding": self._embed(t, body.get("dimensions"))}
+                     for i, t in enumerate(inputs)],
+            "usage": {"prompt_tokens": 8 * len(inputs), "total_tokens": 8 * len(inputs)},
+        })
+
+    async def chat(self, request: web.Request) -> web.StreamResponse:
+        body = await request.json()
+        is_rerank = body.get("response_format", {}).get("type") == "json_object"
+        if is_rerank:
+            await self._delay(self.config.rerank_latency_ms)
+            if self._fail():
+                return self._error()
+            prompt = body["messages"][-1]["content"]
+            ids = list(dict.fromkeys(_DOC_ID.findall(prompt)))
+            content = json.dumps({"results": [{"id": d, "score": round(random.random(), 3)} for d in ids]})
+            return web.json_response(self._completion(body, content))
+
+        if body.get("stream"):
+            return await self._chat_stream(request, body)
+
+        await self._delay(self.config.generate_latency_ms)
+        if self._fail():
+            return self._error()
+        return web.json_response(self._completion(body, "".join(self._answer()).strip()))
+
+    def _completion(self, body: dict, content: str) -> dict:
+        return {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model"),
+            "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+            "usage": {"prompt_tokens": 100, "completion_tokens": 50, "total_tokens": 150},
+        }
+
+    async def _chat_stream(self, request: web.Request, body: dict) -> web.StreamResponse:
+        # first-token latency, then a steady token rate
+        await self._delay(self.config.generate_latency_ms / 3)
+        if self._fail():
+            return self._error()
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await resp.prepare(request)
+        for token in self._answer():
+            chunk = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body.get("model"),
+                "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}],
+            }
+            await resp.write(f"data: {json.dumps(chunk)}\n\n".encode("utf-8"))
+            await self._delay(self.config.token_latency_ms)
+        await resp.write(b"data: [DONE]\n\n")
+        await resp.write_eof()
+        return resp
+
+    # ---- Bedrock -------------------------------------------------------
+
+    async def bedrock_invoke(self, request: web.Request) -> web.Response:
+        body = json.loads(await request.read())
+        if "input" in body and isinstance(body["input"], dict):
+            await self._delay(self.config.rerank_latency_ms)
+            if self._fail():
+                return self._error()
+            return web.json_response({"scores": [random.random() for _ in body["input"].get("candidates", [])]})
+        if "maxTokens" in body:
+            await self._delay(self.config.generate_latency_ms)
+            if self._fail():
+                return self._error()
+            return web.json_response({"outputText": "".join(self._answer()).strip()})
+        await self._delay(self.config.embed_latency_ms)
+        if self._fail():
+            return self._error()
+        return web.json_response({"embedding": self._embed(body.get("inputText", ""), body.get("dimensions"))})
+
+    async def stats(self, request: web.Request) -> web.Response:
+        return web.json_response({"requests": self.requests, "injected_errors": self.injected_errors})
+
+    def app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/{index}/_search", self.search)
+        app.router.add_post("/{index}/_msearch", self.msearch)
+        app.router.add_post("/_bulk", self.bulk)
+        app.router.add_post("/v1/embeddings", self.embeddings)
+        app.router.add_post("/v1/chat/completions", self.chat)
+        app.router.add_post("/model/{model_id}/invoke", self.bedrock_invoke)
+        app.router.add_get("/_fake/stats", self.stats)
+        return app
+
+
+def serve(config: dict, port: int) -> None:
+    """Process entry point: run the fake services on 127.0.0.1:port until terminated."""
+    services = FakeServices(FakeConfig(**config))
+    web.run_app(services.app(), host="127.0.0.1", port=port, print=None, access_log=None)
@@ -0,0 +1,302 @@
+"""
+Hermetic load test of the API: every dependency runs locally, so results are
+reproducible on a laptop or in CI and comparable between commits.
+
+    python benchmarks/loadtest.py --concurrency 32 --requests 2000
+    python benchmarks/loadtest.py --endpoint /generate/stream --distinct 50 --out run.json
+    python benchmarks/loadtest.py --no-cache --generate-latency-ms 200 --compare baseline.json
+
+What runs where:
+  * fake OpenSearch / OpenAI / Bedrock (benchmarks/fakes.py) in a child process,
+    with configurable latency, jitter and error rate per service
+  * the API in this process under uvicorn, with Redis replaced by an in-memory
+    stand-in and a monitor sampling event-loop lag
+  * the load generator in a second child process, so client work does not
+    compete with the app for the event loop
+
+The report has throughput, client-side p50/p95/p99 (plus time to first byte for
+the stream endpoint), per-stage percentiles from the app's stage timers, loop
+lag and error counts. `--out` saves it as JSON with the git commit; `--compare`
+prints the change against a saved run.
+"""
+import argparse
+import asyncio
+import json
+import multiprocessing as mp
+import os
+import socket
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from pathlib import Path
+
+import fakes
+
+_HERE = Path(__file__).resolve().parent
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _wait_for_port(port: int, timeout: float = 15.0) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return
+        except OSError:
+            time.sleep(0.05)
+    raise RuntimeError(f"nothing listening on port {port} after {timeout}s")
+
+
+def _percentiles(samples):
+    if not samples:
+        return {"n": 0}
+    samples = sorted(samples)
+    pct = lambda p: samples[min(len(samples) - 1, int(round(p / 100 * (len(samples) - 1))))]
+    return {
+        "n": len(samples),
+        "mean_ms": round(1000 * sum(samples) / len(samples), 3),
+        "p50_ms": round(1000 * pct(50), 3),
+        "p95_ms": round(1000 * pct(95), 3),
+        "p99_ms": round(1000 * pct(99), 3),
+        "max_ms": round(1000 * samples[-1], 3),
+    }
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=_HERE, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def _configure_env(args, fake_port: int) -> None:
+    """Point every client at the fakes. Must run before text_rag is imported."""
+    fake_url = f"http://localhost:{fake_port}"
+    os.environ.update({
+        "APP_ENV": "localstack",
+        "LOCALSTACK_URL": fake_url,
+        "AWS_ACCESS_KEY_ID": "test",
+        "AWS_SECRET_ACCESS_KEY": "test",
+        "AWS_REGION": "us-east-1",
+        "OPENSEARCH_HOST": fake_url,
+        "OPENAI_BASE_URL": f"{fake_url}/v1",
+        "OPENAI_API_KEY": "test",
+        "OPENAI_MAX_RETRIES": "0",
+        "MODEL_PROVIDER": args.provider,
+        "RETRIEVAL_BACKEND": "opensearch",
+        "CACHE_VERSION": f"loadtest-{os.getpid()}",
+    })
+    if args.no_cache:
+        os.environ.update({
+            "SEMANTIC_CACHE_ENABLED": "false",
+            "SINGLE_FLIGHT_ENABLED": "false",
+            "L1_CACHE_MAX_BYTES": "0",
+        })
+
+
+# ---- load generator (child process) ------------------------------------
+
+async def _drive(app_url: str, endpoint: str, concurrency: int, total: int, distinct: int, k, n,
+                 label: str = "load test"):
+    import aiohttp
+
+    latencies, first_byte, statuses = [], [], defaultdict(int)
+    counter = iter(range(total))
+
+    async def client(session):
+        for i in counter:
+            body = {"query": f"{label} question number {i % distinct}"}
+            if k:
+                body["k"] = k
+            if n:
+                body["n"] = n
+            started = time.perf_counter()
+            try:
+                async with session.post(app_url + endpoint, json=body) as resp:
+                    first = None
+                    async for _ in resp.content.iter_any():
+                        if first is None:
+                            first = time.perf_counter() - started
+                    statuses[str(resp.status)] += 1
+                    if resp.status == 200:
+                        latencies.append(time.perf_counter() - started)
+                        first_byte.append(first or 0.0)
+            except Exception as e:
+                statuses[type(e).__name__] += 1
+
+    connector = aiohttp.TCPConnector(limit=concurrency)
+    timeout = aiohttp.ClientTimeout(total=120)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(client(session) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+    return {"elapsed_s": elapsed, "latencies": latencies, "first_byte": first_byte, "statuses": dict(statuses)}
+
+
+def _load_process(conn, app_url, endpoint, concurrency, total, distinct, k, n, label="load test"):
+    conn.send(asyncio.run(_drive(app_url, endpoint, concurrency, total, distinct, k, n, label)))
+    conn.close()
+
+
+# ---- app under test (this process) --------------------------------------
+
+async def _run(args, app_port: int) -> dict:
+    import uvicorn
+    from fake_redis import InMemoryRedis, NullRedis
+    from text_rag import cache
+    from text_rag.api import app
+    from text_rag.logger import configure as configure_logging
+    from text_rag.metrics import add_stage_listener, remove_stage_listener
+
+    configure_logging(args.log_level)
+
+    cache._redis = (NullRedis if args.no_cache else InMemoryRedis)(latency_ms=args.redis_latency_ms)
+
+    stage_samples = defaultdict(list)
+    listener = lambda stage, seconds: stage_samples[stage].append(seconds)
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=app_port, log_level="warning",
+                                           access_log=False, lifespan="on"))
+    serve_task = asyncio.create_task(server.serve())
+    while not server.started:
+        if serve_task.done():
+            serve_task.result()
+        await asyncio.sleep(0.05)
+
+    lag = []
+    stop = asyncio.Event()
+
+    async def monitor_loop_lag(interval=0.05):
+        while not stop.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(interval)
+            lag.append(max(0.0, time.perf_counter() - started - interval))
+
+    app_url = f"http://127.0.0.1:{app_port}"
+    loop = asyncio.get_running_loop()
+    ctx = mp.get_context("spawn")
+
+    if args.warmup:
+        parent, child = ctx.Pipe(duplex=False)
+        proc = ctx.Process(target=_load_process, args=(child, app_url, args.endpoint, min(args.concurrency, 8),
+                                                       args.warmup, args.distinct, args.k, args.n, "warmup"))
+        proc.start()
+        await loop.run_in_executor(None, parent.recv)
+        await loop.run_in_executor(None, proc.join)
+
+    add_stage_listener(listener)
+    lag_task = asyncio.create_task(monitor_loop_lag())
+    parent, child = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=_load_process, args=(child, app_url, args.endpoint, args.concurrency,
+                                                   args.requests, args.distinct, args.k, args.n))
+    proc.start()
+    load = await loop.run_in_executor(None, parent.recv)
+    await loop.run_in_executor(None, proc.join)
+    stop.set()
+    await lag_task
+    remove_stage_listener(listener)
+
+    server.should_exit = True
+    await serve_task
+
+    ok = len(load["latencies"])
+    report = {
+        "commit": _git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "config": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "throughput_rps": round(ok / load["elapsed_s"], 2) if load["elapsed_s"] else 0.0,
+        "elapsed_s": round(load["elapsed_s"], 3),
+        "statuses": load["statuses"],
+        "errors": sum(v for s, v in load["statuses"].items() if s != "200"),
+        "latency": _percentiles(load["latencies"]),
+        "stages": {stage: _percentiles(samples) for stage, samples in sorted(stage_samples.items())},
+        "loop_lag": _percentiles(lag),
+    }
+    if args.endpoint == "/generate/stream":
+        report["first_byte"] = _percentiles(load["first_byte"])
+    return report
+
+
+def _print_report(report: dict, baseline: dict | None = None) -> None:
+    def row(name, stats, base):
+        if not stats.get("n"):
+            return
+        cells = []
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            cell = f"{stats[key]:>10.2f}"
+            if base and base.get(key):
+                cell += f" ({100 * (stats[key] - base[key]) / base[key]:+6.1f}%)"
+            cells.append(cell)
+        print(f"  {name:<16}{stats['n']:>7}  " + "  ".join(cells))
+
+    baseline = baseline or {}
+    line = f"throughput: {report['throughput_rps']} req/s   errors: {report['errors']}   statuses: {report['statuses']}"
+    if baseline.get("throughput_rps"):
+        base = baseline["throughput_rps"]
+        line += f"   (baseline {base} req/s, {100 * (report['throughput_rps'] - base) / base:+.1f}%)"
+    print(line)
+    print(f"  {'':<16}{'n':>7}  {'p50 ms':>10}  {'p95 ms':>10}  {'p99 ms':>10}")
+    row("client", report["latency"], baseline.get("latency"))
+    if "first_byte" in report:
+        row("first_byte", report["first_byte"], baseline.get("first_byte"))
+    for stage, stats in report["stages"].items():
+        row(stage, stats, baseline.get("stages", {}).get(stage))
+    row("loop_lag", report["loop_lag"], baseline.get("loop_lag"))
+
+
+def main():
+    defaults = fakes.FakeConfig()
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--endpoint", default="/generate", choices=["/generate", "/generate/stream"])
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--warmup", type=int, default=20, help="requests sent before measuring (0 to skip)")
+    parser.add_argument("--distinct", type=int, default=10 ** 9,
+                        help="number of distinct queries; lower values exercise the caches")
+    parser.add_argument("--k", type=int, default=None)
+    parser.add_argument("--n", type=int, default=None)
+    parser.add_argument("--provider", default="openai", choices=["openai", "bedrock"],
+                        help="bedrock has no fake response stream, so use openai for /generate/stream")
+    parser.add_argument("--no-cache", action="store_true", help="disable L1, Redis, semantic cache and single-flight")
+    parser.add_argument("--redis-latency-ms", type=float, default=0.5)
+    parser.add_argument("--log-level", default="warning")
+    for field, value in defaults.to_dict().items():
+        parser.add_argument(f"--{field.replace('_', '-')}", type=type(value), default=value)
+    parser.add_argument("--out", help="write the report as JSON to this path")
+    parser.add_argument("--compare", help="a previous --out report to diff against")
+    args = parser.parse_args()
+
+    fake_config = {field: getattr(args, field) for field in defaults.to_dict()}
+    fake_port, app_port = _free_port(), _free_port()
+    ctx = mp.get_context("spawn")
+    fake_proc = ctx.Process(target=fakes.serve, args=(fake_config, fake_port), daemon=True)
+    fake_proc.start()
+    try:
+        _wait_for_port(fake_port)
+        _configure_env(args, fake_port)
+        report = asyncio.run(_run(args, app_port))
+    finally:
+        fake_proc.terminate()
+        fake_proc.join()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print(f"comparing against {args.compare} (commit {baseline.get('commit')})")
+    _print_report(report, baseline)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"wrote {args.out}")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
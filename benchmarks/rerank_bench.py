@@ -0,0 +1,91 @@
+"""
+Latency comparison of the local MMR reranker against the LLM reranker.
+
+    python benchmarks/rerank_bench.py --k 30 --top-n 5 --iterations 200
+    python benchmarks/rerank_bench.py --llm --iterations 5   # also calls RERANK_MODEL (needs credentials)
+
+Candidates are synthetic: random unit vectors with filler text, so the numbers
+measure reranker overhead, not ranking quality.
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import time
+
+import numpy as np
+
+from text_rag.reranker import local_reranker, openai_reranker, bedrock_reranker
+from text_rag.config import MODEL_PROVIDER
+
+
+def make_candidates(k: int, dim: int, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    query = rng.standard_normal(dim).astype(np.float32)
+    candidates = []
+    for i in range(k):
+        vec = query + rng.standard_normal(dim).astype(np.float32) * rng.uniform(0.5, 3.0)
+        candidates.append({
+            "doc_id": f"doc-{i}",
+            "text": f"Synthetic passage {i}. " + "lorem ipsum dolor sit amet " * 40,
+            "score": float(rng.uniform(0.5, 1.0)),
+            "embedding": vec.tolist(),
+        })
+    return query.tolist(), candidates
+
+
+def summarize(samples_ms):
+    samples_ms = sorted(samples_ms)
+    pct = lambda p: samples_ms[min(len(samples_ms) - 1, int(round(p / 100 * (len(samples_ms) - 1))))]
+    return {
+        "n": len(samples_ms),
+        "mean_ms": round(statistics.fmean(samples_ms), 3),
+        "p50_ms": round(pct(50), 3),
+        "p95_ms": round(pct(95), 3),
+        "p99_ms": round(pct(99), 3),
+    }
+
+
+def bench_local(query, candidates, top_n, iterations):
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        local_reranker(query, candidates, top_n)
+        samples.append((time.perf_counter() - start) * 1000)
+    return summarize(samples)
+
+
+async def bench_llm(query_text, candidates, top_n, iterations):
+    reranker = openai_reranker if MODEL_PROVIDER == "openai" else bedrock_reranker
+    slim = [{k: v for k, v in c.items() if k != "embedding"} for c in candidates]
+    samples, failures = [], 0
+    for _ in range(iterations):
+        start = time.perf_counter()
+        try:
+            await reranker(query_text, [dict(c) for c in slim], top_n)
+        except Exception:
+            failures += 1
+        samples.append((time.perf_counter() - start) * 1000)
+    return {**summarize(samples), "failures": failures}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--k", type=int, default=30, help="number of candidates")
+    parser.add_argument("--top-n", type=int, default=5)
+    parser.add_argument("--dim", type=int, default=1536)
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--llm", action="store_true", help="also benchmark the configured LLM reranker")
+    args = parser.parse_args()
+
+    query, candidates = make_candidates(args.k, args.dim)
+    results = {"k": args.k, "top_n": args.top_n, "dim": args.dim,
+               "local_mmr": bench_local(query, candidates, args.top_n, args.iterations)}
+    if args.llm:
+        results["llm"] = asyncio.run(bench_llm("synthetic benchmark query", candidates, args.top_n,
+                                               args.iterations))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,170 @@
+"""
+Recall/latency/size trade-off of reduced-dimension and int8 kNN vectors.
+
+    python benchmarks/vector_bench.py                                  # synthetic corpus
+    python benchmarks/vector_bench.py --corpus export.jsonl --dims 1536,1024,512,256
+    python benchmarks/vector_bench.py --oversample 0,2,4 --k 30 --out vectors.json
+
+For every (dimension, data type, rescore oversample) setting the corpus and the
+queries are reduced and quantized the way the service does it (utils.quantize_int8),
+searched exactly, and compared with an exact float search at full dimension:
+
+  * recall@k     overlap with the full-precision top-k
+  * p50/p95 ms   per-query brute-force search time, including the rescoring pass.
+                 numpy has no int8 kernels, so int8 is searched as float32 and its
+                 time reflects the dimension and oversampling only; on a cluster the
+                 byte index gains from being 4x smaller in memory
+  * MB           vector storage for the corpus
+
+Reduced dimensions are taken by truncating and re-normalising the full vectors,
+which is how Matryoshka-trained models (OpenAI text-embedding-3) shorten them. For
+other models (Titan v2), export the corpus at each dimension and run once per export.
+
+The corpus is a JSONL of {"doc_id", "embedding"} records (e.g. the file used for
+`text_rag.local_index build --from-jsonl`). Queries are corpus vectors with noise
+added unless --queries gives a JSONL of {"embedding"} records.
+"""
+import argparse
+import json
+import statistics
+import time
+
+import numpy as np
+
+from text_rag.utils import quantize_int8
+
+
+def load_vectors(path: str, limit: int) -> np.ndarray:
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                vec = json.loads(line).get("embedding")
+                if vec:
+                    rows.append(vec)
+            if len(rows) >= limit:
+                break
+    return np.asarray(rows, dtype=np.float32)
+
+
+def synthetic_corpus(size: int, dim: int, clusters: int = 64, seed: int = 7) -> np.ndarray:
+    """
+    Clustered vectors whose variance decays along the dimensions, like embeddings
+    trained for truncation; isotropic random vectors would make every setting look equally bad.
+    """
+    rng = np.random.default_rng(seed)
+    decay = ((1 + np.arange(dim) / 32) ** -0.75).astype(np.float32)
+    centers = rng.standard_normal((clusters, dim)).astype(np.float32) * decay
+    assign = rng.integers(clusters, size=size)
+    return centers[assign] + rng.standard_normal((size, dim)).astype(np.float32) * decay * 0.6
+
+
+def noisy_queries(corpus: np.ndarray, count: int, seed: int = 11) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    picks = corpus[rng.choice(len(corpus), size=count, replace=False)]
+    return picks + rng.standard_normal(picks.shape).astype(np.float32) * 0.3
+
+
+def normalize(x: np.ndarray) -> np.ndarray:
+    return x / np.maximum(np.linalg.norm(x, axis=-1, keepdims=True), 1e-12)
+
+
+def reduce(x: np.ndarray, dim: int) -> np.ndarray:
+    return normalize(x[..., :dim])
+
+
+def quantize(x: np.ndarray) -> np.ndarray:
+    return np.asarray([quantize_int8(row) for row in x], dtype=np.int8)
+
+
+def top_k(matrix: np.ndarray, query: np.ndarray, k: int) -> np.ndarray:
+    scores = matrix @ query
+    k = min(k, len(scores))
+    idx = np.argpartition(-scores, k - 1)[:k]
+    return idx[np.argsort(-scores[idx])]
+
+
+def run_setting(corpus: np.ndarray, queries: np.ndarray, truth: list, dim: int, data_type: str,
+                oversample: float, k: int) -> dict:
+    full = reduce(corpus, dim)
+    qs = reduce(queries, dim)
+    if data_type == "int8":
+        # int8 values are exact in float32, and so are their dot products at these dimensions
+        index = quantize(full).astype(np.float32)
+        q_index = quantize(qs).astype(np.float32)
+        bytes_per_vector = dim
+    else:
+        index, q_index = full, qs
+        bytes_per_vector = dim * 4
+    rescore = oversample > 1
+    fetch = int(np.ceil(k * oversample)) if rescore else k
+
+    samples, recalls = [], []
+    for q, qi, expected in zip(qs, q_index, truth):
+        started = time.perf_counter()
+        found = top_k(index, qi, fetch)
+        if rescore:
+            found = found[np.argsort(-(full[found] @ q))][:k]
+        samples.append((time.perf_counter() - started) * 1000)
+        recalls.append(len(set(found.tolist()) & expected) / len(expected))
+
+    samples.sort()
+    storage = bytes_per_vector + (dim * 4 if rescore and data_type == "int8" else 0)
+    return {
+        "dim": dim,
+        "type": data_type,
+        "oversample": oversample if rescore else 0,
+        "recall": round(statistics.fmean(recalls), 4),
+        "p50_ms": round(samples[len(samples) // 2], 3),
+        "p95_ms": round(samples[min(len(samples) - 1, int(0.95 * len(samples)))], 3),
+        # the kNN structure holds the searched vectors; the float copy for rescoring lives in _source
+        "knn_mb": round(len(corpus) * bytes_per_vector / 2 ** 20, 2),
+        "stored_mb": round(len(corpus) * storage / 2 ** 20, 2),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", help="JSONL of {doc_id, embedding}; synthetic if omitted")
+    parser.add_argument("--queries", help="JSONL of {embedding}; noisy corpus vectors if omitted")
+    parser.add_argument("--corpus-size", type=int, default=20000, help="synthetic size, or max records read")
+    parser.add_argument("--dim", type=int, default=1024, help="full dimension of the synthetic corpus")
+    parser.add_argument("--dims", default="1024,512,256", help="dimensions to compare (<= the full dimension)")
+    parser.add_argument("--types", default="float,int8")
+    parser.add_argument("--oversample", default="0,3", help="rescore oversample factors; 0 or 1 = no rescoring")
+    parser.add_argument("--queries-count", type=int, default=200)
+    parser.add_argument("--k", type=int, default=30)
+    parser.add_argument("--out", help="write the results as JSON to this path")
+    args = parser.parse_args()
+
+    corpus = load_vectors(args.corpus, args.corpus_size) if args.corpus else synthetic_corpus(args.corpus_size, args.dim)
+    queries = (load_vectors(args.queries, args.queries_count) if args.queries
+               else noisy_queries(corpus, min(args.queries_count, len(corpus))))
+    full_dim = corpus.shape[1]
+    corpus_full, queries_full = normalize(corpus), normalize(queries)
+    truth = [set(top_k(corpus_full, q, args.k).tolist()) for q in queries_full]
+
+    results = []
+    for dim in (int(d) for d in args.dims.split(",")):
+        if dim > full_dim:
+            print(f"skipping dim {dim} > corpus dimension {full_dim}")
+            continue
+        for data_type in args.types.split(","):
+            for oversample in (float(o) for o in args.oversample.split(",")):
+                if oversample > 1 and data_type == "float":
+                    continue  # the float copy is the searched vector; nothing to rescore
+                results.append(run_setting(corpus, queries, truth, dim, data_type, oversample, args.k))
+
+    print(f"corpus={len(corpus)} dim={full_dim} queries={len(queries)} k={args.k}")
+    print(f"  {'dim':>5} {'type':>6} {'rescore':>8} {'recall':>8} {'p50 ms':>9} {'p95 ms':>9} {'knn MB':>9} {'stored MB':>10}")
+    for r in results:
+        rescore = f"x{r['oversample']:g}" if r["oversample"] else "-"
+        print(f"  {r['dim']:>5} {r['type']:>6} {rescore:>8} {r['recall']:>8.4f} {r['p50_ms']:>9.3f} "
+              f"{r['p95_ms']:>9.3f} {r['knn_mb']:>9.2f} {r['stored_mb']:>10.2f}")
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            json.dump({"corpus": len(corpus), "dim": full_dim, "k": args.k, "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+from dataclasses import dataclass
+from typing import Dict, List
+
+from text_rag.config import (
+    ADAPTIVE_RETRIEVAL,
+    RETRIEVAL_MODE,
+    ADAPTIVE_CONFIDENT_SCORE,
+    ADAPTIVE_CONFIDENT_MARGIN,
+    ADAPTIVE_CONFIDENT_N,
+    ADAPTIVE_AMBIGUOUS_SPREAD,
+    ADAPTIVE_WIDEN_FACTOR,
+    ADAPTIVE_MAX_K,
+)
+from text_rag.metrics import ADAPTIVE_DECISIONS
+from text_rag.logger import get_logger
+
+logger = get_logger("text_rag.adaptive")
+
+
+@dataclass
+class RetrievalPlan:
+    decision: str  # "confident", "ambiguous" or "default"
+    k: int
+    n: int
+    rerank: bool
+    inputs: Dict[str, float]
+
+
+def plan_retrieval(hits: List[dict], k: int, n: int) -> RetrievalPlan:
+    """
+    Decide how much work a query needs from its kNN score distribution.
+
+    - confident: the top hit scores at least ADAPTIVE_CONFIDENT_SCORE, leads the
+      runner-up by ADAPTIVE_CONFIDENT_MARGIN and no more than ADAPTIVE_CONFIDENT_N hits
+      clear that score; skip rerank and generate from the top ADAPTIVE_CONFIDENT_N hits.
+    - ambiguous: all k slots are filled and scores are flat from first to last
+      (spread <= ADAPTIVE_AMBIGUOUS_SPREAD), so relevant hits may lie past k; retrieve
+      again with k * ADAPTIVE_WIDEN_FACTOR (up to ADAPTIVE_MAX_K) before reranking.
+    - default: rerank the k hits as usual.
+
+    Only kNN scores are comparable across queries, so hybrid (RRF) retrieval and
+    ADAPTIVE_RETRIEVAL=false always get the default plan.
+    """
+    scores = [h.get("score") or 0.0 for h in hits]
+    inputs = {
+        "hits": len(scores),
+        "top1": round(scores[0], 4) if scores else 0.0,
+        "margin": round(scores[0] - scores[1], 4) if len(scores) > 1 else 0.0,
+        "spread": round(scores[0] - scores[-1], 4) if scores else 0.0,
+        "above": sum(1 for s in scores if s >= ADAPTIVE_CONFIDENT_SCORE),
+    }
+    plan = RetrievalPlan("default", k, n, True, inputs)
+    if not ADAPTIVE_RETRIEVAL or RETRIEVAL_MODE != "knn" or not scores:
+        return plan
+
+    dominant = len(scores) == 1 or inputs["margin"] >= ADAPTIVE_CONFIDENT_MARGIN
+    if inputs["top1"] >= ADAPTIVE_CONFIDENT_SCORE and dominant and inputs["above"] <= ADAPTIVE_CONFIDENT_N:
+        plan = RetrievalPlan("confident", k, min(n, ADAPTIVE_CONFIDENT_N), False, inputs)
+    elif len(scores) >= k and inputs["spread"] <= ADAPTIVE_AMBIGUOUS_SPREAD and k < ADAPTIVE_MAX_K:
+        plan = RetrievalPlan("ambiguous", min(ADAPTIVE_MAX_K, k * ADAPTIVE_WIDEN_FACTOR), n, True, inputs)
+
+    ADAPTIVE_DECISIONS.labels(plan.decision).inc()
+    logger.info("adaptive retrieval", decision=plan.decision, k=plan.k, n=plan.n, rerank=plan.rerank,
+                requested_k=k, requested_n=n, **inputs)
+    return plan
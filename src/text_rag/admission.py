@@ -0,0 +1,128 @@
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, Optional
+
+from text_rag.config import (
+    MAX_CONCURRENT_TASKS,
+    ADMISSION_MAX_QUEUE,
+    ADMISSION_QUEUE_TIMEOUT,
+    STAGE_CONCURRENCY_EMBEDDING,
+    STAGE_CONCURRENCY_SEARCH,
+    STAGE_CONCURRENCY_RERANK,
+    STAGE_CONCURRENCY_GENERATION,
+)
+from text_rag.metrics import QUEUE_DEPTH, SHED
+from text_rag.logger import get_logger
+
+logger = get_logger("text_rag.admission")
+
+
+class Overloaded(Exception):
+    """Raised when a limiter sheds a caller; `retry_after` is a hint in whole seconds."""
+
+    def __init__(self, limiter: str, retry_after: int):
+        super().__init__(f"{limiter} overloaded, retry after {retry_after}s")
+        self.limiter = limiter
+        self.retry_after = retry_after
+
+
+class Limiter:
+    """
+    Concurrency limit with a bounded wait queue.
+
+    Up to `limit` callers hold a slot at once. With `max_queue` set, at most that many
+    may wait for one and any further caller is rejected immediately with `Overloaded`;
+    a waiter that does not get a slot within `queue_timeout` is rejected too. Without
+    `max_queue` callers always wait, which is what the per-stage limits want: a request
+    that was already admitted should not be dropped half way through the pipeline.
+    """
+
+    def __init__(self, name: str, limit: int, max_queue: Optional[int] = None,
+                 queue_timeout: Optional[float] = None):
+        self.name = name
+        self.limit = limit
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(limit)
+        self.in_flight = 0
+        self.waiting = 0
+        self.admitted = 0
+        self.rejected = 0
+        # moving average of how long a slot is held, for the Retry-After estimate
+        self._avg_hold = 1.0
+
+    def retry_after(self) -> int:
+        """Seconds until the current queue has likely drained, at least 1."""
+        return max(1, math.ceil(self._avg_hold * (self.waiting + 1) / self.limit))
+
+    def _reject(self) -> Overloaded:
+        self.rejected += 1
+        SHED.labels(self.name).inc()
+        return Overloaded(self.name, self.retry_after())
+
+    async def acquire(self) -> float:
+        # counted rather than read off the semaphore: callers between the check and the acquire
+        # have not taken a slot yet, so the semaphore alone would let a burst overrun the queue
+        if self.max_queue is not None and self.in_flight + self.waiting >= self.limit + self.max_queue:
+            logger.warning(f"{self.name} queue full ({self.waiting} waiting), shedding")
+            raise self._reject()
+
+        self.waiting += 1
+        QUEUE_DEPTH.labels(self.name).set(self.waiting)
+        try:
+            if self.queue_timeout:
+                await asyncio.wait_for(self._semaphore.acquire(), self.queue_timeout)
+            else:
+                await self._semaphore.acquire()
+        except asyncio.TimeoutError:
+            logger.warning(f"{self.name} slot not free within {self.queue_timeout}s, shedding")
+            raise self._reject() from None
+        finally:
+            self.waiting -= 1
+            QUEUE_DEPTH.labels(self.name).set(self.waiting)
+
+        self.in_flight += 1
+        self.admitted += 1
+        return time.monotonic()
+
+    def release(self, acquired_at: float) -> None:
+        self.in_flight -= 1
+        self._semaphore.release()
+        self._avg_hold = 0.9 * self._avg_hold + 0.1 * (time.monotonic() - acquired_at)
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[None]:
+        acquired_at = await self.acquire()
+        try:
+            yield
+        finally:
+            self.release(acquired_at)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "avg_hold_seconds": round(self._avg_hold, 4),
+        }
+
+
+# Global limit on requests in the pipeline; the only limiter that sheds.
+admission = Limiter("admission", MAX_CONCURRENT_TASKS, max_queue=ADMISSION_MAX_QUEUE,
+                    queue_timeout=ADMISSION_QUEUE_TIMEOUT)
+
+# Per-stage limits on concurrent provider calls, so one slow provider cannot absorb every admitted request.
+stage_limits: Dict[str, Limiter] = {
+    "embedding": Limiter("embedding", STAGE_CONCURRENCY_EMBEDDING),
+    "vector_search": Limiter("vector_search", STAGE_CONCURRENCY_SEARCH),
+    "rerank": Limiter("rerank", STAGE_CONCURRENCY_RERANK),
+    "generation": Limiter("generation", STAGE_CONCURRENCY_GENERATION),
+}
+
+
+def stats() -> Dict[str, Any]:
+    return {"admission": admission.stats(), **{name: l.stats() for name, l in stage_limits.items()}}
@@ -1,12 +1,98 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from text_rag.worker import handle_query
-from text_rag.logger import get_logger
-from text_rag.config import API_HOST, API_PORT
+from text_rag import startup  # first, so the startup clock covers the imports below
+import asyncio
+import uuid
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, StreamingResponse, Response
+from prometheus_client import CONTENT_TYPE_LATEST
+from pydantic import BaseModel, Field
+from starlette.background import BackgroundTask
+from text_rag.worker import EmbeddingFailed, handle_query, stream_query, handle_batch
+from text_rag.semantic_cache import get_semantic_cache
+from text_rag.local_cache import l1_cache, query_flight
+from text_rag.clients import get_registry
+from text_rag.embedder import get_embedding_batcher
+from text_rag import admission as admission_control
+from text_rag.admission import Overloaded, admission
+from text_rag.deadline import DeadlineExceeded
+from text_rag.metrics import IN_FLIGHT, exposition, mark_worker_stopped, stats_collector
+from text_rag.logger import get_logger, request_id_var, stats as log_stats
+from text_rag.warmup import prewarm
+from text_rag.config import API_HOST, API_PORT, BATCH_MAX_QUERIES, PREWARM_ENABLED
+import orjson
 import uvicorn
 
 logger = get_logger("text_rag.api")
-app = FastAPI(title="text-rag - RAG Playground", version="0.1.0")
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Shared, pooled clients live for the lifetime of the app
+    startup.mark("server")
+    registry = get_registry()
+    await registry.start()
+    startup.mark("clients")
+    # /healthz answers right away; /readyz only once connections are warm
+    warming = asyncio.create_task(prewarm()) if PREWARM_ENABLED else None
+    if warming is None:
+        startup.set_ready()
+    try:
+        yield
+    finally:
+        if warming is not None:
+            warming.cancel()
+        await registry.close()
+        mark_worker_stopped()
+
+
+class OrjsonResponse(Response):
+    """JSON bodies rendered with orjson (FastAPI's own ORJSONResponse is deprecated)."""
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return orjson.dumps(content)
+
+
+app = FastAPI(title="text-rag - RAG Playground", version="0.1.0", lifespan=lifespan,
+              default_response_class=OrjsonResponse)
+
+stats_collector.add("l1_cache", l1_cache.stats)
+stats_collector.add("single_flight", query_flight.stats)
+stats_collector.add("embedding_batcher", lambda: get_embedding_batcher().stats())
+stats_collector.add("semantic_cache", lambda: (get_semantic_cache().stats() if get_semantic_cache() else {}))
+stats_collector.add("admission", admission.stats)
+stats_collector.add("logging", log_stats)
+for _name, _limiter in admission_control.stage_limits.items():
+    stats_collector.add(f"stage_limit_{_name}", _limiter.stats)
+
+_UNTRACKED_PATHS = {"/healthz", "/readyz", "/metrics"}
+
+
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    """Tag every log line of the request with a request id and track in-flight requests."""
+    request_id = request.headers.get("X-Request-ID") or uuid.uuid4().hex
+    token = request_id_var.set(request_id)
+    try:
+        if request.url.path in _UNTRACKED_PATHS:
+            response = await call_next(request)
+        else:
+            with IN_FLIGHT.labels(request.url.path).track_inprogress():
+                response = await call_next(request)
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        request_id_var.reset(token)
+
+
+@app.exception_handler(Overloaded)
+async def overloaded(request: Request, exc: Overloaded):
+    """Shed load fast instead of queueing behind a saturated provider."""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Server busy, retry later", "queue_depth": admission.waiting},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
 
 
 class GenerateRequest(BaseModel):
@@ -14,6 +100,15 @@ class GenerateRequest(BaseModel):
     k: int | None = None
     n: int | None = None
     reflection: bool = False
+    budget_ms: int | None = Field(default=None, ge=0, description="Latency budget; defaults to REQUEST_BUDGET_MS, 0 disables")
+
+
+class BatchGenerateRequest(BaseModel):
+    queries: list[str]
+    k: int | None = None
+    n: int | None = None
+    concurrency: int | None = Field(default=None, ge=1, description="Capped at BATCH_MAX_CONCURRENCY")
+    stream: bool = False
 
 
 @app.get("/healthz")
@@ -22,22 +117,149 @@ async def healthz():
     return {"status": "ok"}
 
 
+@app.get("/readyz")
+async def readyz():
+    """Readiness: 503 until clients and connection pools are pre-warmed; includes the startup breakdown."""
+    return JSONResponse(status_code=200 if startup.is_ready() else 503, content=startup.report())
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus exposition of stage latencies, cache hits, provider errors and fallbacks."""
+    return Response(exposition(), media_type=CONTENT_TYPE_LATEST)
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """L1, semantic cache and single-flight counters."""
+    semantic_cache = get_semantic_cache()
+    return {
+        "l1": l1_cache.stats(),
+        "semantic": semantic_cache.stats() if semantic_cache else {"enabled": False},
+        "single_flight": query_flight.stats(),
+        "embedding_batches": get_embedding_batcher().stats(),
+    }
+
+
+@app.get("/admission/stats")
+async def admission_stats():
+    """In-flight counts, queue depth and rejections of the global and per-stage limiters."""
+    return admission_control.stats()
+
+
 @app.post("/generate")
 async def generate(req: GenerateRequest):
-    try:
-        logger.info(f"generate_request {req.query}")
-        resp = await handle_query(
-            req.query,
-            k=req.k,
-            n=req.n,
-            do_reflection=req.reflection,
-        )
-        return resp
-    except Exception as e:
-        logger.error(f"Failed to generate results - {e}")
-        raise HTTPException(status_code=500, detail="Internal server error")
+    async with admission.slot():
+        try:
+            logger.info("generate_request", query_chars=len(req.query), k=req.k, n=req.n)
+            resp = await handle_query(
+                req.query,
+                k=req.k,
+                n=req.n,
+                do_reflection=req.reflection,
+                budget_ms=req.budget_ms,
+            )
+            return resp
+        except DeadlineExceeded as e:
+            logger.error(f"Request budget exhausted - {e}")
+            raise HTTPException(status_code=504, detail=f"Budget exhausted during {e.stage}")
+        except EmbeddingFailed as e:
+            logger.error(f"Failed to generate results - {e}")
+            raise HTTPException(status_code=502, detail="Embedding provider failed")
+        except Exception as e:
+            logger.error(f"Failed to generate results - {e}")
+            raise HTTPException(status_code=500, detail="Internal server error")
+
+def _release_once(acquired_at: float):
+    """Release an admission slot held for the lifetime of a streaming response, exactly once."""
+    released = False
+
+    def release():
+        nonlocal released
+        if not released:
+            released = True
+            admission.release(acquired_at)
+    return release
+
+def _sse(event: str, data) -> str:
+    return f"event: {event}\ndata: {orjson.dumps(data).decode()}\n\n"
+
+
+@app.post("/generate/stream")
+async def generate_stream(req: GenerateRequest):
+    """Server-sent events: `sources` once reranking finishes, then `token` deltas, then `done`."""
+    logger.info("generate_stream_request", query_chars=len(req.query), k=req.k, n=req.n)
+    # admit before the response starts, so an overloaded server can still answer 429
+    release = _release_once(await admission.acquire())
+
+    async def events():
+        try:
+            async for event, data in stream_query(req.query, k=req.k, n=req.n, budget_ms=req.budget_ms):
+                if event == "token":
+                    data = {"text": data}
+                yield _sse(event, data)
+        except DeadlineExceeded as e:
+            logger.error(f"Request budget exhausted - {e}")
+            yield _sse("error", {"detail": f"Budget exhausted during {e.stage}"})
+        except EmbeddingFailed as e:
+            logger.error(f"Failed to stream results - {e}")
+            yield _sse("error", {"detail": "Embedding provider failed"})
+        except Exception as e:
+            logger.error(f"Failed to stream results - {e}")
+            yield _sse("error", {"detail": "Internal server error"})
+        finally:
+            release()
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        # also runs when the client disconnects before the stream was started
+        background=BackgroundTask(release),
+    )
+
+@app.post("/generate/batch")
+async def generate_batch(req: BatchGenerateRequest):
+    """
+    Run a list of queries as one batch. Returns {"results": [...]} in input order, or with
+    `stream=true` NDJSON lines as each query finishes. Failed queries carry an "error" field.
+    """
+    if len(req.queries) > BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_QUERIES} queries per batch")
+    logger.info("generate_batch_request", size=len(req.queries))
+
+    # a batch takes one admission slot; the stage limits bound its provider calls
+    if req.stream:
+        release = _release_once(await admission.acquire())
+        batch = handle_batch(req.queries, k=req.k, n=req.n, concurrency=req.concurrency)
+
+        async def lines():
+            try:
+                async for i, result in batch:
+                    yield orjson.dumps({"index": i, "query": req.queries[i], **result}) + b"\n"
+            except Exception as e:
+                logger.error(f"Failed to stream batch results - {e}")
+                yield orjson.dumps({"error": "Internal server error"}) + b"\n"
+            finally:
+                release()
+        return StreamingResponse(lines(), media_type="application/x-ndjson", background=BackgroundTask(release))
+
+    results: list = [None] * len(req.queries)
+    async with admission.slot():
+        batch = handle_batch(req.queries, k=req.k, n=req.n, concurrency=req.concurrency)
+        try:
+            async for i, result in batch:
+                results[i] = {"query": req.queries[i], **result}
+        except Exception as e:
+            logger.error(f"Failed to generate batch results - {e}")
+            raise HTTPException(status_code=500, detail="Internal server error")
+    return {"results": results}
+
+startup.mark("imports")
+
 
 def main():
+    """Development server with auto-reload; production runs `rag_server` (text_rag.server)."""
     uvicorn.run(
         "text_rag.api:app",
         host=API_HOST,
@@ -1,4 +1,3 @@
-import boto3
 import os
 from text_rag.config import (
                             AWS_REGION,
@@ -9,14 +8,22 @@ from text_rag.config import (
                             OPENSEARCH_HOST)
 from typing import Any
 from text_rag.logger import get_logger
-from opensearchpy import OpenSearch, RequestsHttpConnection
-from requests_aws4auth import AWS4Auth
 
 logger = get_logger("text_rag.clients")
 
-_session = boto3.Session(region_name=AWS_REGION)
+# boto3, opensearch-py and requests-aws4auth are imported on first use: together they
+# add a few hundred ms to every cold start, and most processes never touch some of them.
+_session = None
 
-def get_boto3_client(service):
+def _get_session():
+    global _session
+    if _session is None:
+        import boto3
+        _session = boto3.Session(region_name=AWS_REGION)
+    return _session
+
+def get_boto3_client(service, config=None):
+    import boto3
     if APP_ENV == "localstack":
         # LocalStack setup
         logger.info(f"Initializing client {service} locally")
@@ -25,7 +32,8 @@ def get_boto3_client(service):
             region_name=AWS_REGION,
             aws_access_key_id=AWS_ACCESS_KEY_ID,
             aws_secret_access_key=AWS_SECRET_ACCESS_KEY,
-            endpoint_url=LOCALSTACK_URL
+            endpoint_url=LOCALSTACK_URL,
+            config=config
         )
     else:
         os.environ.pop("AWS_ACCESS_KEY_ID", None)
@@ -36,11 +44,11 @@ def get_boto3_client(service):
         if aws_profile:
             logger.info(f"Initializing client {service} in production using AWS_PROFILE {aws_profile}")
             session = boto3.Session(region_name=AWS_REGION, profile_name=aws_profile)
-            return session.client(service)
+            return session.client(service, config=config)
         else:
             # No profile → IAM Role will be used (via metadata service)
             logger.info(f"Initializing client {service} in production using IAM Role")
-            return boto3.client(service, region_name=AWS_REGION)
+            return boto3.client(service, region_name=AWS_REGION, config=config)
 
 def s3_client() -> Any:
     return get_boto3_client("s3")
@@ -49,10 +57,11 @@ def bedrock_client() -> Any:
     return get_boto3_client("bedrock-runtime") # changed "bedrock" to "bedrock-runtime"
 
 
-def opensearch_client():
-
+def opensearch_client(pool_maxsize: int = 10):
+    from opensearchpy import OpenSearch, RequestsHttpConnection
+    from requests_aws4auth import AWS4Auth
 
-    credentials = _session.get_credentials()
+    credentials = _get_session().get_credentials()
     awsauth = AWS4Auth(region=AWS_REGION,
                         service="es",
                         refreshable_credentials=credentials)
@@ -62,6 +71,7 @@ def opensearch_client():
         http_auth=awsauth,
         use_ssl=True,
         verify_certs=True,
-        connection_class=RequestsHttpConnection
+        connection_class=RequestsHttpConnection,
+        pool_maxsize=pool_maxsize
     )
     return client
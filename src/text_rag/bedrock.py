@@ -0,0 +1,113 @@
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, AsyncIterator, Callable, Dict
+
+from text_rag.config import BEDROCK_EXECUTOR_WORKERS, BEDROCK_MAX_CONCURRENCY_PER_MODEL
+from text_rag.logger import get_logger
+
+logger = get_logger("text_rag.bedrock")
+
+
+class AsyncBedrock:
+    """
+    Async adapter over the synchronous boto3 bedrock-runtime client.
+
+    boto3 has no native async transport, so calls run on a dedicated, bounded thread
+    pool instead of the event loop. The client's connection pool is sized to match
+    the pool, so every worker thread can hold a connection. A semaphore per model id
+    caps in-flight calls per model, so one slow model cannot take every worker.
+    """
+
+    def __init__(self, client_factory: Callable[[], Any],
+                 max_workers: int = BEDROCK_EXECUTOR_WORKERS,
+                 per_model_limit: int = BEDROCK_MAX_CONCURRENCY_PER_MODEL):
+        self._client_factory = client_factory
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="bedrock")
+        self._per_model_limit = per_model_limit
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+
+    def _semaphore(self, model_id: str) -> asyncio.Semaphore:
+        sem = self._semaphores.get(model_id)
+        if sem is None:
+            sem = self._semaphores[model_id] = asyncio.Semaphore(self._per_model_limit)
+        return sem
+
+    def _invoke_sync(self, model_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        resp = self._client_factory().invoke_model(
+            modelId=model_id,
+            contentType="application/json",
+            accept="application/json",
+            body=json.dumps(body),
+        )
+        return json.loads(resp['body'].read())
+
+    async def invoke_model(self, model_id: str, body: Dict[str, Any]) -> Dict[str, Any]:
+        """Invoke a Bedrock model without blocking the event loop; returns the decoded JSON payload."""
+        async with self._semaphore(model_id):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, self._invoke_sync, model_id, body)
+
+    async def invoke_model_stream(self, model_id: str, body: Dict[str, Any]) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Invoke a model with response streaming and yield each decoded chunk payload.
+
+        The blocking EventStream is drained on the executor and handed to the event
+        loop through a queue, so tokens reach the caller as soon as Bedrock sends them.
+        When the caller stops early (e.g. the SSE client disconnected), the pump closes
+        the EventStream at the next event and frees its executor thread.
+        """
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        done = object()
+        stop = threading.Event()
+
+        def put(item):
+            if not stop.is_set():
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+
+        def pump():
+            stream = None
+            try:
+                resp = self._client_factory().invoke_model_with_response_stream(
+                    modelId=model_id,
+                    contentType="application/json",
+                    accept="application/json",
+                    body=json.dumps(body),
+                )
+                stream = resp['body']
+                for event in stream:
+                    if stop.is_set():
+                        break
+                    chunk = event.get('chunk')
+                    if chunk:
+                        put(json.loads(chunk['bytes']))
+            except Exception as e:
+                put(e)
+            finally:
+                if stream is not None and stop.is_set():
+                    stream.close()
+                put(done)
+
+        async with self._semaphore(model_id):
+            pump_future = loop.run_in_executor(self._executor, pump)
+            try:
+                while True:
+                    item = await queue.get()
+                    if item is done:
+                        break
+                    if isinstance(item, Exception):
+                        raise item
+                    yield item
+                await pump_future
+            finally:
+                stop.set()
+
+    async def run(self, fn: Callable[..., Any], *args: Any) -> Any:
+        """Run an arbitrary blocking Bedrock call on the adapter's executor."""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, fn, *args)
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False, cancel_futures=True)
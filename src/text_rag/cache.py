@@ -1,6 +1,33 @@
 import hashlib
-import json
-from text_rag.config import REDIS_HOST, REDIS_PORT
+import struct
+from typing import Any, Dict, List, Optional, Tuple
+from text_rag.config import (
+    REDIS_HOST,
+    REDIS_PORT,
+    CACHE_VERSION,
+    CACHE_TTL_RESPONSE,
+    CACHE_TTL_EMBEDDING,
+    CACHE_TTL_RETRIEVAL,
+    CACHE_TTL_RERANK,
+    CACHE_TTL_ANSWER,
+    CACHE_TTL_CHUNK,
+    EMBEDDING_MODEL,
+    EMBEDDING_OUTPUT_DIM,
+    OPENSEARCH_INDEX,
+    RETRIEVAL_MODE,
+    HYBRID_KNN_K,
+    HYBRID_LEXICAL_K,
+    HYBRID_VECTOR_WEIGHT,
+    HYBRID_LEXICAL_WEIGHT,
+    RRF_K,
+    VECTOR_DATA_TYPE,
+    VECTOR_RESCORE_OVERSAMPLE,
+    RERANK_MODEL,
+    COMPLETION_MODEL,
+)
+from text_rag import codec
+from text_rag.local_cache import l1_cache
+from text_rag.metrics import CACHE_HITS, CACHE_MISSES, PROVIDER_ERRORS
 from text_rag.logger import get_logger
 from redis import asyncio as aioredis
 
@@ -11,28 +38,196 @@ _redis = None
 async def get_redis():
     global _redis
     if _redis is None:
-        _redis = await aioredis.from_url(
-            f"redis://{REDIS_HOST}:{REDIS_PORT}",
-            encoding="utf-8",
-            decode_responses=True,
-        )
+        # values are binary (text_rag.codec), so responses stay bytes
+        _redis = await aioredis.from_url(f"redis://{REDIS_HOST}:{REDIS_PORT}", decode_responses=False)
     return _redis
 
-def _make_key(query: str) -> str:
-    digest = hashlib.sha256(query.encode("utf-8")).hexdigest()
-    return f"rag:query:{digest}"
-
-async def get_cached_response(query: str) -> dict | None:
-    redis = await get_redis()
-    key = _make_key(query)
-    cached = await redis.get(key)
-    if cached:
-        logger.info("cache_hit", query=query)
-        return json.loads(cached)
-    return None
-
-async def set_cached_response(query: str, response: dict, ttl: int = 300):
-    redis = await get_redis()
-    key = _make_key(query)
-    await redis.set(key, json.dumps(response), ex=ttl)
-    logger.info("cache_set", query=query)
+def _digest(*parts: Any) -> str:
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, bytes):
+            h.update(part)
+        else:
+            h.update(str(part).encode("utf-8"))
+        h.update(b"\x1f")
+    return h.hexdigest()
+
+def _vector_digest(vector: List[float]) -> str:
+    return hashlib.sha256(struct.pack(f"{len(vector)}f", *vector)).hexdigest()
+
+def _make_key(query: str, k: int | None = None, n: int | None = None) -> str:
+    digest = _digest(query, k, n)
+    return f"rag:v{CACHE_VERSION}:query:{digest}"
+
+# Stage keys embed everything the stage output depends on (model, dimension, index, k),
+# so changing one of them only invalidates that layer.
+def _embedding_key(query: str) -> str:
+    return f"rag:v{CACHE_VERSION}:emb:{EMBEDDING_MODEL}:{EMBEDDING_OUTPUT_DIM}:{_digest(query)}"
+
+def _retrieval_key(vector: List[float], k: int, query: str | None = None) -> str:
+    if RETRIEVAL_MODE == "hybrid" and query is not None:
+        mode = f"hybrid:{VECTOR_DATA_TYPE}:{HYBRID_KNN_K}:{HYBRID_LEXICAL_K}:{HYBRID_VECTOR_WEIGHT}:{HYBRID_LEXICAL_WEIGHT}:{RRF_K}"
+        return f"rag:v{CACHE_VERSION}:{mode}:{OPENSEARCH_INDEX}:{k}:{_digest(query, _vector_digest(vector))}"
+    mode = f"knn:{VECTOR_DATA_TYPE}:{VECTOR_RESCORE_OVERSAMPLE}"
+    return f"rag:v{CACHE_VERSION}:{mode}:{OPENSEARCH_INDEX}:{k}:{_vector_digest(vector)}"
+
+def _rerank_key(query: str, candidate_ids: List[str], top_n: int) -> str:
+    return f"rag:v{CACHE_VERSION}:rerank:{RERANK_MODEL}:{top_n}:{_digest(query, *candidate_ids)}"
+
+def _answer_key(question: str, chunk_ids: List[str]) -> str:
+    return f"rag:v{CACHE_VERSION}:answer:{COMPLETION_MODEL}:{_digest(question, *sorted(chunk_ids))}"
+
+def _chunk_key(doc_id: Any) -> str:
+    return f"rag:v{CACHE_VERSION}:chunk:{OPENSEARCH_INDEX}:{doc_id}"
+
+def _decode(data: bytes, layer: str) -> Any | None:
+    try:
+        return codec.decode(data)
+    except codec.CodecError as e:
+        logger.warning(f"dropping undecodable {layer} entry - {e}")
+        return None
+
+async def _fetch(key: str, layer: str) -> Tuple[Any | None, str | None]:
+    """(value, tier) from L1 or Redis, without counting the lookup; tier is None when Redis failed."""
+    tier = "l1"
+    data = l1_cache.get(key)
+    if data is None:
+        tier = "redis"
+        try:
+            redis = await get_redis()
+            data = await redis.get(key)
+        except Exception as e:
+            PROVIDER_ERRORS.labels("redis", "cache").inc()
+            logger.warning(f"cache read failed for {layer} - {e}")
+            return None, None
+    value = _decode(data, layer) if data is not None else None
+    if value is not None and tier == "redis":
+        # promoted entries live for at most L1_CACHE_TTL, which keeps them within the Redis TTL
+        l1_cache.set(key, data)
+    return value, tier
+
+def _record(layer: str, tier: str | None, value: Any | None) -> Any | None:
+    if tier is None:
+        return None
+    if value is None:
+        CACHE_MISSES.labels(layer).inc()
+        return None
+    CACHE_HITS.labels(layer, tier).inc()
+    logger.debug("cache_hit", layer=layer, tier=tier)
+    return value
+
+async def _get(key: str, layer: str) -> Any | None:
+    value, tier = await _fetch(key, layer)
+    return _record(layer, tier, value)
+
+async def _set(key: str, encoded: bytes, ttl: int, layer: str, chunks: Optional[Dict[str, bytes]] = None) -> None:
+    """Write an entry, plus the chunk texts it references, in one pipelined round trip."""
+    l1_cache.set(key, encoded, ttl)
+    for doc_id, text in (chunks or {}).items():
+        l1_cache.set(_chunk_key(doc_id), text, CACHE_TTL_CHUNK)
+    try:
+        redis = await get_redis()
+        if chunks:
+            async with redis.pipeline(transaction=False) as pipe:
+                for doc_id, text in chunks.items():
+                    pipe.set(_chunk_key(doc_id), text, ex=CACHE_TTL_CHUNK)
+                pipe.set(key, encoded, ex=ttl)
+                await pipe.execute()
+        else:
+            await redis.set(key, encoded, ex=ttl)
+        logger.debug("cache_set", layer=layer)
+    except Exception as e:
+        PROVIDER_ERRORS.labels("redis", "cache").inc()
+        logger.warning(f"cache write failed for {layer} - {e}")
+
+def _split_chunks(items: List[dict]) -> Tuple[List[dict], Dict[str, bytes]]:
+    """
+    Replace each item's "text" with a reference to a shared chunk entry.
+
+    The same chunks come back in many retrieval and response entries; storing their
+    text once per chunk instead of once per entry is most of the cache's memory.
+    """
+    refs, chunks = [], {}
+    for item in items:
+        if item.get("doc_id") is not None and isinstance(item.get("text"), str):
+            chunks[str(item["doc_id"])] = codec.encode(item["text"])
+            item = {key: value for key, value in item.items() if key != "text"}
+        refs.append(item)
+    return refs, chunks
+
+async def _join_chunks(refs: List[dict], layer: str) -> List[dict] | None:
+    """Inverse of _split_chunks; None (a miss) when any referenced chunk has expired."""
+    wanted = [str(r["doc_id"]) for r in refs if r.get("doc_id") is not None and "text" not in r]
+    texts: Dict[str, bytes] = {}
+    missing = []
+    for doc_id in dict.fromkeys(wanted):
+        data = l1_cache.get(_chunk_key(doc_id))
+        if data is None:
+            missing.append(doc_id)
+        else:
+            texts[doc_id] = data
+    if missing:
+        try:
+            redis = await get_redis()
+            values = await redis.mget([_chunk_key(doc_id) for doc_id in missing])
+        except Exception as e:
+            PROVIDER_ERRORS.labels("redis", "cache").inc()
+            logger.warning(f"cache read failed for {layer} chunks - {e}")
+            return None
+        for doc_id, data in zip(missing, values):
+            if data is None:
+                logger.debug("cache entry references an expired chunk", layer=layer)
+                return None
+            l1_cache.set(_chunk_key(doc_id), data, CACHE_TTL_CHUNK)
+            texts[doc_id] = data
+    joined = []
+    for ref in refs:
+        doc_id = str(ref.get("doc_id"))
+        if doc_id in texts and "text" not in ref:
+            text = _decode(texts[doc_id], "chunk")
+            if text is None:
+                return None
+            ref = {**ref, "text": text}
+        joined.append(ref)
+    return joined
+
+async def get_cached_response(query: str, k: int | None = None, n: int | None = None) -> dict | None:
+    # counted after the join: an entry whose chunks expired is a miss
+    response, tier = await _fetch(_make_key(query, k, n), "response")
+    if response is not None:
+        sources = await _join_chunks(response.get("sources", []), "response")
+        response = None if sources is None else {**response, "sources": sources}
+    return _record("response", tier, response)
+
+async def set_cached_response(query: str, response: dict, k: int | None = None, n: int | None = None,
+                              ttl: int = CACHE_TTL_RESPONSE):
+    sources, chunks = _split_chunks(response.get("sources", []))
+    await _set(_make_key(query, k, n), codec.encode({**response, "sources": sources}), ttl, "response", chunks)
+
+async def get_cached_embedding(query: str) -> List[float] | None:
+    return await _get(_embedding_key(query), "embedding")
+
+async def set_cached_embedding(query: str, embedding: List[float]):
+    await _set(_embedding_key(query), codec.encode_vector(embedding), CACHE_TTL_EMBEDDING, "embedding")
+
+async def get_cached_hits(vector: List[float], k: int, query: str | None = None) -> List[dict] | None:
+    hits, tier = await _fetch(_retrieval_key(vector, k, query), "retrieval")
+    if hits is not None:
+        hits = await _join_chunks(hits, "retrieval")
+    return _record("retrieval", tier, hits)
+
+async def set_cached_hits(vector: List[float], k: int, hits: List[dict], query: str | None = None):
+    refs, chunks = _split_chunks(hits)
+    await _set(_retrieval_key(vector, k, query), codec.encode(refs), CACHE_TTL_RETRIEVAL, "retrieval", chunks)
+
+async def get_cached_rerank(query: str, candidate_ids: List[str], top_n: int) -> List[int] | None:
+    return await _get(_rerank_key(query, candidate_ids, top_n), "rerank")
+
+async def set_cached_rerank(query: str, candidate_ids: List[str], top_n: int, ranked: List[int]):
+    await _set(_rerank_key(query, candidate_ids, top_n), codec.encode(ranked), CACHE_TTL_RERANK, "rerank")
+
+async def get_cached_answer(question: str, chunk_ids: List[str]) -> str | None:
+    return await _get(_answer_key(question, chunk_ids), "answer")
+
+async def set_cached_answer(question: str, chunk_ids: List[str], answer: str):
+    await _set(_answer_key(question, chunk_ids), codec.encode(answer), CACHE_TTL_ANSWER, "answer")
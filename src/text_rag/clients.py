@@ -0,0 +1,195 @@
+import threading
+from typing import TYPE_CHECKING, Any, Optional
+
+from text_rag.aws_clients import get_boto3_client, opensearch_client
+from text_rag.bedrock import AsyncBedrock
+from text_rag.config import (
+    AWS_REGION,
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+    HTTP_POOL_SIZE,
+    HTTP_POOL_SIZE_PER_HOST,
+    HTTP_KEEPALIVE_TIMEOUT,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_REQUEST_TIMEOUT,
+    BEDROCK_POOL_SIZE,
+    OPENAI_POOL_SIZE,
+    OPENAI_MAX_RETRIES,
+    MODEL_PROVIDER,
+)
+from text_rag.logger import get_logger
+
+if TYPE_CHECKING:
+    import aiohttp
+    import boto3
+    from botocore.config import Config
+    from openai import AsyncOpenAI
+
+logger = get_logger("text_rag.clients")
+
+
+class ClientRegistry:
+    """
+    Process-wide holder for the network clients used by every pipeline stage.
+
+    Clients are created once and reused so connections stay in keep-alive pools
+    instead of paying TCP/TLS setup on each request. The FastAPI lifespan calls
+    `start()`/`close()`; outside the app (scripts, workers) clients are created
+    lazily on first use. The SDKs behind them are imported the same way, so a
+    process only pays for the providers it uses.
+
+    boto3 clients and credentials are first requested from executor threads
+    (AsyncBedrock, pre-warming), and creating them concurrently from the shared
+    default session is not thread-safe, so their creation holds `_boto_lock`.
+    """
+
+    def __init__(self):
+        self._http: Optional["aiohttp.ClientSession"] = None
+        self._bedrock: Any = None
+        self._bedrock_async: Optional[AsyncBedrock] = None
+        self._openai: Optional["AsyncOpenAI"] = None
+        self._opensearch: Any = None
+        self._s3: Any = None
+        self._sqs: Any = None
+        self._dynamodb: Any = None
+        self._boto_session: Optional["boto3.Session"] = None
+        self._credentials: Any = None
+        self._boto_lock = threading.Lock()
+
+    async def start(self) -> None:
+        self.http_session()
+        if MODEL_PROVIDER == "openai":
+            self.openai()
+        else:
+            self.bedrock_async()
+        logger.info(f"Client registry started (http_pool={HTTP_POOL_SIZE}, "
+                    f"bedrock_pool={BEDROCK_POOL_SIZE}, openai_pool={OPENAI_POOL_SIZE})")
+
+    def http_session(self) -> "aiohttp.ClientSession":
+        """Shared aiohttp session with a keep-alive connection pool (used for OpenSearch)."""
+        if self._http is None or self._http.closed:
+            import aiohttp
+            connector = aiohttp.TCPConnector(
+                limit=HTTP_POOL_SIZE,
+                limit_per_host=HTTP_POOL_SIZE_PER_HOST,
+                keepalive_timeout=HTTP_KEEPALIVE_TIMEOUT,
+                ttl_dns_cache=300,
+            )
+            timeout = aiohttp.ClientTimeout(total=HTTP_REQUEST_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+            self._http = aiohttp.ClientSession(connector=connector, timeout=timeout)
+        return self._http
+
+    def bedrock(self) -> Any:
+        """Shared bedrock-runtime client; boto3 clients are thread-safe and pool connections."""
+        if self._bedrock is None:
+            with self._boto_lock:
+                if self._bedrock is None:
+                    self._bedrock = get_boto3_client("bedrock-runtime", config=self._aws_config())
+        return self._bedrock
+
+    def bedrock_async(self) -> AsyncBedrock:
+        """Non-blocking Bedrock adapter shared by embed, rerank and generate."""
+        if self._bedrock_async is None:
+            self._bedrock_async = AsyncBedrock(self.bedrock)
+        return self._bedrock_async
+
+    def openai(self) -> "AsyncOpenAI":
+        """Shared AsyncOpenAI client backed by a pooled httpx transport."""
+        if self._openai is None:
+            import httpx
+            from openai import AsyncOpenAI
+            http_client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=OPENAI_POOL_SIZE,
+                    max_keepalive_connections=OPENAI_POOL_SIZE,
+                    keepalive_expiry=HTTP_KEEPALIVE_TIMEOUT,
+                ),
+                timeout=httpx.Timeout(HTTP_REQUEST_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+            )
+            self._openai = AsyncOpenAI(
+                api_key=OPENAI_API_KEY,
+                base_url=OPENAI_BASE_URL,
+                max_retries=OPENAI_MAX_RETRIES,
+                http_client=http_client,
+            )
+        return self._openai
+
+    def _aws_config(self) -> "Config":
+        from botocore.config import Config
+        return Config(
+            max_pool_connections=BEDROCK_POOL_SIZE,
+            connect_timeout=HTTP_CONNECT_TIMEOUT,
+            read_timeout=HTTP_REQUEST_TIMEOUT,
+            tcp_keepalive=True,
+        )
+
+    def s3(self) -> Any:
+        if self._s3 is None:
+            with self._boto_lock:
+                if self._s3 is None:
+                    self._s3 = get_boto3_client("s3", config=self._aws_config())
+        return self._s3
+
+    def sqs(self) -> Any:
+        if self._sqs is None:
+            with self._boto_lock:
+                if self._sqs is None:
+                    self._sqs = get_boto3_client("sqs", config=self._aws_config())
+        return self._sqs
+
+    def dynamodb(self) -> Any:
+        if self._dynamodb is None:
+            with self._boto_lock:
+                if self._dynamodb is None:
+                    self._dynamodb = get_boto3_client("dynamodb", config=self._aws_config())
+        return self._dynamodb
+
+    def opensearch(self) -> Any:
+        if self._opensearch is None:
+            self._opensearch = opensearch_client(pool_maxsize=HTTP_POOL_SIZE)
+        return self._opensearch
+
+    def frozen_credentials(self) -> Any:
+        """
+        SigV4 credentials for signing raw OpenSearch requests.
+
+        The credential provider chain is resolved once; botocore's refreshable
+        credentials then renew themselves shortly before expiry, so this is cheap
+        to call per request.
+        """
+        if self._credentials is None:
+            with self._boto_lock:
+                if self._credentials is None:
+                    import boto3
+                    self._boto_session = boto3.Session(region_name=AWS_REGION)
+                    self._credentials = self._boto_session.get_credentials()
+        return self._credentials.get_frozen_credentials()
+
+    async def close(self) -> None:
+        if self._http is not None and not self._http.closed:
+            await self._http.close()
+        if self._openai is not None:
+            await self._openai.close()
+        if self._bedrock_async is not None:
+            self._bedrock_async.shutdown()
+        if self._bedrock is not None:
+            self._bedrock.close()
+        self._http = None
+        self._bedrock_async = None
+        self._openai = None
+        self._bedrock = None
+        self._opensearch = None
+        self._s3 = None
+        self._sqs = None
+        self._dynamodb = None
+        logger.info("Client registry closed")
+
+
+_registry: Optional[ClientRegistry] = None
+
+
+def get_registry() -> ClientRegistry:
+    global _registry
+    if _registry is None:
+        _registry = ClientRegistry()
+    return _registry
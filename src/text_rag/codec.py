@@ -0,0 +1,71 @@
+"""
+Binary encoding of cache values (Redis and the in-process L1).
+
+A one-byte header names the format:
+
+    0x01  orjson
+    0x02  orjson, zstd-compressed   (values over CACHE_COMPRESS_MIN_BYTES)
+    0x03  orjson, zlib-compressed   (the same, when zstandard is not installed)
+    0x04  float32 array             (embeddings: 4 bytes per dimension instead of ~20 as JSON text)
+
+Anything else, including entries written by the old JSON string format, fails to
+decode and is treated as a cache miss.
+"""
+import struct
+import zlib
+from typing import Any, List
+
+import orjson
+
+from text_rag.config import CACHE_COMPRESS_MIN_BYTES, CACHE_COMPRESS_LEVEL
+
+try:
+    import zstandard
+except ImportError:  # optional: pip install text-rag[cache]
+    zstandard = None
+
+JSON = b"\x01"
+JSON_ZSTD = b"\x02"
+JSON_ZLIB = b"\x03"
+FLOAT32 = b"\x04"
+
+if zstandard is not None:
+    _compressor = zstandard.ZstdCompressor(level=CACHE_COMPRESS_LEVEL)
+    _decompressor = zstandard.ZstdDecompressor()
+
+
+class CodecError(ValueError):
+    """A cache value that this process cannot decode."""
+
+
+def encode(value: Any, min_compress_bytes: int = CACHE_COMPRESS_MIN_BYTES) -> bytes:
+    raw = orjson.dumps(value)
+    if len(raw) < min_compress_bytes:
+        return JSON + raw
+    if zstandard is not None:
+        return JSON_ZSTD + _compressor.compress(raw)
+    return JSON_ZLIB + zlib.compress(raw, min(CACHE_COMPRESS_LEVEL, 9))
+
+
+def encode_vector(vector: List[float]) -> bytes:
+    return FLOAT32 + struct.pack(f"<{len(vector)}f", *vector)
+
+
+def decode(data: bytes) -> Any:
+    header, body = data[:1], data[1:]
+    try:
+        if header == JSON:
+            return orjson.loads(body)
+        if header == JSON_ZSTD:
+            if zstandard is None:
+                raise CodecError("zstd-compressed value but zstandard is not installed")
+            return orjson.loads(_decompressor.decompress(body))
+        if header == JSON_ZLIB:
+            return orjson.loads(zlib.decompress(body))
+        if header == FLOAT32:
+            return list(struct.unpack(f"<{len(body) // 4}f", body))
+    except CodecError:
+        raise
+    except Exception as e:  # orjson, zlib, zstd and struct each have their own error type
+        raise CodecError(f"corrupt cache value - {e}") from e
+    raise CodecError(f"unknown cache value format {header!r}")
@@ -1,6 +1,6 @@
 import os
 from dotenv import load_dotenv, dotenv_values
-from text_rag.logger import get_logger
+from text_rag.logger import configure as configure_logging, get_logger
 from pathlib import Path
 
 logger = get_logger("text_rag.config")
@@ -23,6 +23,14 @@ def _env(name, default=None):
     v = os.getenv(name)
     return v if v is not None else default
 
+# Logging (text_rag.logger): LOG_LEVELS overrides the level per stage, e.g. "retriever=DEBUG,cache=WARNING";
+# debug records are sampled at LOG_DEBUG_SAMPLE_RATE; records beyond LOG_QUEUE_SIZE waiting for stdout are dropped.
+LOG_LEVEL = _env("LOG_LEVEL", "INFO").upper()
+LOG_LEVELS = _env("LOG_LEVELS", "")
+LOG_DEBUG_SAMPLE_RATE = float(_env("LOG_DEBUG_SAMPLE_RATE", "0.01"))
+LOG_QUEUE_SIZE = int(_env("LOG_QUEUE_SIZE", "10000"))
+configure_logging(LOG_LEVEL, LOG_LEVELS, LOG_DEBUG_SAMPLE_RATE, LOG_QUEUE_SIZE)
+
 #aws region
 AWS_REGION = _env("AWS_REGION", "ap-south-1")
 
@@ -36,6 +44,8 @@ MODEL_PROVIDER = _env("MODEL_PROVIDER", "bedrock")
 
 # OPEN API Key
 OPENAI_API_KEY = _env("OPENAI_API_KEY", "")
+# Optional OpenAI-compatible endpoint (proxy, gateway or local stand-in)
+OPENAI_BASE_URL = _env("OPENAI_BASE_URL", None)
 
 # Mistral Credentials
 MISTRAL_API_KEY=_env("MISTRAL_API_KEY", "")
@@ -67,13 +77,14 @@ OCR_PAGE_STATE_NAME = _env("OCR_PAGE_STATE_NAME", "ocr_page_state")
 
 # tracks status of pages processed by embedding service provider
 EMBEDDER_PAGE_STATE_NAME = _env("EMBEDDER_PAGE_STATE_NAME", "embedder_page_state")
+EMBEDDER_PAGE_STATE_KEY = _env("EMBEDDER_PAGE_STATE_KEY", "page_id")  # partition key attribute
 
 # Worker tuning
 MAX_MESSAGES = int(_env("MAX_MESSAGES", "10"))
 WAIT_TIME_SECONDS = int(_env("WAIT_TIME_SECONDS", "20"))  # long poll
 VISIBILITY_TIMEOUT = int(_env("VISIBILITY_TIMEOUT", "60"))  # default per-message
 VISIBILITY_EXTENSION_MARGIN = int(_env("VISIBILITY_EXTENSION_MARGIN", "10"))
-MAX_CONCURRENT_TASKS = int(_env("MAX_CONCURRENT_TASKS", "200"))  # global
+MAX_CONCURRENT_TASKS = int(_env("MAX_CONCURRENT_TASKS", "200"))  # per worker process
 MAX_WORKERS_PER_QUEUE = int(_env("MAX_WORKERS_PER_QUEUE", "100"))
 
 # Retry / DLQ policy
@@ -93,22 +104,132 @@ THREAD_POOL_WORKERS = int(_env("THREAD_POOL_WORKERS", "32"))
 JSONL_MAX_CHUNK_SIZE_MB = int(_env("JSONL_MAX_CHUNK_SIZE_MB", "40"))
 JSONL_MAX_NUM_PAGES = int(_env("JSONL_MAX_NUM_PAGES", "950"))
 
+# Shared client pools
+HTTP_POOL_SIZE = int(_env("HTTP_POOL_SIZE", "100"))
+HTTP_POOL_SIZE_PER_HOST = int(_env("HTTP_POOL_SIZE_PER_HOST", "0"))  # 0 = no per-host limit
+HTTP_KEEPALIVE_TIMEOUT = float(_env("HTTP_KEEPALIVE_TIMEOUT", "30"))
+HTTP_CONNECT_TIMEOUT = float(_env("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_REQUEST_TIMEOUT = float(_env("HTTP_REQUEST_TIMEOUT", "60"))
+BEDROCK_POOL_SIZE = int(_env("BEDROCK_POOL_SIZE", "128"))
+BEDROCK_EXECUTOR_WORKERS = int(_env("BEDROCK_EXECUTOR_WORKERS", str(BEDROCK_POOL_SIZE)))
+BEDROCK_MAX_CONCURRENCY_PER_MODEL = int(_env("BEDROCK_MAX_CONCURRENCY_PER_MODEL", "64"))
+OPENAI_POOL_SIZE = int(_env("OPENAI_POOL_SIZE", "100"))
+OPENAI_MAX_RETRIES = int(_env("OPENAI_MAX_RETRIES", "2"))
+
+# Admission control: MAX_CONCURRENT_TASKS requests run at once, up to ADMISSION_MAX_QUEUE wait
+# (at most ADMISSION_QUEUE_TIMEOUT seconds), the rest get 429. Stages default to MAX_WORKERS_PER_QUEUE.
+# All of these limits are per process; rag_server with SERVER_WORKERS=N admits N times as many.
+ADMISSION_MAX_QUEUE = int(_env("ADMISSION_MAX_QUEUE", "100"))
+ADMISSION_QUEUE_TIMEOUT = float(_env("ADMISSION_QUEUE_TIMEOUT", "5"))
+STAGE_CONCURRENCY_EMBEDDING = int(_env("STAGE_CONCURRENCY_EMBEDDING", str(MAX_WORKERS_PER_QUEUE)))
+STAGE_CONCURRENCY_SEARCH = int(_env("STAGE_CONCURRENCY_SEARCH", str(MAX_WORKERS_PER_QUEUE)))
+STAGE_CONCURRENCY_RERANK = int(_env("STAGE_CONCURRENCY_RERANK", str(MAX_WORKERS_PER_QUEUE)))
+STAGE_CONCURRENCY_GENERATION = int(_env("STAGE_CONCURRENCY_GENERATION", str(MAX_WORKERS_PER_QUEUE)))
+
+# Per-request latency budget (GenerateRequest.budget_ms overrides; 0 disables). Rerank may only use
+# what is left after reserving BUDGET_GENERATION_MS for generation and is skipped below BUDGET_RERANK_MIN_MS;
+# the context is halved when less than BUDGET_GENERATION_MS remains and the answer is dropped below BUDGET_ANSWER_MIN_MS.
+REQUEST_BUDGET_MS = int(_env("REQUEST_BUDGET_MS", "15000"))
+BUDGET_GENERATION_MS = int(_env("BUDGET_GENERATION_MS", "4000"))
+BUDGET_RERANK_MIN_MS = int(_env("BUDGET_RERANK_MIN_MS", "500"))
+BUDGET_ANSWER_MIN_MS = int(_env("BUDGET_ANSWER_MIN_MS", "1000"))
+
+# Ingestion worker (SQS -> S3 OCR JSONL -> chunks -> embeddings -> OpenSearch _bulk)
+INGEST_CHUNK_TOKENS = int(_env("INGEST_CHUNK_TOKENS", "400"))
+INGEST_CHUNK_OVERLAP_TOKENS = int(_env("INGEST_CHUNK_OVERLAP_TOKENS", "50"))
+INGEST_READ_BATCH_LINES = int(_env("INGEST_READ_BATCH_LINES", "200"))
+INGEST_EMBED_BATCH_SIZE = int(_env("INGEST_EMBED_BATCH_SIZE", "256"))
+INGEST_EMBED_CONCURRENCY = int(_env("INGEST_EMBED_CONCURRENCY", "4"))
+INGEST_BULK_MIN_BYTES = int(_env("INGEST_BULK_MIN_BYTES", str(512 * 1024)))
+INGEST_BULK_MAX_BYTES = int(_env("INGEST_BULK_MAX_BYTES", str(8 * 1024 * 1024)))
+INGEST_BULK_TARGET_SECONDS = float(_env("INGEST_BULK_TARGET_SECONDS", "2"))
+INGEST_BULK_MAX_RETRIES = int(_env("INGEST_BULK_MAX_RETRIES", "5"))
+# Skip embedding/indexing chunks whose content hash matches EMBEDDER_PAGE_STATE_NAME
+INGEST_SKIP_UNCHANGED = _env("INGEST_SKIP_UNCHANGED", "true").lower() == "true"
+
+# Context packing between rerank and generation: near-duplicate chunks (word 3-gram containment
+# >= CONTEXT_DEDUP_THRESHOLD) are dropped, overlaps of CONTEXT_MIN_OVERLAP_WORDS+ words with kept chunks
+# are cut, and each chunk is trimmed to CONTEXT_CHUNK_MAX_TOKENS within a CONTEXT_MAX_TOKENS total
+CONTEXT_MAX_TOKENS = int(_env("CONTEXT_MAX_TOKENS", "3000"))
+CONTEXT_CHUNK_MAX_TOKENS = int(_env("CONTEXT_CHUNK_MAX_TOKENS", "800"))
+CONTEXT_DEDUP_THRESHOLD = float(_env("CONTEXT_DEDUP_THRESHOLD", "0.8"))
+CONTEXT_MIN_OVERLAP_WORDS = int(_env("CONTEXT_MIN_OVERLAP_WORDS", "8"))
+CONTEXT_MIN_CHUNK_TOKENS = int(_env("CONTEXT_MIN_CHUNK_TOKENS", "32"))
+
+# Adaptive retrieval (knn mode): skip rerank and send ADAPTIVE_CONFIDENT_N chunks when the top hit scores
+# >= ADAPTIVE_CONFIDENT_SCORE with a lead of ADAPTIVE_CONFIDENT_MARGIN (and few others score as high); widen k by ADAPTIVE_WIDEN_FACTOR
+# (up to ADAPTIVE_MAX_K) when all k hits are within ADAPTIVE_AMBIGUOUS_SPREAD of the top score
+ADAPTIVE_RETRIEVAL = _env("ADAPTIVE_RETRIEVAL", "true").lower() == "true"
+ADAPTIVE_CONFIDENT_SCORE = float(_env("ADAPTIVE_CONFIDENT_SCORE", "0.85"))
+ADAPTIVE_CONFIDENT_MARGIN = float(_env("ADAPTIVE_CONFIDENT_MARGIN", "0.05"))
+ADAPTIVE_CONFIDENT_N = int(_env("ADAPTIVE_CONFIDENT_N", "3"))
+ADAPTIVE_AMBIGUOUS_SPREAD = float(_env("ADAPTIVE_AMBIGUOUS_SPREAD", "0.02"))
+ADAPTIVE_WIDEN_FACTOR = int(_env("ADAPTIVE_WIDEN_FACTOR", "2"))
+ADAPTIVE_MAX_K = int(_env("ADAPTIVE_MAX_K", "100"))
+
+# Batch endpoint
+BATCH_MAX_QUERIES = int(_env("BATCH_MAX_QUERIES", "500"))
+BATCH_MAX_CONCURRENCY = int(_env("BATCH_MAX_CONCURRENCY", "8"))
+
 # FAST API
 API_HOST= _env("HOST", "0.0.0.0")
 API_PORT= int(_env("PORT", "8080"))
 
+# Production server (rag_server): SERVER_WORKERS=0 runs one process per CPU available to the container.
+# Keep-alive outlasts the load balancer's idle timeout (60s on ALB) so it never reuses a closed socket.
+SERVER_WORKERS = int(_env("SERVER_WORKERS", "0"))
+SERVER_BACKLOG = int(_env("SERVER_BACKLOG", "2048"))
+SERVER_KEEPALIVE_TIMEOUT = int(_env("SERVER_KEEPALIVE_TIMEOUT", "75"))
+SERVER_GRACEFUL_TIMEOUT = int(_env("SERVER_GRACEFUL_TIMEOUT", "30"))
+SERVER_LOG_LEVEL = _env("SERVER_LOG_LEVEL", "info").lower()
+# Pre-warming before /readyz passes: PREWARM_CONNECTIONS keep-alive connections per upstream
+PREWARM_ENABLED = _env("PREWARM_ENABLED", "true").lower() == "true"
+PREWARM_CONNECTIONS = int(_env("PREWARM_CONNECTIONS", "4"))
+PREWARM_TIMEOUT = float(_env("PREWARM_TIMEOUT", "20"))
+
 #OpenSearch
 OPENSEARCH_HOST= _env("OPENSEARCH_HOST", "")
 OPENSEARCH_INDEX= _env("OPENSEARCH_INDEX", "text-embeds")
 RETRIEVAL_K = int(_env("RETRIEVAL_K", "30"))
+VECTOR_MIN_SCORE = float(_env("VECTOR_MIN_SCORE", "0.50"))
+
+# Retrieval mode: "knn" or "hybrid" (BM25 + kNN in one _msearch, fused with reciprocal rank fusion)
+RETRIEVAL_MODE = _env("RETRIEVAL_MODE", "knn").lower()
+HYBRID_KNN_K = int(_env("HYBRID_KNN_K", "20"))
+HYBRID_LEXICAL_K = int(_env("HYBRID_LEXICAL_K", "20"))
+HYBRID_VECTOR_WEIGHT = float(_env("HYBRID_VECTOR_WEIGHT", "1.0"))
+HYBRID_LEXICAL_WEIGHT = float(_env("HYBRID_LEXICAL_WEIGHT", "1.0"))
+RRF_K = int(_env("RRF_K", "60"))
+
+# Retrieval backend: "opensearch" or "local" (memory-mapped index, see text_rag.local_index)
+RETRIEVAL_BACKEND = _env("RETRIEVAL_BACKEND", "opensearch").lower()
+LOCAL_INDEX_PATH = _env("LOCAL_INDEX_PATH", "")
+LOCAL_INDEX_MODE = _env("LOCAL_INDEX_MODE", "flat").lower()  # "flat" (exact) or "ivf"
+LOCAL_INDEX_NPROBE = int(_env("LOCAL_INDEX_NPROBE", "8"))
 RERANK_TOP_N= int(_env("RERANK_TOP_N", "5"))
+RERANK_MODE = _env("RERANK_MODE", "llm").lower()  # "llm" or "local" (in-process cosine + MMR)
+MMR_LAMBDA = float(_env("MMR_LAMBDA", "0.7"))
+RERANK_SHARD_SIZE = int(_env("RERANK_SHARD_SIZE", "10"))
+RERANK_DOC_MAX_TOKENS = int(_env("RERANK_DOC_MAX_TOKENS", "256"))
+RERANK_SHARD_TIMEOUT = float(_env("RERANK_SHARD_TIMEOUT", "10"))
 
 #Embeddings Model
 EMBEDDING_MODEL= _env("EMBEDDING_MODEL", "amazon.titan-embed-text-v2:0")
-EMBEDDING_OUTPUT_DIM = _env("EMBEDDING_OUTPUT_DIM", "1024")
+EMBEDDING_OUTPUT_DIM = _env("EMBEDDING_OUTPUT_DIM", "1024")  # requested from the model; "" keeps its default
+EMBEDDING_BATCH_MAX_SIZE = int(_env("EMBEDDING_BATCH_MAX_SIZE", "64"))
+EMBEDDING_BATCH_WINDOW_MS = float(_env("EMBEDDING_BATCH_WINDOW_MS", "5"))
 RERANK_MODEL= _env("RERANK_MODEL", "amazon.titan-rerank")
 COMPLETION_MODEL = _env("COMPLETION_MODEL", "amazon.titan-complete")
 
+# kNN vector precision: "float" or "byte" (int8, OpenSearch lucene engine; vectors are scaled by
+# VECTOR_INT8_SCALE and clipped). Byte indexes keep a float copy in VECTOR_FULL_FIELD (stored, not indexed);
+# with VECTOR_RESCORE_OVERSAMPLE > 1, k * oversample hits are fetched and rescored against it (each hit then
+# carries its float vector, ~10 KB of JSON at 1024 dims, so keep the factor small).
+VECTOR_DATA_TYPE = _env("VECTOR_DATA_TYPE", "float").lower()
+VECTOR_INT8_SCALE = float(_env("VECTOR_INT8_SCALE", "127"))
+VECTOR_FULL_FIELD = _env("VECTOR_FULL_FIELD", "embedding_full")
+VECTOR_RESCORE_OVERSAMPLE = float(_env("VECTOR_RESCORE_OVERSAMPLE", "0"))
+
 #Bedrock
 # BEDROCK_CLIENT_NAME= _env("BEDROCK_CLIENT_NAME", "bedrock")
 # BEDROCK_EMBEDDING_MODEL= _env("BEDROCK_EMBEDDING_MODEL", "amazon.titan-embedding")
@@ -119,5 +240,33 @@ COMPLETION_MODEL = _env("COMPLETION_MODEL", "amazon.titan-complete")
 REDIS_HOST= _env("REDIS_HOST", "redis.localstack")
 REDIS_PORT= int(_env("REDIS_PORT", "6379"))
 
+#Stage caches (bump CACHE_VERSION to invalidate every layer at once)
+CACHE_VERSION = _env("CACHE_VERSION", "2")
+CACHE_TTL_RESPONSE = int(_env("CACHE_TTL_RESPONSE", "300"))
+CACHE_TTL_EMBEDDING = int(_env("CACHE_TTL_EMBEDDING", "86400"))
+CACHE_TTL_RETRIEVAL = int(_env("CACHE_TTL_RETRIEVAL", "900"))
+CACHE_TTL_RERANK = int(_env("CACHE_TTL_RERANK", "3600"))
+CACHE_TTL_ANSWER = int(_env("CACHE_TTL_ANSWER", "3600"))
+# Response and retrieval entries reference chunk texts stored once under their own keys; a chunk
+# outlives every entry that can reference it. Values are orjson (text_rag.codec), compressed with
+# zstd (zlib without the zstandard package) from CACHE_COMPRESS_MIN_BYTES up.
+CACHE_TTL_CHUNK = int(_env("CACHE_TTL_CHUNK", str(max(CACHE_TTL_RESPONSE, CACHE_TTL_RETRIEVAL))))
+CACHE_COMPRESS_MIN_BYTES = int(_env("CACHE_COMPRESS_MIN_BYTES", "1024"))
+CACHE_COMPRESS_LEVEL = int(_env("CACHE_COMPRESS_LEVEL", "3"))
+
+#In-process L1 cache (bounded by bytes) and single-flight query coalescing; each rag_server
+#worker holds its own, so memory use is L1_CACHE_MAX_BYTES times SERVER_WORKERS
+L1_CACHE_MAX_BYTES = int(_env("L1_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+L1_CACHE_TTL = float(_env("L1_CACHE_TTL", "60"))
+SINGLE_FLIGHT_ENABLED = _env("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+
+#Semantic cache (in-process: entries are per worker and not shared between them). Entries hold
+#whole responses, so they expire like the response layer and are keyed by CACHE_VERSION too.
+SEMANTIC_CACHE_ENABLED = _env("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+SEMANTIC_CACHE_TTL = int(_env("SEMANTIC_CACHE_TTL", str(CACHE_TTL_RESPONSE)))
+SEMANTIC_CACHE_THRESHOLD = float(_env("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_NEAR_MISS_MARGIN = float(_env("SEMANTIC_CACHE_NEAR_MISS_MARGIN", "0.05"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(_env("SEMANTIC_CACHE_MAX_ENTRIES", "2048"))
+
 #ALLOWED IPS
 #ALLOWLISTED_IPS = _env("ALLOWLISTED_IPS", "")
@@ -0,0 +1,103 @@
+from typing import Any, Dict, List, Set, Tuple
+
+from text_rag.config import (
+    CONTEXT_MAX_TOKENS,
+    CONTEXT_CHUNK_MAX_TOKENS,
+    CONTEXT_DEDUP_THRESHOLD,
+    CONTEXT_MIN_OVERLAP_WORDS,
+    CONTEXT_MIN_CHUNK_TOKENS,
+)
+from text_rag.metrics import CONTEXT_TOKENS, CONTEXT_CHUNKS_DROPPED
+from text_rag.utils import estimate_tokens, truncate_to_tokens
+from text_rag.logger import get_logger
+
+logger = get_logger("text_rag.context")
+
+_SHINGLE = 3
+
+
+def _shingles(words: List[str]) -> Set[Tuple[str, ...]]:
+    if len(words) < _SHINGLE:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i:i + _SHINGLE]) for i in range(len(words) - _SHINGLE + 1)}
+
+
+def _overlap(head: List[str], tail: List[str], min_words: int) -> int:
+    """Length of the longest suffix of `tail` that is also a prefix of `head` (0 if under `min_words`)."""
+    if len(head) < min_words or len(tail) < min_words:
+        return 0
+    probe = head[:min_words]
+    for start in range(max(0, len(tail) - len(head)), len(tail) - min_words + 1):
+        if tail[start:start + min_words] == probe and tail[start:] == head[:len(tail) - start]:
+            return len(tail) - start
+    return 0
+
+
+def pack_context(chunks: List[Dict[str, Any]], max_tokens: int = CONTEXT_MAX_TOKENS,
+                 chunk_max_tokens: int = CONTEXT_CHUNK_MAX_TOKENS,
+                 dedup_threshold: float = CONTEXT_DEDUP_THRESHOLD,
+                 min_overlap_words: int = CONTEXT_MIN_OVERLAP_WORDS) -> Tuple[List[Dict[str, Any]], Dict[str, int]]:
+    """
+    Select and trim reranked chunks into a context that fits `max_tokens`.
+
+    Chunks are taken in rank order. A chunk is dropped when at least `dedup_threshold`
+    of its word 3-grams already appear in a kept chunk (duplicates, or one chunk
+    contained in another). Text that overlaps a kept chunk at either end, as adjacent
+    chunks and pages do, is cut off. Each chunk is then trimmed to `chunk_max_tokens`,
+    and packing stops once the total budget is spent. The last chunk is trimmed to
+    fit if at least CONTEXT_MIN_CHUNK_TOKENS of budget remain.
+
+    Returns:
+        (packed, stats): packed chunks as {"doc_id", "text"} in rank order, and token/chunk counts
+    """
+    kept: List[Dict[str, Any]] = []
+    kept_words: List[List[str]] = []
+    kept_shingles: List[Set[Tuple[str, ...]]] = []
+    stats = {"chunks_in": len(chunks), "chunks_out": 0, "duplicates": 0, "over_budget": 0,
+             "tokens_in": 0, "tokens_out": 0, "tokens_saved": 0}
+    remaining = max_tokens
+
+    for chunk in chunks:
+        text = chunk.get("text") or ""
+        stats["tokens_in"] += estimate_tokens(text)
+        words = text.split()
+        if not words:
+            continue
+
+        shingles = _shingles(words)
+        if any(len(shingles & seen) >= dedup_threshold * len(shingles) for seen in kept_shingles):
+            stats["duplicates"] += 1
+            continue
+
+        for other in kept_words:
+            words = words[_overlap(words, other, min_overlap_words):]
+            if words:
+                cut = _overlap(other, words, min_overlap_words)
+                words = words[:len(words) - cut]
+            if not words:
+                break
+        if not words:
+            stats["duplicates"] += 1
+            continue
+
+        if remaining < CONTEXT_MIN_CHUNK_TOKENS:
+            stats["over_budget"] += 1
+            continue
+        packed = truncate_to_tokens(" ".join(words), min(chunk_max_tokens, remaining))
+        remaining -= estimate_tokens(packed)
+        kept.append({"doc_id": chunk.get("doc_id"), "text": packed})
+        # later chunks are compared with what the generator sees, not with the text cut off here
+        packed_words = packed.split()
+        kept_words.append(packed_words)
+        kept_shingles.append(_shingles(packed_words))
+
+    stats["chunks_out"] = len(kept)
+    stats["tokens_out"] = max_tokens - remaining
+    stats["tokens_saved"] = max(0, stats["tokens_in"] - stats["tokens_out"])
+
+    CONTEXT_TOKENS.labels("retrieved").inc(stats["tokens_in"])
+    CONTEXT_TOKENS.labels("packed").inc(stats["tokens_out"])
+    CONTEXT_CHUNKS_DROPPED.labels("duplicate").inc(stats["duplicates"])
+    CONTEXT_CHUNKS_DROPPED.labels("over_budget").inc(stats["over_budget"])
+    logger.info("packed context", **stats)
+    return kept, stats
@@ -0,0 +1,63 @@
+import asyncio
+import time
+from typing import Awaitable, List, Optional, TypeVar
+
+from text_rag.config import REQUEST_BUDGET_MS
+from text_rag.metrics import FALLBACKS
+from text_rag.logger import get_logger
+
+logger = get_logger("text_rag.deadline")
+
+T = TypeVar("T")
+
+
+class DeadlineExceeded(Exception):
+    """A stage with no degraded alternative (embedding, retrieval) ran out of budget."""
+
+    def __init__(self, stage: str, budget_ms: float):
+        super().__init__(f"{stage} exceeded the {budget_ms:.0f} ms request budget")
+        self.stage = stage
+
+
+class Deadline:
+    """
+    Latency budget of one request, started when it is created.
+
+    Stages ask for the time left (optionally minus a reserve for later stages) and
+    record any degradation they apply instead of running long; the recorded list
+    is returned to the client. A budget of 0 or None means unbounded.
+    """
+
+    def __init__(self, budget_ms: Optional[float] = None):
+        budget_ms = REQUEST_BUDGET_MS if budget_ms is None else budget_ms
+        self.budget_ms = budget_ms if budget_ms and budget_ms > 0 else None
+        self.started = time.monotonic()
+        self.degraded: List[str] = []
+
+    @property
+    def bounded(self) -> bool:
+        return self.budget_ms is not None
+
+    def remaining_ms(self) -> float:
+        if self.budget_ms is None:
+            return float("inf")
+        return max(0.0, self.budget_ms - (time.monotonic() - self.started) * 1000)
+
+    def timeout(self, reserve_ms: float = 0) -> Optional[float]:
+        """Seconds a stage may take while leaving `reserve_ms` for later ones; None when unbounded."""
+        if self.budget_ms is None:
+            return None
+        return max(0.0, self.remaining_ms() - reserve_ms) / 1000
+
+    def degrade(self, degradation: str, stage: str, reason: str) -> None:
+        self.degraded.append(degradation)
+        FALLBACKS.labels(stage, reason).inc()
+        logger.warning(f"{degradation} ({stage}: {reason}, {self.remaining_ms():.0f} ms left)")
+
+    async def run(self, stage: str, aw: Awaitable[T]) -> T:
+        """Await a stage that cannot be degraded; raises DeadlineExceeded if the budget runs out."""
+        try:
+            return await asyncio.wait_for(aw, self.timeout())
+        except asyncio.TimeoutError:
+            FALLBACKS.labels(stage, "deadline").inc()
+            raise DeadlineExceeded(stage, self.budget_ms) from None
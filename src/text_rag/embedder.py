@@ -0,0 +1,97 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from text_rag.config import EMBEDDING_BATCH_MAX_SIZE, EMBEDDING_BATCH_WINDOW_MS, MODEL_PROVIDER
+from text_rag.utils import invoke_embedding_batch
+from text_rag.metrics import PROVIDER_ERRORS
+from text_rag.logger import get_logger
+
+logger = get_logger("text_rag.embedder")
+
+Vector = Optional[List[float]]
+
+
+class EmbeddingBatcher:
+    """
+    Merges concurrent embedding requests into batched provider calls.
+
+    The first request opens a collection window of `window_ms`; everything that
+    arrives before it closes (or until `max_batch_size` is reached) is sent as one
+    call and the vectors are fanned back out to the waiting callers. Identical
+    texts in the same batch are embedded once.
+    """
+
+    def __init__(self, embed_batch: Callable[[List[str]], Awaitable[List[Vector]]],
+                 max_batch_size: int = EMBEDDING_BATCH_MAX_SIZE,
+                 window_ms: float = EMBEDDING_BATCH_WINDOW_MS):
+        self._embed_batch = embed_batch
+        self.max_batch_size = max_batch_size
+        self.window = window_ms / 1000.0
+        self._pending: List[Tuple[str, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self.batches = 0
+        self.items = 0
+
+    async def embed(self, text: str) -> Vector:
+        loop = asyncio.get_running_loop()
+        fut = loop.create_future()
+        self._pending.append((text, fut))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._flush)
+        return await fut
+
+    async def embed_many(self, texts: List[str]) -> List[Vector]:
+        return list(await asyncio.gather(*(self.embed(t) for t in texts)))
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._pending = self._pending[:self.max_batch_size], self._pending[self.max_batch_size:]
+        if self._pending:
+            self._timer = asyncio.get_running_loop().call_later(self.window, self._flush)
+        if batch:
+            task = asyncio.ensure_future(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[str, asyncio.Future]]) -> None:
+        unique: Dict[str, int] = {}
+        for text, _ in batch:
+            unique.setdefault(text, len(unique))
+        texts = list(unique)
+        self.batches += 1
+        self.items += len(batch)
+        try:
+            vectors = await self._embed_batch(texts)
+            logger.debug("embedded batch", texts=len(texts), requests=len(batch))
+        except Exception as e:
+            PROVIDER_ERRORS.labels(MODEL_PROVIDER, "embedding").inc()
+            logger.error(f"batched embedding failed - {e}")
+            for _, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        for text, fut in batch:
+            if not fut.done():
+                fut.set_result(vectors[unique[text]])
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+        }
+
+
+_batcher: Optional[EmbeddingBatcher] = None
+
+
+def get_embedding_batcher() -> EmbeddingBatcher:
+    global _batcher
+    if _batcher is None:
+        _batcher = EmbeddingBatcher(invoke_embedding_batch)
+    return _batcher
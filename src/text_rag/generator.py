@@ -1,14 +1,11 @@
-import json
-from typing import Dict, Any, List
+from typing import Dict, Any, List, AsyncIterator
 
-from openai import AsyncOpenAI
-from text_rag.aws_clients import bedrock_client
+from text_rag.clients import get_registry
 from text_rag.config import COMPLETION_MODEL, MODEL_PROVIDER
+from text_rag.metrics import PROVIDER_ERRORS
 from text_rag.logger import get_logger
 from dataclasses import dataclass
 
-from text_rag.config import OPENAI_API_KEY
-
 logger = get_logger("text_rag.generator")
 
 BEDROCK_SYSTEM_PROMPT = """
@@ -35,44 +32,47 @@ class AnswerResult:
     raw_model_response: Dict[str, Any]
     metadata: Dict[str, Any]
 
-def bedrock_generator(question: str, context_chunks: list) -> str:
-    client = bedrock_client()
-    context_text = "\n\n".join([f"[id={c['id']}] {c['chunk']}" for c in context_chunks])
-    prompt = BEDROCK_SYSTEM_PROMPT.format(context=context_text, question=question)
+def build_context(context_chunks: list) -> str:
+    """One compact context block; chunks are {"doc_id", "text"} dicts (as packed by text_rag.context) or plain strings."""
+    parts = []
+    for c in context_chunks:
+        parts.append(f"[id={c['doc_id']}] {c['text']}" if isinstance(c, dict) else str(c))
+    return "\n\n".join(parts)
+
+def build_bedrock_prompt(question: str, context_chunks: list) -> str:
+    return BEDROCK_SYSTEM_PROMPT.format(context=build_context(context_chunks), question=question)
+
+async def bedrock_generator(question: str, context_chunks: list) -> str:
+    bedrock = get_registry().bedrock_async()
+    prompt = build_bedrock_prompt(question, context_chunks)
     try:
-        resp = client.invoke_model(
-            modelId=COMPLETION_MODEL,
-            contentType="application/json",
-            accept="application/json",
-            body=json.dumps({"inputText": prompt, "maxTokens": 512})
-        )
-        payload = json.loads(resp['body'].read())
+        payload = await bedrock.invoke_model(COMPLETION_MODEL, {"inputText": prompt, "maxTokens": 512})
         answer = payload.get('outputText') or payload.get('choices', [{}])[0].get('text')
-        logger.info(f"successfully generated answer.")
+        logger.debug("successfully generated answer.")
     except Exception as e:
         answer = "[error] failed to generate answer"
+        PROVIDER_ERRORS.labels("bedrock", "generation").inc()
         logger.error(f"failed to generate answer: {e}")
     return answer
 
-def build_messages(question: str, context_chunks: List[str]) -> List[Dict[str, str]]:
-    messages: List[Dict[str, str]] = [{"role": "system", "content": OPENAI_SYSTEM_PROMPT}]
-    for i, c in enumerate(context_chunks, start=1):
-        messages.append({"role": "user", "content": f"--- CONTEXT [{i}] ---\n{c}"})
-    messages.append({"role": "user", "content": f"QUESTION: {question}"})
-    return messages
+def build_messages(question: str, context_chunks: list) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": OPENAI_SYSTEM_PROMPT},
+        {"role": "user", "content": f"--- CONTEXT ---\n{build_context(context_chunks)}\n\nQUESTION: {question}"},
+    ]
 
 async def openai_generator(
     question: str,
-    context: str | List[str],
+    context: str | list,
 ) -> AnswerResult:
     """
     Given a question and context, produce an answer using gpt-5-nano.
     Args:
         question: user’s question
-        context: either a string or list of strings
+        context: a string, or a list of chunk dicts / strings
     """
     chunks = [context] if isinstance(context, str) else list(context)
-    client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+    client = get_registry().openai()
 
     messages = build_messages(question, chunks)
 
@@ -95,12 +95,53 @@ async def openai_generator(
 
 async def invoke_generator_model(question: str, context_chunks: list) -> str :
     if MODEL_PROVIDER == 'openai':
-        logger.info("Initializing Open API generator model")
-        results = await openai_generator(question, context_chunks)
+        logger.debug("Initializing Open API generator model")
+        try:
+            results = await openai_generator(question, context_chunks)
+        except Exception:
+            PROVIDER_ERRORS.labels("openai", "generation").inc()
+            raise
         return results.answer
     elif MODEL_PROVIDER == 'bedrock':
-        logger.info("Initializing Bedrock generator model")
-        results = bedrock_generator(question, context_chunks)
+        logger.debug("Initializing Bedrock generator model")
+        results = await bedrock_generator(question, context_chunks)
         return results
     else:
-        raise ValueError(f"Unknown MODEL_PROVIDER: {MODEL_PROVIDER}")
\ No newline at end of file
+        raise ValueError(f"Unknown MODEL_PROVIDER: {MODEL_PROVIDER}")
+
+
+async def bedrock_stream_generator(question: str, context_chunks: list) -> AsyncIterator[str]:
+    bedrock = get_registry().bedrock_async()
+    prompt = build_bedrock_prompt(question, context_chunks)
+    async for payload in bedrock.invoke_model_stream(COMPLETION_MODEL, {"inputText": prompt, "maxTokens": 512}):
+        text = payload.get('outputText') or payload.get('completion') or payload.get('delta', {}).get('text')
+        if text:
+            yield text
+
+async def openai_stream_generator(question: str, context: str | list) -> AsyncIterator[str]:
+    chunks = [context] if isinstance(context, str) else list(context)
+    client = get_registry().openai()
+    stream = await client.chat.completions.create(
+        model=COMPLETION_MODEL,
+        messages=build_messages(question, chunks),
+        max_completion_tokens=512,
+        temperature=1,
+        stream=True,
+    )
+    async for event in stream:
+        if not event.choices:
+            continue
+        delta = event.choices[0].delta.content
+        if delta:
+            yield delta
+
+def stream_generator_model(question: str, context_chunks: list) -> AsyncIterator[str]:
+    """Yield answer text deltas as the model produces them."""
+    if MODEL_PROVIDER == 'openai':
+        logger.debug("Initializing Open API streaming generator model")
+        return openai_stream_generator(question, context_chunks)
+    elif MODEL_PROVIDER == 'bedrock':
+        logger.debug("Initializing Bedrock streaming generator model")
+        return bedrock_stream_generator(question, context_chunks)
+    else:
+        raise ValueError(f"Unknown MODEL_PROVIDER: {MODEL_PROVIDER}")
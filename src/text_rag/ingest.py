@@ -0,0 +1,688 @@
+"""
+SQS-driven ingestion worker: OCR JSONL objects in S3 -> chunks -> embeddings -> OpenSearch.
+
+    python -m text_rag.ingest                          # long-poll OCR_JSONL_SQS_QUEUE_NAME
+    python -m text_rag.ingest --object s3://bucket/key # index a single object and exit
+    python -m text_rag.ingest --object s3://bucket/key --dry-run  # report what would be (re)indexed
+    python -m text_rag.ingest --create-index           # create OPENSEARCH_INDEX with the kNN mapping
+
+Each message names one or more S3 objects (an S3 event notification or
+{"bucket": ..., "key": ...}). Objects are streamed line by line, pages are
+chunked in a process pool, chunks are embedded in large batches and written
+with `_bulk` requests whose size adapts to how fast OpenSearch accepts them.
+Chunk ids are deterministic, so reprocessing an object overwrites its chunks.
+With INGEST_SKIP_UNCHANGED, chunks whose content hash matches the page state
+table are not re-embedded, and chunks that vanished from a page are deleted.
+"""
+import argparse
+import asyncio
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from urllib.parse import unquote_plus
+
+import orjson
+
+from text_rag.clients import get_registry
+from text_rag.config import (
+    OPENSEARCH_HOST,
+    OPENSEARCH_INDEX,
+    OCR_JSONL_SQS_QUEUE_NAME,
+    OCR_JSONL_DLQ_QUEUE_NAME,
+    MAX_MESSAGES,
+    WAIT_TIME_SECONDS,
+    VISIBILITY_TIMEOUT,
+    VISIBILITY_EXTENSION_MARGIN,
+    MAX_WORKERS_PER_QUEUE,
+    MAX_RECEIVE_COUNT,
+    RETRY_BACKOFF_BASE,
+    RETRY_BACKOFF_MAX,
+    PROCESS_POOL_WORKERS,
+    INGEST_CHUNK_TOKENS,
+    INGEST_CHUNK_OVERLAP_TOKENS,
+    INGEST_READ_BATCH_LINES,
+    INGEST_EMBED_BATCH_SIZE,
+    INGEST_EMBED_CONCURRENCY,
+    INGEST_BULK_MIN_BYTES,
+    INGEST_BULK_MAX_BYTES,
+    INGEST_BULK_TARGET_SECONDS,
+    INGEST_BULK_MAX_RETRIES,
+    INGEST_SKIP_UNCHANGED,
+    EMBEDDING_OUTPUT_DIM,
+    VECTOR_DATA_TYPE,
+    VECTOR_FULL_FIELD,
+)
+from text_rag.metrics import (
+    INGEST_MESSAGES,
+    INGEST_CHUNKS,
+    BULK_TARGET_BYTES,
+    PROVIDER_ERRORS,
+    stage_timer,
+    start_metrics_server,
+)
+from text_rag.page_state import PageStateStore, content_hash, page_id
+from text_rag.retriever import _sign_request
+from text_rag.utils import (CHARS_PER_TOKEN, estimate_tokens, index_vector, invoke_embedding_batch, knn_engine,
+                           retry_backoff)
+from text_rag.logger import get_logger
+
+logger = get_logger("text_rag.ingest")
+
+Page = Tuple[str, int, str]
+
+
+# ---- parsing and chunking ---------------------------------------------------
+
+def parse_s3_objects(body: str) -> List[Tuple[str, str]]:
+    """(bucket, key) pairs named by a message body: an S3 event notification or {"bucket", "key"}."""
+    data = orjson.loads(body)
+    if "Records" in data:
+        return [(r["s3"]["bucket"]["name"], unquote_plus(r["s3"]["object"]["key"]))
+                for r in data["Records"] if "s3" in r]
+    return [(data["bucket"], data["key"])]
+
+
+def iter_pages(record: Dict[str, Any], default_doc_id: str) -> Iterator[Page]:
+    """
+    (doc_id, page, text) for each page of an OCR JSONL record.
+
+    Accepts a document with a "pages" list (Mistral OCR shape, optionally wrapped in
+    a batch {"custom_id", "response": {"body": ...}} envelope) or one page per line
+    with "page"/"page_number" and "text"/"markdown".
+    """
+    doc_id = str(record.get("document_id") or record.get("doc_id") or record.get("custom_id")
+                 or record.get("file_id") or default_doc_id)
+    response = record.get("response")
+    body = response.get("body", record) if isinstance(response, dict) else record
+    pages = body.get("pages")
+    if isinstance(pages, list):
+        for i, page in enumerate(pages):
+            yield doc_id, int(page.get("index", i)), page.get("markdown") or page.get("text") or ""
+        return
+    text = record.get("markdown") or record.get("text")
+    if text is not None:
+        yield doc_id, int(record.get("page") or record.get("page_number") or record.get("index") or 0), text
+
+
+def chunk_text(text: str, chunk_chars: int, overlap_chars: int) -> List[str]:
+    """Split on whitespace into windows of about `chunk_chars`, each repeating the last `overlap_chars`."""
+    words = text.split()
+    chunks: List[str] = []
+    start = 0
+    while start < len(words):
+        end, size = start, 0
+        while end < len(words) and (size == 0 or size + len(words[end]) + 1 <= chunk_chars):
+            size += len(words[end]) + 1
+            end += 1
+        chunks.append(" ".join(words[start:end]))
+        if end >= len(words):
+            break
+        # step back over the overlap, but always make progress
+        back, overlap = end, 0
+        while back - 1 > start and overlap + len(words[back - 1]) + 1 <= overlap_chars:
+            back -= 1
+            overlap += len(words[back]) + 1
+        start = back
+    return chunks
+
+
+def chunk_pages(pages: List[Page], chunk_tokens: int = INGEST_CHUNK_TOKENS,
+                overlap_tokens: int = INGEST_CHUNK_OVERLAP_TOKENS) -> List[Dict[str, Any]]:
+    """Process-pool entry point: chunk a batch of pages into {"chunk_id", "doc_id", "page", "chunk", "text"}."""
+    out = []
+    for doc_id, page, text in pages:
+        for i, chunk in enumerate(chunk_text(text, chunk_tokens * CHARS_PER_TOKEN, overlap_tokens * CHARS_PER_TOKEN)):
+            out.append({"chunk_id": f"{doc_id}:{page}:{i}", "doc_id": doc_id, "page": page, "chunk": i, "text": chunk})
+    return out
+
+
+def _take(lines: Iterator[bytes], n: int) -> List[bytes]:
+    batch = []
+    for line in lines:
+        if line.strip():
+            batch.append(line)
+            if len(batch) >= n:
+                break
+    return batch
+
+
+# ---- OpenSearch _bulk -------------------------------------------------------
+
+class BulkWriter:
+    """
+    Buffers index/delete actions and sends them as `_bulk` requests.
+
+    The request size starts between the configured bounds and adapts to the
+    cluster: it shrinks when a request is slower than `target_seconds` or gets
+    throttled, and grows while requests come back well inside the target.
+    Items rejected with 429 are retried with backoff; other item errors are
+    counted as failed.
+    """
+
+    def __init__(self, index: str = OPENSEARCH_INDEX, min_bytes: int = INGEST_BULK_MIN_BYTES,
+                 max_bytes: int = INGEST_BULK_MAX_BYTES, target_seconds: float = INGEST_BULK_TARGET_SECONDS,
+                 max_retries: int = INGEST_BULK_MAX_RETRIES):
+        self.index = index
+        self.min_bytes = min_bytes
+        self.max_bytes = max_bytes
+        self.target_seconds = target_seconds
+        self.max_retries = max_retries
+        self.target_bytes = max(min_bytes, max_bytes // 4)
+        self._ops: List[Tuple[bytes, Optional[bytes]]] = []
+        self._size = 0
+        self._lock = asyncio.Lock()
+        self.indexed = 0
+        self.deleted = 0
+        self.failed = 0
+        self.requests = 0
+
+    async def index_doc(self, doc_id: str, source: Dict[str, Any]) -> None:
+        await self._add(orjson.dumps({"index": {"_index": self.index, "_id": doc_id}}), orjson.dumps(source))
+
+    async def delete_doc(self, doc_id: str) -> None:
+        await self._add(orjson.dumps({"delete": {"_index": self.index, "_id": doc_id}}), None)
+
+    async def _add(self, action: bytes, source: Optional[bytes]) -> None:
+        self._ops.append((action, source))
+        self._size += len(action) + (len(source) if source else 0) + 2
+        if self._size >= self.target_bytes:
+            await self.flush()
+
+    async def flush(self) -> None:
+        async with self._lock:
+            ops, self._ops, self._size = self._ops, [], 0
+            attempt = 0
+            while ops:
+                ops = await self._send(ops)
+                if not ops:
+                    break
+                attempt += 1
+                if attempt > self.max_retries:
+                    self.failed += len(ops)
+                    INGEST_CHUNKS.labels("failed").inc(len(ops))
+                    logger.error(f"giving up on {len(ops)} bulk items after {self.max_retries} retries")
+                    break
+                await asyncio.sleep(retry_backoff(attempt))
+
+    async def _send(self, ops: List[Tuple[bytes, Optional[bytes]]]) -> List[Tuple[bytes, Optional[bytes]]]:
+        """Send one `_bulk` request; returns the operations to retry."""
+        lines = []
+        for action, source in ops:
+            lines.append(action)
+            if source is not None:
+                lines.append(source)
+        body = b"\n".join(lines) + b"\n"
+
+        url = f"{OPENSEARCH_HOST}/_bulk?filter_path=errors,items.*.status,items.*.error.type"
+        headers = _sign_request("POST", url, body, service="es")
+        started = time.perf_counter()
+        with stage_timer("bulk_index"):
+            async with get_registry().http_session().post(
+                url, data=body, headers={**headers, "Content-Type": "application/x-ndjson"}
+            ) as resp:
+                raw = await resp.read()
+                status = resp.status
+        elapsed = time.perf_counter() - started
+        self.requests += 1
+
+        if status == 429 or status >= 500:
+            PROVIDER_ERRORS.labels("opensearch", "bulk_index").inc()
+            self._resize(shrink=True)
+            logger.warning(f"_bulk of {len(body)}B rejected with {status}, next target {self.target_bytes}B")
+            return ops
+        if status != 200:
+            PROVIDER_ERRORS.labels("opensearch", "bulk_index").inc()
+            raise RuntimeError(f"_bulk failed: {status} {raw[:500].decode('utf-8', errors='replace')}")
+
+        result = orjson.loads(raw)
+        retry = []
+        throttled = False
+        for op, item in zip(ops, result.get("items", [])):
+            kind, outcome = next(iter(item.items()))
+            item_status = outcome.get("status", 500)
+            if item_status == 429:
+                throttled = True
+                retry.append(op)
+            elif item_status >= 300 and not (kind == "delete" and item_status == 404):
+                self.failed += 1
+                INGEST_CHUNKS.labels("failed").inc()
+                logger.error(f"bulk {kind} failed: {item_status} {outcome.get('error', {}).get('type')}")
+            elif kind == "delete":
+                self.deleted += 1
+                INGEST_CHUNKS.labels("deleted").inc()
+            else:
+                self.indexed += 1
+                INGEST_CHUNKS.labels("indexed").inc()
+
+        self._resize(shrink=throttled or elapsed > self.target_seconds,
+                     grow=not throttled and elapsed < self.target_seconds / 2)
+        logger.info(f"_bulk {len(ops)} ops {len(body)}B in {elapsed:.2f}s "
+                    f"({len(retry)} to retry), next target {self.target_bytes}B")
+        return retry
+
+    def _resize(self, shrink: bool = False, grow: bool = False) -> None:
+        if shrink:
+            self.target_bytes = max(self.min_bytes, self.target_bytes // 2)
+        elif grow:
+            self.target_bytes = min(self.max_bytes, int(self.target_bytes * 1.5))
+        BULK_TARGET_BYTES.set(self.target_bytes)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"indexed": self.indexed, "deleted": self.deleted, "failed": self.failed,
+                "requests": self.requests, "target_bytes": self.target_bytes}
+
+
+# ---- one S3 object ------------------------------------------------------------
+
+class ObjectIndexer:
+    """
+    Streams one OCR JSONL object from S3 and indexes its chunks.
+
+    With `skip_unchanged`, each page's chunk hashes are compared with the page state
+    table: unchanged chunks are skipped, changed or new ones are embedded, and chunks
+    the page no longer has are deleted from the index. The new hashes of a page are
+    written only once all of its chunks reached the index: when an embedding batch
+    fails, the other pages keep their progress and the failed ones are redone on
+    retry; when a `_bulk` write fails, no state is written. Pages that disappear entirely are not inferred, because a
+    document's pages can be spread over several JSONL objects.
+    `dry_run` reads the state and reports the work without embedding or writing anything.
+    """
+
+    def __init__(self, pool: ProcessPoolExecutor, s3: Any = None, writer: Optional[BulkWriter] = None,
+                 embed_batch_size: int = INGEST_EMBED_BATCH_SIZE, embed_concurrency: int = INGEST_EMBED_CONCURRENCY,
+                 skip_unchanged: bool = INGEST_SKIP_UNCHANGED, state: Optional[PageStateStore] = None,
+                 dry_run: bool = False):
+        self.pool = pool
+        self.s3 = s3 or get_registry().s3()
+        self.writer = writer or BulkWriter()
+        self.state = (state or PageStateStore()) if skip_unchanged else None
+        self.dry_run = dry_run
+        self._new_state: Dict[str, Dict[str, str]] = {}
+        self.embed_batch_size = embed_batch_size
+        self._embed_slots = asyncio.Semaphore(embed_concurrency)
+        self._tasks: Set[asyncio.Task] = set()
+        self._errors: List[BaseException] = []
+        # pages with a chunk that did not reach the index, and whether a _bulk write itself failed
+        self._failed_pages: Set[str] = set()
+        self._index_failed = False
+        self.pages = 0
+        self.embed_failures = 0
+        self.malformed_lines = 0
+        self.to_embed = 0
+        self.unchanged = 0
+        self.unchanged_tokens = 0
+        self.stale = 0
+
+    async def run(self, bucket: str, key: str) -> Dict[str, Any]:
+        source = f"s3://{bucket}/{key}"
+        started = time.perf_counter()
+        obj = await asyncio.to_thread(self.s3.get_object, Bucket=bucket, Key=key)
+        lines = obj["Body"].iter_lines(chunk_size=1024 * 1024)
+        loop = asyncio.get_running_loop()
+
+        pending: List[Dict[str, Any]] = []
+        try:
+            while True:
+                with stage_timer("s3_read"):
+                    raw = await asyncio.to_thread(_take, lines, INGEST_READ_BATCH_LINES)
+                if not raw:
+                    break
+                pages = list(self._pages(raw, default_doc_id=key))
+                self.pages += len(pages)
+                with stage_timer("chunking"):
+                    chunks = await loop.run_in_executor(self.pool, chunk_pages, pages)
+                if self.state is not None:
+                    chunks = await self._changed_only(chunks)
+                self.to_embed += len(chunks)
+                if self.dry_run:
+                    continue
+                pending.extend(chunks)
+                while len(pending) >= self.embed_batch_size:
+                    batch, pending = pending[:self.embed_batch_size], pending[self.embed_batch_size:]
+                    await self._submit(batch, source)
+            if pending:
+                await self._submit(pending, source)
+            if self._tasks:
+                # failures were already collected by _task_done, which also removed the tasks from _tasks
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+            try:
+                await self.writer.flush()
+            except Exception:
+                self._index_failed = True
+                raise
+        finally:
+            for task in self._tasks:
+                task.cancel()
+            obj["Body"].close()
+
+        if self.writer.failed:
+            self._index_failed = True
+        if self.state is not None and not self.dry_run and not self._index_failed:
+            indexed = {pid: hashes for pid, hashes in self._new_state.items() if pid not in self._failed_pages}
+            if indexed:
+                await self.state.put_many(indexed)
+        if self._errors or self.embed_failures or self.writer.failed:
+            raise RuntimeError(f"{source}: {len(self._errors)} embedding batches failed, "
+                               f"{self.embed_failures} chunks failed to embed, "
+                               f"{self.writer.failed} failed to index") from (self._errors[0] if self._errors else None)
+
+        total = self.to_embed + self.unchanged
+        stats = {"source": source, "dry_run": self.dry_run, "pages": self.pages, "chunks": total,
+                 "to_embed": self.to_embed, "unchanged": self.unchanged, "stale_deleted": self.stale,
+                 "skipped_ratio": round(self.unchanged / total, 4) if total else 0.0,
+                 "skipped_tokens": self.unchanged_tokens, "malformed_lines": self.malformed_lines,
+                 "seconds": round(time.perf_counter() - started, 2), **self.writer.stats()}
+        logger.info(f"{'dry run of' if self.dry_run else 'indexed'} {source}: {stats}")
+        return stats
+
+    async def _changed_only(self, chunks: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Drop chunks whose hash matches the page state and queue deletes for chunks a page lost."""
+        by_page: Dict[str, List[Dict[str, Any]]] = {}
+        for chunk in chunks:
+            by_page.setdefault(page_id(chunk["doc_id"], chunk["page"]), []).append(chunk)
+        with stage_timer("page_state"):
+            previous = await self.state.get_many(by_page)
+
+        changed = []
+        for pid, page_chunks in by_page.items():
+            old = previous.get(pid, {})
+            hashes = {}
+            for chunk in page_chunks:
+                digest = hashes[chunk["chunk_id"]] = content_hash(chunk["text"])
+                if old.get(chunk["chunk_id"]) == digest:
+                    self.unchanged += 1
+                    self.unchanged_tokens += estimate_tokens(chunk["text"])
+                else:
+                    changed.append(chunk)
+            for stale_id in old.keys() - hashes.keys():
+                self.stale += 1
+                if not self.dry_run:
+                    await self.writer.delete_doc(stale_id)
+            if hashes != old:
+                self._new_state[pid] = hashes
+        if not self.dry_run:
+            INGEST_CHUNKS.labels("unchanged").inc(len(chunks) - len(changed))
+        return changed
+
+    def _pages(self, raw: Iterable[bytes], default_doc_id: str) -> Iterator[Page]:
+        for line in raw:
+            try:
+                pages = list(iter_pages(orjson.loads(line), default_doc_id))
+            except (orjson.JSONDecodeError, AttributeError, TypeError, ValueError):
+                self.malformed_lines += 1
+                logger.warning(f"skipping malformed JSONL line in {default_doc_id}")
+                continue
+            yield from pages
+
+    async def _submit(self, batch: List[Dict[str, Any]], source: str) -> None:
+        # waiting for a slot here is what stops reading ahead of the embedding provider
+        await self._embed_slots.acquire()
+        task = asyncio.create_task(self._embed_and_index(batch, source))
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+
+    def _task_done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"embedding batch failed - {task.exception()}")
+            self._errors.append(task.exception())
+
+    async def _embed_and_index(self, batch: List[Dict[str, Any]], source: str) -> None:
+        try:
+            with stage_timer("ingest_embedding"):
+                vectors = await invoke_embedding_batch([c["text"] for c in batch])
+        except Exception:
+            self._failed_pages.update(page_id(c["doc_id"], c["page"]) for c in batch)
+            raise
+        finally:
+            self._embed_slots.release()
+        for chunk, vector in zip(batch, vectors):
+            if not vector:
+                self.embed_failures += 1
+                self._failed_pages.add(page_id(chunk["doc_id"], chunk["page"]))
+                INGEST_CHUNKS.labels("embed_failed").inc()
+                continue
+            try:
+                await self.writer.index_doc(chunk["chunk_id"], index_source(chunk, vector, source))
+            except Exception:
+                # a _bulk request carries chunks of many pages; none of them can be trusted
+                self._index_failed = True
+                raise
+
+
+def index_source(chunk: Dict[str, Any], vector: List[float], source: str) -> Dict[str, Any]:
+    doc = {
+        "text": chunk["text"],
+        "embedding": index_vector(vector),
+        "metadata": {"doc_id": chunk["doc_id"], "page": chunk["page"],
+                     "chunk": chunk["chunk"], "source": source},
+    }
+    if VECTOR_DATA_TYPE == "byte":
+        doc[VECTOR_FULL_FIELD] = vector
+    return doc
+
+
+def index_definition(dim: int = int(EMBEDDING_OUTPUT_DIM or 1024), data_type: str = VECTOR_DATA_TYPE) -> Dict[str, Any]:
+    """
+    Settings and mappings for OPENSEARCH_INDEX.
+
+    Float vectors use the faiss HNSW engine. Byte vectors need the lucene engine and
+    take a quarter of the memory; their float copy is kept in _source only (not
+    indexed, no doc values) for rescoring.
+    """
+    embedding: Dict[str, Any] = {
+        "type": "knn_vector",
+        "dimension": dim,
+        "method": {"name": "hnsw", "space_type": "cosinesimil", "engine": knn_engine(data_type),
+                   "parameters": {"m": 16, "ef_construction": 128}},
+    }
+    properties: Dict[str, Any] = {
+        "text": {"type": "text"},
+        "embedding": embedding,
+        "metadata": {"properties": {"doc_id": {"type": "keyword"}, "page": {"type": "integer"},
+                                    "chunk": {"type": "integer"}, "source": {"type": "keyword"}}},
+    }
+    if data_type == "byte":
+        embedding["data_type"] = "byte"
+        properties[VECTOR_FULL_FIELD] = {"type": "float", "index": False, "doc_values": False}
+    return {"settings": {"index": {"knn": True}}, "mappings": {"properties": properties}}
+
+
+async def create_index(index: str = OPENSEARCH_INDEX) -> Dict[str, Any]:
+    body = orjson.dumps(index_definition())
+    url = f"{OPENSEARCH_HOST}/{index}"
+    headers = _sign_request("PUT", url, body, service="es")
+    try:
+        async with get_registry().http_session().put(
+            url, data=body, headers={**headers, "Content-Type": "application/json"}
+        ) as resp:
+            result = orjson.loads(await resp.read())
+            if resp.status != 200:
+                raise RuntimeError(f"creating index {index} failed: {resp.status} {result}")
+    finally:
+        await get_registry().close()
+    logger.info(f"created index {index} (dim={EMBEDDING_OUTPUT_DIM}, data_type={VECTOR_DATA_TYPE})")
+    return result
+
+
+# ---- the queue worker -------------------------------------------------------
+
+class IngestWorker:
+    """
+    Long-polls the OCR JSONL queue and indexes the objects each message names.
+
+    Up to `max_in_flight` messages are processed concurrently. While a message is
+    being processed its visibility timeout is extended in the background. A failed
+    message is made visible again after an exponential backoff, and once it has been
+    received MAX_RECEIVE_COUNT times (or cannot be parsed at all) it is moved to the DLQ.
+    """
+
+    def __init__(self, sqs: Any = None, s3: Any = None, queue_name: str = OCR_JSONL_SQS_QUEUE_NAME,
+                 dlq_name: str = OCR_JSONL_DLQ_QUEUE_NAME, max_in_flight: int = MAX_WORKERS_PER_QUEUE,
+                 pool_workers: int = PROCESS_POOL_WORKERS):
+        self.sqs = sqs or get_registry().sqs()
+        self.s3 = s3 or get_registry().s3()
+        self.queue_name = queue_name
+        self.dlq_name = dlq_name
+        self.max_in_flight = max_in_flight
+        self.pool = ProcessPoolExecutor(max_workers=pool_workers)
+        self._slots = asyncio.Semaphore(max_in_flight)
+        self._tasks: Set[asyncio.Task] = set()
+        self._stopping = asyncio.Event()
+        self.queue_url: Optional[str] = None
+        self.dlq_url: Optional[str] = None
+
+    def stop(self) -> None:
+        logger.info("stopping: no new messages will be received")
+        self._stopping.set()
+
+    async def run(self) -> None:
+        self.queue_url = (await asyncio.to_thread(self.sqs.get_queue_url, QueueName=self.queue_name))["QueueUrl"]
+        self.dlq_url = (await asyncio.to_thread(self.sqs.get_queue_url, QueueName=self.dlq_name))["QueueUrl"]
+        logger.info(f"polling {self.queue_name} (in flight <= {self.max_in_flight})")
+        try:
+            while not self._stopping.is_set():
+                await self._slots.acquire()
+                free = 1
+                while free < MAX_MESSAGES and not self._slots.locked():
+                    await self._slots.acquire()
+                    free += 1
+                try:
+                    resp = await asyncio.to_thread(
+                        self.sqs.receive_message,
+                        QueueUrl=self.queue_url,
+                        MaxNumberOfMessages=free,
+                        WaitTimeSeconds=WAIT_TIME_SECONDS,
+                        VisibilityTimeout=VISIBILITY_TIMEOUT,
+                        AttributeNames=["ApproximateReceiveCount"],
+                    )
+                except Exception as e:
+                    for _ in range(free):
+                        self._slots.release()
+                    logger.error(f"receive_message failed - {e}")
+                    await asyncio.sleep(retry_backoff(1))
+                    continue
+                messages = resp.get("Messages", [])
+                for _ in range(free - len(messages)):
+                    self._slots.release()
+                for message in messages:
+                    task = asyncio.create_task(self.handle_message(message))
+                    self._tasks.add(task)
+                    task.add_done_callback(self._done)
+        finally:
+            if self._tasks:
+                logger.info(f"waiting for {len(self._tasks)} in-flight messages")
+                await asyncio.gather(*self._tasks, return_exceptions=True)
+            self.pool.shutdown()
+
+    def _done(self, task: asyncio.Task) -> None:
+        self._tasks.discard(task)
+        self._slots.release()
+        if task.cancelled():
+            return
+        error = task.exception()
+        if error is not None:
+            # handle_message failed outside its own error handling (e.g. the DLQ send); the
+            # message was not deleted, so SQS redelivers it once the visibility timeout lapses
+            INGEST_MESSAGES.labels("error").inc()
+            logger.error(f"message handling failed - {error!r}", exc_info=error)
+
+    async def handle_message(self, message: Dict[str, Any]) -> None:
+        receipt = message["ReceiptHandle"]
+        receive_count = int(message.get("Attributes", {}).get("ApproximateReceiveCount", "1"))
+        try:
+            objects = parse_s3_objects(message["Body"])
+        except Exception as e:
+            await self._dead_letter(message, f"unparseable message: {e}")
+            return
+
+        heartbeat = asyncio.create_task(self._keep_invisible(receipt))
+        try:
+            for bucket, key in objects:
+                await ObjectIndexer(self.pool, s3=self.s3).run(bucket, key)
+        except Exception as e:
+            logger.error(f"message {message['MessageId']} failed (receive {receive_count}) - {e}")
+            if receive_count >= MAX_RECEIVE_COUNT:
+                await self._dead_letter(message, str(e))
+            else:
+                INGEST_MESSAGES.labels("retried").inc()
+                delay = int(min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * 2 ** receive_count))
+                await asyncio.to_thread(self.sqs.change_message_visibility, QueueUrl=self.queue_url,
+                                        ReceiptHandle=receipt, VisibilityTimeout=delay)
+            return
+        finally:
+            heartbeat.cancel()
+
+        await asyncio.to_thread(self.sqs.delete_message, QueueUrl=self.queue_url, ReceiptHandle=receipt)
+        INGEST_MESSAGES.labels("done").inc()
+
+    async def _keep_invisible(self, receipt: str) -> None:
+        """Push the visibility timeout out before it lapses, for as long as the message is being processed."""
+        interval = max(1, VISIBILITY_TIMEOUT - VISIBILITY_EXTENSION_MARGIN)
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.sqs.change_message_visibility, QueueUrl=self.queue_url,
+                                        ReceiptHandle=receipt, VisibilityTimeout=VISIBILITY_TIMEOUT)
+            except Exception as e:
+                logger.warning(f"failed to extend visibility - {e}")
+
+    async def _dead_letter(self, message: Dict[str, Any], reason: str) -> None:
+        await asyncio.to_thread(
+            self.sqs.send_message,
+            QueueUrl=self.dlq_url,
+            MessageBody=message["Body"],
+            MessageAttributes={
+                "error": {"DataType": "String", "StringValue": reason[:1000]},
+                "source_queue": {"DataType": "String", "StringValue": self.queue_name},
+            },
+        )
+        await asyncio.to_thread(self.sqs.delete_message, QueueUrl=self.queue_url,
+                                ReceiptHandle=message["ReceiptHandle"])
+        INGEST_MESSAGES.labels("dead_lettered").inc()
+        logger.error(f"message {message.get('MessageId')} moved to {self.dlq_name} - {reason}")
+
+
+async def _run_worker() -> None:
+    worker = IngestWorker()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, worker.stop)
+    try:
+        await worker.run()
+    finally:
+        await get_registry().close()
+
+
+async def _run_object(uri: str, dry_run: bool = False) -> Dict[str, Any]:
+    bucket, _, key = uri.removeprefix("s3://").partition("/")
+    with ProcessPoolExecutor(max_workers=PROCESS_POOL_WORKERS) as pool:
+        try:
+            return await ObjectIndexer(pool, dry_run=dry_run).run(bucket, key)
+        finally:
+            await get_registry().close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Index OCR JSONL objects from S3 into OpenSearch.")
+    parser.add_argument("--object", help="index this s3://bucket/key and exit instead of polling the queue")
+    parser.add_argument("--dry-run", action="store_true",
+                        help="with --object: report unchanged/changed/stale chunks without embedding or writing")
+    parser.add_argument("--create-index", action="store_true",
+                        help="create OPENSEARCH_INDEX for EMBEDDING_OUTPUT_DIM / VECTOR_DATA_TYPE and exit")
+    args = parser.parse_args()
+    if args.dry_run and not args.object:
+        parser.error("--dry-run requires --object")
+    if args.create_index:
+        print(orjson.dumps(asyncio.run(create_index())).decode())
+        return
+    if args.object:
+        print(orjson.dumps(asyncio.run(_run_object(args.object, dry_run=args.dry_run))).decode())
+        return
+    start_metrics_server()
+    asyncio.run(_run_worker())
+
+
+if __name__ == "__main__":
+    main()
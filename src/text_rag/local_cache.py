@@ -0,0 +1,116 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from text_rag.config import L1_CACHE_MAX_BYTES, L1_CACHE_TTL
+from text_rag.logger import get_logger
+
+logger = get_logger("text_rag.local_cache")
+
+
+class ByteLRU:
+    """
+    In-process LRU of serialized cache values, bounded by total payload size in bytes.
+
+    Values are the same encoded bytes written to Redis, so the byte count is a close
+    proxy for memory use. Each entry also carries an expiry so the L1 never serves
+    something Redis would already have dropped.
+    """
+
+    def __init__(self, max_bytes: int, default_ttl: float):
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._data: "OrderedDict[str, Tuple[bytes, float]]" = OrderedDict()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _sizeof(key: str, value: bytes) -> int:
+        return len(key) + len(value)
+
+    def get(self, key: str) -> Optional[bytes]:
+        item = self._data.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        value, expires_at = item
+        if expires_at < time.monotonic():
+            self._remove(key)
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def set(self, key: str, value: bytes, ttl: Optional[float] = None) -> None:
+        size = self._sizeof(key, value)
+        if size > self.max_bytes:
+            return
+        if key in self._data:
+            self._remove(key)
+        ttl = min(ttl, self.default_ttl) if ttl else self.default_ttl
+        self._data[key] = (value, time.monotonic() + ttl)
+        self.size_bytes += size
+        while self.size_bytes > self.max_bytes:
+            oldest = next(iter(self._data))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def _remove(self, key: str) -> None:
+        value, _ = self._data.pop(key)
+        self.size_bytes -= self._sizeof(key, value)
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.size_bytes = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._data),
+            "size_bytes": self.size_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution.
+
+    The first caller (the leader) starts the work as a task; callers arriving while it
+    is in flight await the same task. The task is shielded so a follower that gets
+    cancelled (e.g. client disconnect) does not cancel the shared execution.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        fut = self._inflight.get(key)
+        if fut is not None:
+            self.coalesced += 1
+            return await asyncio.shield(fut)
+
+        fut = asyncio.ensure_future(fn())
+        self._inflight[key] = fut
+        self.executions += 1
+        fut.add_done_callback(lambda _: self._inflight.pop(key, None))
+        return await asyncio.shield(fut)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._inflight),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+        }
+
+
+l1_cache = ByteLRU(max_bytes=L1_CACHE_MAX_BYTES, default_ttl=L1_CACHE_TTL)
+query_flight = SingleFlight()
@@ -0,0 +1,251 @@
+"""
+In-process, memory-mapped vector index used as a drop-in for OpenSearch kNN.
+
+Layout of an index directory:
+    manifest.json     dim, count, metric, nlist
+    vectors.f32       count x dim float32, L2-normalised, memory-mapped at query time
+    docs.jsonl        one {"doc_id", "text"} per row, in vector order
+    ivf_centroids.f32 nlist x dim float32 (IVF mode only)
+    ivf_offsets.i64   nlist + 1 CSR offsets into ivf_ids
+    ivf_ids.i32       row ids grouped by nearest centroid
+
+Build it from an export of the OpenSearch index (or any JSONL of
+{"doc_id", "text", "embedding"} records):
+
+    python -m text_rag.local_index build --out ./index --from-opensearch --nlist 256
+    python -m text_rag.local_index build --out ./index --from-jsonl export.jsonl
+"""
+import argparse
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from text_rag.config import (
+    OPENSEARCH_INDEX,
+    LOCAL_INDEX_PATH,
+    LOCAL_INDEX_MODE,
+    LOCAL_INDEX_NPROBE,
+)
+from text_rag.logger import get_logger
+from text_rag.utils import cosine_score
+
+logger = get_logger("text_rag.local_index")
+
+MANIFEST = "manifest.json"
+VECTORS = "vectors.f32"
+DOCS = "docs.jsonl"
+CENTROIDS = "ivf_centroids.f32"
+OFFSETS = "ivf_offsets.i64"
+POSTINGS = "ivf_ids.i32"
+
+
+def _normalize_rows(x: np.ndarray) -> np.ndarray:
+    return x / np.maximum(np.linalg.norm(x, axis=1, keepdims=True), 1e-12)
+
+
+def _kmeans(sample: np.ndarray, nlist: int, iterations: int = 10, seed: int = 0) -> np.ndarray:
+    """Spherical k-means (cosine) over normalised rows."""
+    rng = np.random.default_rng(seed)
+    centroids = sample[rng.choice(len(sample), size=nlist, replace=False)].copy()
+    for _ in range(iterations):
+        assign = np.argmax(sample @ centroids.T, axis=1)
+        for c in range(nlist):
+            members = sample[assign == c]
+            if len(members):
+                centroids[c] = members.sum(axis=0)
+            else:
+                centroids[c] = sample[rng.integers(len(sample))]
+        centroids = _normalize_rows(centroids)
+    return centroids.astype(np.float32)
+
+
+def build_index(records: Iterable[Dict], out_dir: str, nlist: int = 0,
+                train_sample: int = 50_000, batch_size: int = 4096) -> Dict:
+    """
+    Write an index directory from {"doc_id", "text", "embedding"} records.
+
+    Vectors are streamed to disk, so the export never has to fit in memory.
+    With nlist > 0 an IVF layer is trained on a sample and every row is assigned
+    to its nearest centroid.
+    """
+    out = Path(out_dir)
+    out.mkdir(parents=True, exist_ok=True)
+    dim = None
+    count = 0
+    with open(out / VECTORS, "wb") as vf, open(out / DOCS, "w", encoding="utf-8") as df:
+        batch: List[List[float]] = []
+        for rec in records:
+            vec = rec.get("embedding")
+            if not vec:
+                continue
+            if dim is None:
+                dim = len(vec)
+            elif len(vec) != dim:
+                raise ValueError(f"embedding dimension mismatch for {rec.get('doc_id')}: {len(vec)} != {dim}")
+            batch.append(vec)
+            df.write(json.dumps({"doc_id": rec.get("doc_id"), "text": rec.get("text")}) + "\n")
+            count += 1
+            if len(batch) >= batch_size:
+                _normalize_rows(np.asarray(batch, dtype=np.float32)).astype(np.float32).tofile(vf)
+                batch = []
+        if batch:
+            _normalize_rows(np.asarray(batch, dtype=np.float32)).astype(np.float32).tofile(vf)
+
+    if not count:
+        raise ValueError("no records with embeddings to index")
+
+    nlist = min(nlist, count)
+    if nlist > 0:
+        vectors = np.memmap(out / VECTORS, dtype=np.float32, mode="r", shape=(count, dim))
+        rng = np.random.default_rng(0)
+        sample_ids = np.sort(rng.choice(count, size=min(train_sample, count), replace=False))
+        centroids = _kmeans(np.asarray(vectors[sample_ids]), nlist)
+        assign = np.empty(count, dtype=np.int32)
+        for start in range(0, count, batch_size):
+            block = np.asarray(vectors[start:start + batch_size])
+            assign[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+        order = np.argsort(assign, kind="stable").astype(np.int32)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum(np.bincount(assign, minlength=nlist))
+        centroids.tofile(out / CENTROIDS)
+        offsets.tofile(out / OFFSETS)
+        order.tofile(out / POSTINGS)
+
+    manifest = {"dim": dim, "count": count, "metric": "cosine", "nlist": nlist}
+    (out / MANIFEST).write_text(json.dumps(manifest, indent=2))
+    logger.info(f"Built local index at {out} ({count} vectors, dim={dim}, nlist={nlist})")
+    return manifest
+
+
+class LocalVectorIndex:
+    """
+    Exact (flat) or IVF approximate cosine kNN over a memory-mapped vector file.
+
+    `search` returns the same doc_id/text/score dicts as `retriever._parse_opensearch_results`,
+    with scores on the cosinesimil scale of the OpenSearch engine (utils.cosine_score).
+    """
+
+    def __init__(self, path: str):
+        self.path = Path(path)
+        manifest = json.loads((self.path / MANIFEST).read_text())
+        self.dim = manifest["dim"]
+        self.count = manifest["count"]
+        self.nlist = manifest.get("nlist", 0)
+        self.vectors = np.memmap(self.path / VECTORS, dtype=np.float32, mode="r", shape=(self.count, self.dim))
+        self.doc_ids: List[str] = []
+        self.texts: List[str] = []
+        with open(self.path / DOCS, encoding="utf-8") as f:
+            for line in f:
+                doc = json.loads(line)
+                self.doc_ids.append(doc["doc_id"])
+                self.texts.append(doc["text"])
+        self.centroids = None
+        if self.nlist:
+            self.centroids = np.fromfile(self.path / CENTROIDS, dtype=np.float32).reshape(self.nlist, self.dim)
+            self.offsets = np.fromfile(self.path / OFFSETS, dtype=np.int64)
+            self.postings = np.memmap(self.path / POSTINGS, dtype=np.int32, mode="r", shape=(self.count,))
+        logger.info(f"Opened local index {self.path} ({self.count} vectors, dim={self.dim}, nlist={self.nlist})")
+
+    def _candidates(self, q: np.ndarray, nprobe: int) -> Optional[np.ndarray]:
+        if self.centroids is None:
+            return None
+        nprobe = min(max(nprobe, 1), self.nlist)
+        probe = np.argpartition(-(self.centroids @ q), nprobe - 1)[:nprobe]
+        return np.concatenate([np.asarray(self.postings[self.offsets[c]:self.offsets[c + 1]]) for c in probe])
+
+    def search(self, vector: List[float], k: int, mode: str = "flat", nprobe: int = LOCAL_INDEX_NPROBE,
+               min_score: float = 0.0, include_embedding: bool = False) -> List[Dict]:
+        q = np.asarray(vector, dtype=np.float32)
+        if q.shape != (self.dim,):
+            raise ValueError(f"query dimension {q.shape[0]} does not match index dimension {self.dim}")
+        q /= max(float(np.linalg.norm(q)), 1e-12)
+
+        ids = self._candidates(q, nprobe) if mode == "ivf" else None
+        if ids is None:
+            sims = self.vectors @ q
+            ids = np.arange(self.count)
+        else:
+            ids.sort()  # sequential reads from the memory map
+            sims = self.vectors[ids] @ q
+        if not len(ids):
+            return []
+
+        k = min(k, len(ids))
+        top = np.argpartition(-sims, k - 1)[:k]
+        top = top[np.argsort(-sims[top])]
+        scores = cosine_score(sims[top])
+
+        results = []
+        for pos, score in zip(top, scores):
+            if score < min_score:
+                break
+            row = int(ids[pos])
+            item = {"doc_id": self.doc_ids[row], "text": self.texts[row], "score": float(score)}
+            if include_embedding:
+                item["embedding"] = self.vectors[row].tolist()
+            results.append(item)
+        return results
+
+
+_local_index: Optional[LocalVectorIndex] = None
+_local_index_lock = threading.Lock()
+
+
+def get_local_index() -> LocalVectorIndex:
+    global _local_index
+    if _local_index is None:
+        # searches run on worker threads; the first ones must not each load docs.jsonl
+        with _local_index_lock:
+            if _local_index is None:
+                if not LOCAL_INDEX_PATH or not os.path.exists(os.path.join(LOCAL_INDEX_PATH, MANIFEST)):
+                    raise RuntimeError(f"Local vector index not found at '{LOCAL_INDEX_PATH}'")
+                _local_index = LocalVectorIndex(LOCAL_INDEX_PATH)
+    return _local_index
+
+
+def local_vector_search(vector: List[float], k: int, min_score: float = 0.0,
+                        include_embedding: bool = False) -> List[Dict]:
+    return get_local_index().search(vector, k, mode=LOCAL_INDEX_MODE, min_score=min_score,
+                                    include_embedding=include_embedding)
+
+
+def iter_opensearch_export(index: str = OPENSEARCH_INDEX, batch_size: int = 500) -> Iterator[Dict]:
+    """Scroll every document of the OpenSearch index as {"doc_id", "text", "embedding"}."""
+    from opensearchpy import helpers
+    from text_rag.clients import get_registry
+
+    client = get_registry().opensearch()
+    for hit in helpers.scan(client, index=index, size=batch_size,
+                            query={"query": {"match_all": {}}, "_source": ["text", "embedding"]}):
+        src = hit.get("_source", {})
+        yield {"doc_id": hit.get("_id"), "text": src.get("text"), "embedding": src.get("embedding")}
+
+
+def iter_jsonl(path: str) -> Iterator[Dict]:
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a local memory-mapped vector index.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build")
+    build.add_argument("--out", required=True, help="index directory to write")
+    source = build.add_mutually_exclusive_group(required=True)
+    source.add_argument("--from-opensearch", action="store_true", help=f"export the '{OPENSEARCH_INDEX}' index")
+    source.add_argument("--from-jsonl", help="JSONL file of {doc_id, text, embedding} records")
+    build.add_argument("--nlist", type=int, default=0, help="IVF lists (0 = flat only)")
+    args = parser.parse_args()
+
+    records = iter_opensearch_export() if args.from_opensearch else iter_jsonl(args.from_jsonl)
+    print(json.dumps(build_index(records, args.out, nlist=args.nlist)))
+
+
+if __name__ == "__main__":
+    main()
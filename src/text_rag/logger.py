@@ -1,18 +1,187 @@
 # logger.py
+"""
+JSON logging that stays off the request path.
+
+Every `text_rag.*` logger propagates to one QueueHandler: callers only build the
+record and `put_nowait` it on a bounded queue, and a QueueListener thread formats
+and writes it to stdout. A full queue (stdout slower than the log rate) drops the
+record and counts it instead of blocking the event loop.
+
+`get_logger` returns a StructuredLogger, so keyword arguments become top-level JSON
+fields:
+
+    logger.info("cache_hit", layer="response", tier="l1")
+
+Debug records are sampled at LOG_DEBUG_SAMPLE_RATE (the rate is attached to each
+record as `sample_rate`), and LOG_LEVELS sets levels per stage, e.g.
+"retriever=DEBUG,cache=WARNING". Both are applied by `configure()`, which
+text_rag.config calls once the environment is loaded.
+"""
+import atexit
 import logging
+import os
+import queue
+import random
 import sys
-import json
-from logging import Logger
-
-def get_logger(name: str = "sqs_worker") -> Logger:
-    # Simple structured JSON logger. Replace with structlog if you prefer.
-    handler = logging.StreamHandler(sys.stdout)
-    formatter = logging.Formatter(
-        '{"timestamp":"%(asctime)s","level":"%(levelname)s","name":"%(name)s","msg":"%(message)s"}'
-    )
-    handler.setFormatter(formatter)
-    logger = logging.getLogger(name)
-    if not logger.handlers:
-        logger.addHandler(handler)
-    logger.setLevel(logging.INFO)
-    return logger
+import threading
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict
+
+import orjson
+
+# Set per request by the API middleware; copied into tasks spawned while handling it
+request_id_var: ContextVar[str] = ContextVar("request_id", default="-")
+
+ROOT = "text_rag"
+_STANDARD_KWARGS = {"exc_info", "stack_info", "stacklevel", "extra"}
+# attributes of every LogRecord; anything else on a record was passed as a field
+_RECORD_ATTRS = set(vars(logging.makeLogRecord({}))) | {"message", "asctime", "request_id", "fields"}
+
+
+class RequestIdFilter(logging.Filter):
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        return True
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line; runs on the listener thread."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "timestamp": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "name": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "msg": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        # fields passed the stdlib way, via extra={...}
+        entry.update((k, v) for k, v in vars(record).items() if k not in _RECORD_ATTRS)
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        if record.stack_info:
+            entry["stack"] = record.stack_info
+        return orjson.dumps(entry, default=str).decode()
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    def __init__(self, q: queue.Queue):
+        super().__init__(q)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # formatting is left to the listener thread; only the request id must be read here
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _Listener(QueueListener):
+    def enqueue_sentinel(self) -> None:
+        # blocking: this thread is draining the queue, so a full queue still takes the sentinel
+        self.queue.put(self._sentinel)
+
+
+class StructuredLogger(logging.LoggerAdapter):
+    """Accepts keyword fields on every call and samples debug records."""
+
+    def process(self, msg, kwargs):
+        fields = {k: kwargs.pop(k) for k in list(kwargs) if k not in _STANDARD_KWARGS}
+        if fields:
+            kwargs["extra"] = {**kwargs.get("extra", {}), "fields": fields}
+        return msg, kwargs
+
+    def debug(self, msg, *args, **kwargs):
+        if not self.isEnabledFor(logging.DEBUG):
+            return
+        if _settings["debug_sample_rate"] < 1.0:
+            if random.random() >= _settings["debug_sample_rate"]:
+                return
+            kwargs["sample_rate"] = _settings["debug_sample_rate"]
+        self.log(logging.DEBUG, msg, *args, **kwargs)
+
+
+_settings: Dict[str, Any] = {"debug_sample_rate": 1.0}
+_lock = threading.Lock()
+_handler: _NonBlockingQueueHandler | None = None
+_listener: _Listener | None = None
+
+
+def _start(queue_size: int = 10000) -> None:
+    global _handler, _listener
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(JsonFormatter())
+    q: queue.Queue = queue.Queue(maxsize=queue_size)
+    handler = _NonBlockingQueueHandler(q)
+    handler.addFilter(RequestIdFilter())
+    listener = _Listener(q, stream, respect_handler_level=True)
+    listener.start()
+
+    root = logging.getLogger(ROOT)
+    if _handler is None:
+        root.setLevel(logging.INFO)
+    else:
+        root.removeHandler(_handler)
+    root.addHandler(handler)
+    root.propagate = False
+    _handler, _listener = handler, listener
+
+
+def _stop() -> None:
+    """Flush what is queued; registered at exit."""
+    if _listener is not None:
+        _listener.stop()
+
+
+def _after_fork() -> None:
+    # the listener thread does not survive fork(); the child starts its own
+    if _handler is not None:
+        _start(_handler.queue.maxsize)
+
+
+def _ensure_started() -> None:
+    with _lock:
+        if _handler is None:
+            _start()
+            atexit.register(_stop)
+            if hasattr(os, "register_at_fork"):
+                os.register_at_fork(after_in_child=_after_fork)
+
+
+def configure(level: str = "INFO", levels: str = "", debug_sample_rate: float = 1.0,
+              queue_size: int | None = None) -> None:
+    """Apply LOG_LEVEL, per-stage LOG_LEVELS, LOG_DEBUG_SAMPLE_RATE and LOG_QUEUE_SIZE."""
+    _ensure_started()
+    if queue_size is not None and queue_size != _handler.queue.maxsize:
+        with _lock:
+            _stop()
+            _start(queue_size)
+    _settings["debug_sample_rate"] = max(0.0, min(1.0, debug_sample_rate))
+    logging.getLogger(ROOT).setLevel(level.upper())
+    for item in filter(None, (part.strip() for part in levels.split(","))):
+        name, _, stage_level = item.partition("=")
+        name = name.strip()
+        if not name.startswith(ROOT):
+            name = f"{ROOT}.{name}"
+        logging.getLogger(name).setLevel(stage_level.strip().upper())
+
+
+def stats() -> Dict[str, int]:
+    return {
+        "queued": _handler.queue.qsize() if _handler else 0,
+        "dropped": _handler.dropped if _handler else 0,
+    }
+
+
+def get_logger(name: str = "text_rag") -> StructuredLogger:
+    _ensure_started()
+    if not name.startswith(ROOT):
+        name = f"{ROOT}.{name}"
+    return StructuredLogger(logging.getLogger(name), {})
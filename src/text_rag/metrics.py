@@ -0,0 +1,148 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List
+
+from prometheus_client import (
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+    multiprocess,
+    start_http_server,
+)
+from prometheus_client.core import GaugeMetricFamily
+
+from text_rag.config import METRICS_HOST, METRICS_PORT
+from text_rag.logger import get_logger
+
+logger = get_logger("text_rag.metrics")
+
+# Buckets cover sub-millisecond cache hits up to multi-second LLM calls
+_LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+STAGE_LATENCY = Histogram(
+    "rag_stage_duration_seconds",
+    "Latency of each pipeline stage (cache_lookup, embedding, vector_search, rerank, context, generation, handle_query).",
+    ["stage"],
+    buckets=_LATENCY_BUCKETS,
+)
+
+TIME_TO_FIRST_TOKEN = Histogram(
+    "rag_time_to_first_token_seconds",
+    "Time from request start to the first streamed answer token.",
+    buckets=(0.1, 0.25, 0.5, 0.75, 1.0, 1.5, 2.0, 3.0, 5.0, 8.0, 13.0),
+)
+
+CACHE_HITS = Counter("rag_cache_hits_total", "Cache hits by layer and tier.", ["layer", "tier"])
+CACHE_MISSES = Counter("rag_cache_misses_total", "Cache misses by layer.", ["layer"])
+PROVIDER_ERRORS = Counter("rag_provider_errors_total", "Failed calls to model/search providers.", ["provider", "stage"])
+FALLBACKS = Counter("rag_fallbacks_total", "Degraded results served instead of failing.", ["stage", "reason"])
+# multiprocess_mode only applies under rag_server with several workers (see exposition())
+IN_FLIGHT = Gauge("rag_requests_in_flight", "Requests currently being processed.", ["endpoint"],
+                  multiprocess_mode="livesum")
+QUEUE_DEPTH = Gauge("rag_queue_depth", "Callers waiting for a slot, by limiter (admission or stage).", ["limiter"],
+                    multiprocess_mode="livesum")
+INGEST_MESSAGES = Counter("rag_ingest_messages_total", "Queue messages handled by the ingestion worker.", ["outcome"])
+INGEST_CHUNKS = Counter("rag_ingest_chunks_total", "Chunks processed by the ingestion worker.", ["outcome"])
+BULK_TARGET_BYTES = Gauge("rag_ingest_bulk_target_bytes", "Current adaptive _bulk request size.")
+CONTEXT_TOKENS = Counter("rag_context_tokens_total", "Estimated context tokens before (retrieved) and after (packed) packing.", ["kind"])
+CONTEXT_CHUNKS_DROPPED = Counter("rag_context_chunks_dropped_total", "Chunks left out of the generator context.", ["reason"])
+ADAPTIVE_DECISIONS = Counter("rag_adaptive_decisions_total", "Per-query adaptive retrieval decisions.", ["decision"])
+STARTUP_SECONDS = Gauge("rag_startup_seconds", "Duration of each startup phase of this process (and the total).", ["phase"],
+                        multiprocess_mode="all")
+SHED = Counter("rag_shed_total", "Requests rejected because a limiter's wait queue was full or timed out.", ["limiter"])
+
+# Raw per-stage samples for in-process consumers (e.g. the benchmark harness),
+# which need exact percentiles rather than histogram buckets.
+_stage_listeners: List[Callable[[str, float], None]] = []
+
+
+def add_stage_listener(listener: Callable[[str, float], None]) -> None:
+    _stage_listeners.append(listener)
+
+
+def remove_stage_listener(listener: Callable[[str, float], None]) -> None:
+    if listener in _stage_listeners:
+        _stage_listeners.remove(listener)
+
+
+def observe_stage(stage: str, seconds: float) -> None:
+    STAGE_LATENCY.labels(stage).observe(seconds)
+    for listener in _stage_listeners:
+        listener(stage, seconds)
+
+
+@contextmanager
+def stage_timer(stage: str) -> Iterator[None]:
+    """Time the enclosed block as `stage`; also usable around awaits inside coroutines."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+class StatsCollector:
+    """
+    Exposes the in-process `stats()` dicts (L1 cache, semantic cache, single-flight,
+    embedding batcher) as gauges at scrape time, so those modules stay free of
+    Prometheus dependencies. These are state of the process that answers the scrape,
+    hence the pid label.
+    """
+
+    def __init__(self):
+        self._sources: Dict[str, Callable[[], Dict]] = {}
+
+    def add(self, name: str, stats: Callable[[], Dict]) -> None:
+        self._sources[name] = stats
+
+    def collect(self):
+        family = GaugeMetricFamily("rag_component_stat", "Internal component counters and sizes.",
+                                   labels=["component", "stat", "pid"])
+        pid = str(os.getpid())
+        for name, stats in self._sources.items():
+            try:
+                values = stats() or {}
+            except Exception:
+                continue
+            for key, value in values.items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    family.add_metric([name, key, pid], float(value))
+        yield family
+
+
+stats_collector = StatsCollector()
+REGISTRY.register(stats_collector)
+
+
+def multiprocess_enabled() -> bool:
+    return bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+
+def exposition() -> bytes:
+    """
+    Body of /metrics. Under rag_server with several workers (PROMETHEUS_MULTIPROC_DIR
+    set), counters, histograms and gauges are aggregated over every worker's files;
+    otherwise this process's registry is served.
+    """
+    if not multiprocess_enabled():
+        return generate_latest()
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(stats_collector)
+    return generate_latest(registry)
+
+
+def mark_worker_stopped() -> None:
+    """Drop this worker's live gauges from the aggregate when it shuts down."""
+    if multiprocess_enabled():
+        multiprocess.mark_process_dead(os.getpid())
+
+
+def start_metrics_server() -> None:
+    """Serve /metrics on METRICS_HOST:METRICS_PORT (for processes without the API app)."""
+    start_http_server(METRICS_PORT, addr=METRICS_HOST)
+    logger.info(f"Metrics server listening on {METRICS_HOST}:{METRICS_PORT}")
@@ -0,0 +1,104 @@
+import asyncio
+import hashlib
+import re
+import time
+import unicodedata
+from typing import Any, Dict, Iterable, List
+
+from text_rag.clients import get_registry
+from text_rag.config import (
+    EMBEDDER_PAGE_STATE_NAME,
+    EMBEDDER_PAGE_STATE_KEY,
+    EMBEDDING_MODEL,
+    EMBEDDING_OUTPUT_DIM,
+    OPENSEARCH_INDEX,
+    VECTOR_DATA_TYPE,
+)
+from text_rag.logger import get_logger
+from text_rag.utils import retry_backoff
+
+logger = get_logger("text_rag.page_state")
+
+_WHITESPACE = re.compile(r"\s+")
+
+# DynamoDB batch limits
+_BATCH_GET_MAX = 100
+_BATCH_WRITE_MAX = 25
+
+
+def content_hash(text: str, model: str = EMBEDDING_MODEL, dim: str = EMBEDDING_OUTPUT_DIM,
+                 data_type: str = VECTOR_DATA_TYPE, index: str = OPENSEARCH_INDEX) -> str:
+    """
+    Hash of a chunk's normalized text together with everything that decides what is
+    indexed for it: the embedding model and dimension, the vector data type and the
+    target index.
+
+    Re-OCR noise such as whitespace and Unicode compatibility forms does not change the
+    hash, while switching any of the others changes every hash, forcing a full re-embed
+    (a new index starts empty even though the state table is shared).
+    """
+    normalized = _WHITESPACE.sub(" ", unicodedata.normalize("NFKC", text)).strip()
+    scope = f"{model}\x00{dim}\x00{data_type}\x00{index}"
+    return hashlib.sha256(f"{scope}\x00{normalized}".encode("utf-8")).hexdigest()[:32]
+
+
+def page_id(doc_id: str, page: int) -> str:
+    return f"{doc_id}:{page}"
+
+
+class PageStateStore:
+    """
+    Chunk content hashes per page in the EMBEDDER_PAGE_STATE_NAME DynamoDB table.
+
+    One item per page, keyed by "<doc_id>:<page>", holding {chunk_id: hash} for the
+    chunks last indexed for it. Reads and writes go through the batch APIs, and any
+    unprocessed keys or items are retried with backoff.
+    """
+
+    def __init__(self, table: str = EMBEDDER_PAGE_STATE_NAME, key: str = EMBEDDER_PAGE_STATE_KEY, client: Any = None):
+        self.table = table
+        self.key = key
+        self.client = client or get_registry().dynamodb()
+
+    async def get_many(self, page_ids: Iterable[str]) -> Dict[str, Dict[str, str]]:
+        """{page_id: {chunk_id: hash}} for the pages that have state."""
+        ids = list(dict.fromkeys(page_ids))
+        found: Dict[str, Dict[str, str]] = {}
+        for start in range(0, len(ids), _BATCH_GET_MAX):
+            request = {self.table: {
+                "Keys": [{self.key: {"S": pid}} for pid in ids[start:start + _BATCH_GET_MAX]],
+                "ProjectionExpression": "#k, chunks",
+                "ExpressionAttributeNames": {"#k": self.key},
+            }}
+            attempt = 0
+            while request:
+                resp = await asyncio.to_thread(self.client.batch_get_item, RequestItems=request)
+                for item in resp.get("Responses", {}).get(self.table, []):
+                    chunks = item.get("chunks", {}).get("M", {})
+                    found[item[self.key]["S"]] = {cid: v["S"] for cid, v in chunks.items()}
+                request = resp.get("UnprocessedKeys") or None
+                if request:
+                    attempt += 1
+                    await asyncio.sleep(retry_backoff(attempt))
+        return found
+
+    async def put_many(self, pages: Dict[str, Dict[str, str]]) -> None:
+        now = str(int(time.time()))
+        requests = [{"PutRequest": {"Item": {
+            self.key: {"S": pid},
+            "chunks": {"M": {cid: {"S": h} for cid, h in chunks.items()}},
+            "model": {"S": EMBEDDING_MODEL},
+            "updated_at": {"N": now},
+        }}} for pid, chunks in pages.items()]
+        await self._write(requests)
+
+    async def _write(self, requests: List[Dict[str, Any]]) -> None:
+        for start in range(0, len(requests), _BATCH_WRITE_MAX):
+            pending = {self.table: requests[start:start + _BATCH_WRITE_MAX]}
+            attempt = 0
+            while pending:
+                resp = await asyncio.to_thread(self.client.batch_write_item, RequestItems=pending)
+                pending = resp.get("UnprocessedItems") or None
+                if pending:
+                    attempt += 1
+                    await asyncio.sleep(retry_backoff(attempt))
@@ -1,36 +1,103 @@
+import asyncio
+import heapq
 import json
-import os
-from openai import OpenAI, AsyncOpenAI
-from typing import List, Dict, Any
-from text_rag.aws_clients import bedrock_client
-from text_rag.config import RERANK_MODEL, MODEL_PROVIDER, OPENAI_API_KEY
+import numpy as np
+from typing import Awaitable, Callable, List, Dict, Any
+from text_rag.clients import get_registry
+from text_rag.config import (
+    RERANK_MODEL,
+    MODEL_PROVIDER,
+    RERANK_MODE,
+    MMR_LAMBDA,
+    RERANK_SHARD_SIZE,
+    RERANK_DOC_MAX_TOKENS,
+    RERANK_SHARD_TIMEOUT,
+)
+from text_rag.utils import truncate_to_tokens
+from text_rag.metrics import PROVIDER_ERRORS, FALLBACKS
 from text_rag.logger import get_logger
-from typing import List, Dict
 
 logger = get_logger("text_rag.reranker")
 
-def bedrock_reranker(query: str, candidates: List[Dict], top_n: int) -> List[int]:
-    client = bedrock_client()
-    prompt = {"input": {"query": query, "candidates": candidates}}
-    try:
-        resp = client.invoke_model(
-            modelId= RERANK_MODEL,
-            contentType="application/json",
-            accept="application/json",
-            body=json.dumps(prompt)
-        )
-        payload = json.loads(resp['body'].read())
-        scores = payload['scores']
-        logger.info(f"successfully reranked answer.")
-    except Exception as e:
-        logger.error(f"failed to rerank answer - {e}.")
-        return list(range(min(len(candidates), top_n)))
-    ranked = sorted(range(len(scores)), key=lambda i: scores[i], reverse=True)
-    return ranked[:top_n]
+ShardScorer = Callable[[str, List[Dict]], Awaitable[List[float]]]
+
+
+class PartialRerank(Exception):
+    """
+    Some rerank shards failed. `ranked` is still a usable top-n: scored candidates
+    first, then the unscored ones in retriever order. It must not be cached.
+    """
+
+    def __init__(self, ranked: List[int], failed: int, reason: str):
+        super().__init__(f"{failed} rerank shard(s) failed ({reason})")
+        self.ranked = ranked
+        self.failed = failed
+        self.reason = reason
+
+
+async def sharded_rerank(query: str, candidates: List[Dict], top_n: int, score_shard: ShardScorer) -> List[int]:
+    """
+    Score candidates in shards concurrently and merge into a global top-n.
 
+    Each candidate's text is capped at RERANK_DOC_MAX_TOKENS and the list is split
+    into shards of RERANK_SHARD_SIZE, so prompt size (and latency) stays flat as k
+    grows. Candidates of a shard that fails or exceeds RERANK_SHARD_TIMEOUT are
+    ranked below every scored candidate, in retriever order: kNN scores are not on
+    the same scale as relevance scores, so the two are never compared.
 
+    Returns:
+        List[int]: indices into `candidates`, best first
+
+    Raises:
+        PartialRerank: when any shard failed, carrying the fallback ranking
+    """
+    if not candidates:
+        return []
+    docs = [{"doc_id": c["doc_id"], "text": truncate_to_tokens(c.get("text") or "", RERANK_DOC_MAX_TOKENS)}
+            for c in candidates]
+    shards = [list(range(i, min(i + RERANK_SHARD_SIZE, len(docs)))) for i in range(0, len(docs), RERANK_SHARD_SIZE)]
+
+    results = await asyncio.gather(
+        *(asyncio.wait_for(score_shard(query, [docs[i] for i in shard]), RERANK_SHARD_TIMEOUT) for shard in shards),
+        return_exceptions=True,
+    )
+
+    scores: Dict[int, float] = {}
+    unscored: List[int] = []
+    reasons: List[str] = []
+    for shard, result in zip(shards, results):
+        if isinstance(result, BaseException) or len(result) != len(shard):
+            reason = "shard_timeout" if isinstance(result, asyncio.TimeoutError) else "shard_failed"
+            reasons.append(reason)
+            PROVIDER_ERRORS.labels(MODEL_PROVIDER, "rerank").inc()
+            logger.warning(f"rerank shard of {len(shard)} failed, keeping vector order - {reason}: {result}")
+            unscored.extend(shard)
+            continue
+        for i, score in zip(shard, result):
+            scores[i] = float(score)
+
+    for i, candidate in enumerate(candidates):
+        candidate["rerank_score"] = scores.get(i)
+    top_n = min(top_n, len(candidates))
+    logger.info("reranked", candidates=len(candidates), shards=len(shards), unscored=len(unscored))
+    # ties keep the retriever's order; shards are contiguous, so `unscored` is already in that order
+    ranked = heapq.nlargest(top_n, scores, key=lambda i: (scores[i], -i))
+    if not unscored:
+        return ranked
+    ranked += unscored[:top_n - len(ranked)]
+    raise PartialRerank(ranked, len(reasons), "shard_timeout" if set(reasons) == {"shard_timeout"} else "shard_failed")
+
+
+async def _bedrock_score_shard(query: str, docs: List[Dict]) -> List[float]:
+    bedrock = get_registry().bedrock_async()
+    prompt = {"input": {"query": query, "candidates": docs}}
+    payload = await bedrock.invoke_model(RERANK_MODEL, prompt)
+    return payload['scores']
+
+
+async def bedrock_reranker(query: str, candidates: List[Dict], top_n: int) -> List[int]:
+    return await sharded_rerank(query, candidates, top_n, _bedrock_score_shard)
 
-# Initialize OpenAI client (ensure OPENAI_API_KEY is set in env)
 
 def normalize_rerank_scores(rerank_data):
     """
@@ -55,22 +122,8 @@ def normalize_rerank_scores(rerank_data):
     # If nothing matches, raise error
     raise ValueError(f"Unexpected rerank format: {rerank_data}")
 
-async def openai_reranker(query: str, candidates: List[Dict], top_n: int) -> List[int]:
-    """
-    Rerank retrieved documents using OpenAI models.
-
-    Args:
-        query (str): The user query
-        candidates (List[Dict]): List of candidate docs, each with {"id": ..., "text": ..., "score": ...}
-        model (str): OpenAI model to use (default: gpt-4o-mini)
-
-    Returns:
-        List[Dict]: Reranked candidates with an added "rerank_score"
-    """
-
-    # Format the candidate docs for the model
-    #docs_text = "\n".join([f"[{i+1}] {doc['text']}" for i, doc in enumerate(candidates)])
-    docs_text = "\n".join([f"{doc['doc_id']} {doc['text']}" for i, doc in enumerate(candidates)])
+async def _openai_score_shard(query: str, docs: List[Dict]) -> List[float]:
+    docs_text = "\n".join([f"{doc['doc_id']} {doc['text']}" for doc in docs])
     system_prompt = (
         "You are a reranking assistant. "
         "Given a query and candidate documents, you assign a relevance score (0-1). "
@@ -80,7 +133,7 @@ async def openai_reranker(query: str, candidates: List[Dict], top_n: int) -> Lis
     user_prompt = f"Query: {query}\n\nDocuments:\n{docs_text}\n\nReturn a JSON list of objects in the form: " \
                   f'[{{"id": <candidate_id>, "score": <float 0-1>}}] sorted by score desc.'
     try:
-        client = AsyncOpenAI(api_key=OPENAI_API_KEY)
+        client = get_registry().openai()
         response = await client.chat.completions.create(
             model=RERANK_MODEL,
             temperature=1,
@@ -97,32 +150,95 @@ async def openai_reranker(query: str, candidates: List[Dict], top_n: int) -> Lis
 
     try:
         rerank_scores = json.loads(rerank_result)
-        logger.info(f"reranked the scores {rerank_scores}")
     except Exception as e:
         raise ValueError(f"Failed to parse rerank response: {rerank_result}") from e
 
     try:
         score_map = normalize_rerank_scores(rerank_scores)
-        for doc in candidates:
-            doc_id = str(doc["doc_id"])
-            doc["rerank_score"] = score_map.get(doc_id, 0)
     except Exception as scoring_error:
         raise ValueError(f"Failed to Merge ranks! - {scoring_error}")
+    return [score_map.get(str(doc["doc_id"]), 0) for doc in docs]
+
+
+async def openai_reranker(query: str, candidates: List[Dict], top_n: int) -> List[int]:
+    """
+    Rerank retrieved documents using OpenAI models.
+
+    Candidates are scored in concurrent shards (see `sharded_rerank`); a shard whose
+    call or JSON parsing fails falls back to vector order instead of failing the query.
+
+    Args:
+        query (str): The user query
+        candidates (List[Dict]): List of candidate docs, each with {"doc_id": ..., "text": ..., "score": ...}
+        top_n (int): number of indices to return
+
+    Returns:
+        List[int]: indices into `candidates`, best first
+    """
+    return await sharded_rerank(query, candidates, top_n, _openai_score_shard)
 
-    # Sort by rerank_score
-    reranked_scores = [candidate['rerank_score'] for candidate in candidates]
-    ranked = sorted(range(len(reranked_scores)), key=lambda i: reranked_scores[i], reverse=True)
-    return ranked[:top_n]
 
+def local_reranker(query_embedding: List[float], candidates: List[Dict], top_n: int,
+                   mmr_lambda: float = MMR_LAMBDA) -> List[int]:
+    """
+    Rerank candidates in-process with cosine similarity and Maximal Marginal Relevance.
 
-def invoke_reranking_model(query: str, candidates: List[Dict], top_n: int) -> List[int]:
+    Each step picks the candidate maximising
+        mmr_lambda * sim(query, d) - (1 - mmr_lambda) * max(sim(d, selected))
+    so near-duplicate chunks are pushed down in favour of diverse ones.
+
+    Args:
+        query_embedding: the query vector
+        candidates: retriever hits, each carrying its "embedding"
+        top_n: number of indices to return
+        mmr_lambda: relevance/diversity trade-off (1.0 = pure cosine ranking)
+
+    Returns:
+        List[int]: indices into `candidates`, best first
+    """
+    top_n = min(top_n, len(candidates))
+    if top_n == 0:
+        return []
+    if query_embedding is None or any(not c.get("embedding") for c in candidates):
+        FALLBACKS.labels("rerank", "missing_embeddings").inc()
+        logger.warning("local rerank missing embeddings, keeping vector order")
+        return list(range(top_n))
+
+    docs = np.asarray([c["embedding"] for c in candidates], dtype=np.float32)
+    docs /= np.maximum(np.linalg.norm(docs, axis=1, keepdims=True), 1e-12)
+    q = np.asarray(query_embedding, dtype=np.float32)
+    q /= max(float(np.linalg.norm(q)), 1e-12)
+
+    relevance = docs @ q
+    if mmr_lambda >= 1.0:
+        return [int(i) for i in np.argsort(-relevance)[:top_n]]
+
+    selected: List[int] = []
+    redundancy = np.zeros(len(candidates), dtype=np.float32)
+    available = np.ones(len(candidates), dtype=bool)
+    for step in range(top_n):
+        mmr = mmr_lambda * relevance - (1.0 - mmr_lambda) * redundancy
+        mmr[~available] = -np.inf
+        best = int(np.argmax(mmr))
+        selected.append(best)
+        available[best] = False
+        sim_to_best = docs @ docs[best]
+        redundancy = sim_to_best if step == 0 else np.maximum(redundancy, sim_to_best)
+    return selected
+
+
+async def invoke_reranking_model(query: str, candidates: List[Dict], top_n: int,
+                                 query_embedding: List[float] | None = None) -> List[int]:
+    if RERANK_MODE == 'local':
+        logger.debug("Using local MMR reranker")
+        return local_reranker(query_embedding, candidates, top_n)
     if MODEL_PROVIDER == 'openai':
-        logger.info("Initializing Open API reranking model")
-        results = openai_reranker(query, candidates, top_n)
+        logger.debug("Initializing Open API reranking model")
+        results = await openai_reranker(query, candidates, top_n)
         return results
     elif MODEL_PROVIDER == 'bedrock':
-        logger.info("Initializing Bedrock reranking model")
-        results = bedrock_reranker(query, candidates, top_n)
+        logger.debug("Initializing Bedrock reranking model")
+        results = await bedrock_reranker(query, candidates, top_n)
         return results
     else:
         raise ValueError(f"Unknown MODEL_PROVIDER: {MODEL_PROVIDER}")
@@ -1,12 +1,31 @@
-import json
-import aiohttp
-import boto3
+import asyncio
+import heapq
+import math
+import time
+import numpy as np
+import orjson
 from typing import List, Dict
-from text_rag.aws_clients import opensearch_client
-from text_rag.config import OPENSEARCH_INDEX, OPENSEARCH_HOST, AWS_REGION
+from text_rag.clients import get_registry
+from text_rag.config import (
+    OPENSEARCH_INDEX,
+    OPENSEARCH_HOST,
+    AWS_REGION,
+    RETRIEVAL_BACKEND,
+    RETRIEVAL_MODE,
+    VECTOR_MIN_SCORE,
+    HYBRID_KNN_K,
+    HYBRID_LEXICAL_K,
+    HYBRID_VECTOR_WEIGHT,
+    HYBRID_LEXICAL_WEIGHT,
+    RRF_K,
+    VECTOR_DATA_TYPE,
+    VECTOR_FULL_FIELD,
+    VECTOR_RESCORE_OVERSAMPLE,
+)
+from text_rag.local_index import local_vector_search
+from text_rag.utils import cosine_score, index_vector
+from text_rag.metrics import PROVIDER_ERRORS, FALLBACKS
 from text_rag.logger import get_logger
-from botocore.auth import SigV4Auth
-from botocore.awsrequest import AWSRequest
 
 logger = get_logger("text_rag.retriever")
 
@@ -18,19 +37,33 @@ def _sign_request(method: str, url: str, body: bytes = b"", service="es", region
     if OPENSEARCH_HOST.startswith("http://localhost"):
         return {}
 
-    region = AWS_REGION
-    # Get credentials synchronously from boto3
-    boto_session = boto3.session.Session()
-    creds = boto_session.get_credentials()
-    frozen = creds.get_frozen_credentials()
-    #aws_credentials = Credentials(creds.access_key, creds.secret_key, creds.token)
+    # botocore is imported on first use; see aws_clients
+    from botocore.auth import SigV4Auth
+    from botocore.awsrequest import AWSRequest
+
+    region = region or AWS_REGION
+    # Credentials are resolved once by the registry and refreshed before expiry
+    frozen = get_registry().frozen_credentials()
     request = AWSRequest(method=method, url=url, data=body)
     SigV4Auth(frozen, service, region).add_auth(request)
     return dict(request.headers.items())
 
-def vector_search_v1(query_embedding: List[float], k: int) -> List[Dict]:
-    client = opensearch_client()
+def _stored_vector_field() -> str:
+    """The full-precision vector in _source; byte indexes keep it next to the quantized kNN field."""
+    return VECTOR_FULL_FIELD if VECTOR_DATA_TYPE == "byte" else "embedding"
+
+def _source_fields(include_embedding: bool) -> List[str]:
+    """Only fetch what downstream stages read; the stored vector is several KB per hit."""
+    return ["text", _stored_vector_field()] if include_embedding else ["text"]
+
+# Strip took/_shards/_index etc. from responses; only ids, scores and the filtered _source remain.
+_SEARCH_FILTER_PATH = "hits.hits._id,hits.hits._score,hits.hits._source"
+_MSEARCH_FILTER_PATH = "responses.hits.hits._id,responses.hits.hits._score,responses.hits.hits._source,responses.error"
+
+def vector_search_v1(query_embedding: List[float], k: int, include_embedding: bool = False) -> List[Dict]:
+    client = get_registry().opensearch()
     body = {
+        "_source": ["metadata"] + _source_fields(include_embedding),
         "size": k,
         "query": {
             "knn": {
@@ -42,21 +75,23 @@ def vector_search_v1(query_embedding: List[float], k: int) -> List[Dict]:
         },
         "min_score": 0.6
     }
-    resp = client.search(index=OPENSEARCH_INDEX, body=body)
+    resp = client.search(index=OPENSEARCH_INDEX, body=body, filter_path=_SEARCH_FILTER_PATH)
     results = []
     for hit in resp.get("hits", {}).get("hits", []):
         src = hit.get("_source", {})
-        results.append({
+        item = {
             "id": hit.get("_id"),
             "score": hit.get("_score"),
             "metadata": src.get("metadata"),
             "chunk": src.get("text"),
-            "embedding": src.get("embedding")
-        })
-    logger.info("Successfully retrieved the results.")
+        }
+        if include_embedding:
+            item["embedding"] = src.get("embedding")
+        results.append(item)
+    logger.debug("Successfully retrieved the results.")
     return results
 
-def _parse_opensearch_results(results, id_field="_id", text_field="text"):
+def _parse_opensearch_results(results, id_field="_id", text_field="text", vector_field=None):
     """
     Parse OpenSearch vector search results into a structured list of dictionaries.
 
@@ -64,9 +99,10 @@ def _parse_opensearch_results(results, id_field="_id", text_field="text"):
         results (dict): Raw response from OpenSearch (JSON).
         id_field (str): Field to use as document ID (default: "_id").
         text_field (str): Field inside `_source` that contains the text (default: "text").
+        vector_field (str | None): If set, also return this `_source` field as "embedding".
 
     Returns:
-        list[dict]: A list of dicts with keys: doc_id, text, score.
+        list[dict]: A list of dicts with keys: doc_id, text, score (and embedding if requested).
     """
     if not results or "hits" not in results or "hits" not in results["hits"]:
         return []
@@ -77,43 +113,243 @@ def _parse_opensearch_results(results, id_field="_id", text_field="text"):
         text = hit.get("_source", {}).get(text_field, None)
         score = hit.get("_score", None)
 
-        parsed.append({
+        item = {
             "doc_id": doc_id,
             "text": text,
             "score": score
-        })
+        }
+        if vector_field:
+            item["embedding"] = hit.get("_source", {}).get(vector_field)
+        parsed.append(item)
 
     return parsed
 
-async def vector_search(vector: list[float], k: int = 5):
-    """
-    Run a k-NN vector similarity search in OpenSearch.
-    """
-    url = f"{OPENSEARCH_HOST}/{OPENSEARCH_INDEX}/_search"
+def _knn_query(vector: list[float], k: int, min_score: float | None = VECTOR_MIN_SCORE,
+               include_embedding: bool = False) -> dict:
     body = {
         "size": k,
+        "_source": _source_fields(include_embedding),
         "query": {
             "knn": {
                 "embedding": {
-                    "vector": vector,
+                    "vector": index_vector(vector),
                     "k": k
                 }
             }
         },
-        "min_score": 0.50
+    }
+    if min_score is not None:
+        body["min_score"] = min_score
+    return body
+
+def _lexical_query(query: str, k: int, include_embedding: bool = False) -> dict:
+    return {
+        "size": k,
+        "_source": _source_fields(include_embedding),
+        "query": {
+            "match": {
+                "text": {"query": query}
+            }
+        },
     }
 
-    body_bytes = json.dumps(body).encode("utf-8")
+async def _post(path: str, body_bytes: bytes, content_type: str = "application/json",
+                filter_path: str | None = None) -> dict:
+    """
+    POST a signed request to OpenSearch over the shared session and return the decoded JSON.
+    The body is decoded straight from bytes with orjson; payload size and parse time are logged.
+    """
+    url = f"{OPENSEARCH_HOST}/{OPENSEARCH_INDEX}/{path}"
+    if filter_path:
+        url = f"{url}?filter_path={filter_path}"
     headers = _sign_request("POST", url, body_bytes, service="es")
 
-    async with aiohttp.ClientSession() as session:
-        async with session.post(
-            url, data=body_bytes, headers={**headers, "Content-Type": "application/json"}
-        ) as resp:
-            text =  await resp.text()
-            logger.info(f"Vector search succeeded.")
-            if resp.status != 200:
-                logger.error("Vector search failed %s %s", resp.status, text)
-                raise RuntimeError(f"Vector search failed: {resp.status} {text}")
-            results = _parse_opensearch_results(json.loads(text))
-            return results
\ No newline at end of file
+    session = get_registry().http_session()
+    async with session.post(
+        url, data=body_bytes, headers={**headers, "Content-Type": content_type}
+    ) as resp:
+        raw = await resp.read()
+        if resp.status != 200:
+            # error bodies can echo the whole request; keep the head, which holds the reason
+            text = raw[:500].decode("utf-8", errors="replace")
+            PROVIDER_ERRORS.labels("opensearch", "vector_search").inc()
+            logger.error("Search failed", path=path, status=resp.status, body=text)
+            raise RuntimeError(f"Search failed: {resp.status} {text}")
+    started = time.perf_counter()
+    results = orjson.loads(raw)
+    parse_ms = (time.perf_counter() - started) * 1000
+    logger.info("opensearch response", path=path, sent_bytes=len(body_bytes), received_bytes=len(raw),
+                parse_ms=round(parse_ms, 2))
+    return results
+
+def _rescoring() -> bool:
+    return VECTOR_RESCORE_OVERSAMPLE > 1
+
+def _rescore_query(vector: list[float], k: int) -> dict:
+    """Oversampled first pass; min_score applies to the rescored, not the approximate, scores."""
+    return _knn_query(vector, math.ceil(k * VECTOR_RESCORE_OVERSAMPLE), min_score=None, include_embedding=True)
+
+def rescore(vector: list[float], hits: List[Dict], k: int, include_embedding: bool = False) -> List[Dict]:
+    """
+    Re-rank an oversampled kNN candidate set by exact cosine against the full-precision
+    vectors in _source, on the index engine's cosinesimil scale, and keep the top-k above
+    VECTOR_MIN_SCORE. Hits without a stored vector keep their first-pass score.
+    """
+    if not hits:
+        return hits
+    q = np.asarray(vector, dtype=np.float32)
+    q /= max(float(np.linalg.norm(q)), 1e-12)
+    rescored = []
+    for hit in hits:
+        stored = hit.get("embedding")
+        score = hit.get("score") or 0.0
+        if stored:
+            v = np.asarray(stored, dtype=np.float32)
+            score = cosine_score(float(q @ v) / max(float(np.linalg.norm(v)), 1e-12))
+        if score >= VECTOR_MIN_SCORE:
+            item = {**hit, "score": score}
+            if not include_embedding:
+                item.pop("embedding", None)
+            rescored.append(item)
+    return heapq.nlargest(k, rescored, key=lambda h: h["score"])
+
+async def vector_search(vector: list[float], k: int = 5, include_embedding: bool = False):
+    """
+    Run a k-NN vector similarity search in OpenSearch.
+    With include_embedding=True each hit also carries its stored "embedding".
+    With VECTOR_RESCORE_OVERSAMPLE > 1 the top-k is picked from an oversampled,
+    exactly rescored candidate set.
+    """
+    if RETRIEVAL_BACKEND == "local":
+        # a numpy scan (and, on first use, loading docs.jsonl); keep it off the event loop
+        return await asyncio.to_thread(local_vector_search, vector, k, min_score=VECTOR_MIN_SCORE,
+                                       include_embedding=include_embedding)
+
+    if _rescoring():
+        body_bytes = orjson.dumps(_rescore_query(vector, k))
+    else:
+        body_bytes = orjson.dumps(_knn_query(vector, k, include_embedding=include_embedding))
+    results = await _post("_search", body_bytes, filter_path=_SEARCH_FILTER_PATH)
+    logger.debug("Vector search succeeded.")
+    if _rescoring():
+        return rescore(vector, _parse_opensearch_results(results, vector_field=_stored_vector_field()), k,
+                       include_embedding=include_embedding)
+    return _parse_opensearch_results(results, vector_field=_stored_vector_field() if include_embedding else None)
+
+def reciprocal_rank_fusion(ranked_lists: List[List[Dict]], weights: List[float], k: int,
+                           rrf_k: int = RRF_K) -> List[Dict]:
+    """
+    Fuse ranked hit lists with weighted reciprocal rank fusion.
+
+    Each document scores sum(weight / (rrf_k + rank)) over the lists it appears in
+    (rank starting at 1), so agreement between lists matters more than the raw,
+    incomparable BM25 and cosine scores. The fused score replaces "score".
+
+    Returns:
+        list[dict]: the top-k fused hits, best first
+    """
+    fused: Dict[str, float] = {}
+    hits: Dict[str, Dict] = {}
+    for ranked, weight in zip(ranked_lists, weights):
+        for rank, hit in enumerate(ranked, start=1):
+            doc_id = hit["doc_id"]
+            fused[doc_id] = fused.get(doc_id, 0.0) + weight / (rrf_k + rank)
+            # keep the first copy seen; the kNN leg carries the embedding when requested
+            hits.setdefault(doc_id, hit)
+    top = heapq.nlargest(k, fused.items(), key=lambda item: item[1])
+    return [{**hits[doc_id], "score": score} for doc_id, score in top]
+
+async def _msearch(bodies: List[dict], include_embedding: bool = False) -> List[List[Dict] | Exception]:
+    """
+    Run several search bodies against the index in one `_msearch` round trip.
+    Returns one parsed hit list per body, or the error for a body that failed.
+    """
+    header = orjson.dumps({"index": OPENSEARCH_INDEX})
+    lines = []
+    for body in bodies:
+        lines.append(header)
+        lines.append(orjson.dumps(body))
+    body_bytes = b"\n".join(lines) + b"\n"
+    results = await _post("_msearch", body_bytes, content_type="application/x-ndjson",
+                          filter_path=_MSEARCH_FILTER_PATH)
+
+    vector_field = _stored_vector_field() if include_embedding else None
+    responses = results.get("responses", [])
+    parsed: List[List[Dict] | Exception] = []
+    for i in range(len(bodies)):
+        response = responses[i] if i < len(responses) else {}
+        if "error" in response:
+            parsed.append(RuntimeError(f"Search failed: {response['error']}"))
+        else:
+            parsed.append(_parse_opensearch_results(response, vector_field=vector_field))
+    return parsed
+
+def _fuse_legs(knn_hits, lexical_hits, k: int) -> List[Dict]:
+    legs = []
+    for leg, hits in (("knn", knn_hits), ("lexical", lexical_hits)):
+        if isinstance(hits, Exception):
+            FALLBACKS.labels("vector_search", f"{leg}_leg_failed").inc()
+            logger.error(f"Hybrid search {leg} leg failed - {hits}")
+            hits = []
+        legs.append(hits)
+    return reciprocal_rank_fusion(legs, [HYBRID_VECTOR_WEIGHT, HYBRID_LEXICAL_WEIGHT], k)
+
+async def hybrid_search(query: str, vector: list[float], k: int = 5, include_embedding: bool = False):
+    """
+    Run the lexical (BM25 `match`) and kNN legs in a single `_msearch` round trip
+    and fuse them with reciprocal rank fusion into the top-k.
+    """
+    if RETRIEVAL_BACKEND == "local":
+        # the local index has no lexical leg
+        return await vector_search(vector, k, include_embedding=include_embedding)
+
+    knn_hits, lexical_hits = await _msearch([
+        _knn_query(vector, HYBRID_KNN_K, include_embedding=include_embedding),
+        _lexical_query(query, HYBRID_LEXICAL_K, include_embedding=include_embedding),
+    ], include_embedding=include_embedding)
+    fused = _fuse_legs(knn_hits, lexical_hits, k)
+    logger.debug("Hybrid search succeeded.", fused=len(fused))
+    return fused
+
+async def search(query: str, vector: list[float], k: int = 5, include_embedding: bool = False):
+    """Retrieve top-k hits using the configured RETRIEVAL_MODE ("knn" or "hybrid")."""
+    if RETRIEVAL_MODE == "hybrid":
+        return await hybrid_search(query, vector, k, include_embedding=include_embedding)
+    return await vector_search(vector, k, include_embedding=include_embedding)
+
+async def search_many(queries: List[str], vectors: List[list[float]], k: int = 5,
+                      include_embedding: bool = False) -> List[List[Dict] | Exception]:
+    """
+    Batched `search`: every query's legs go out in a single `_msearch` request.
+    Returns one hit list per query, or the exception for a query whose search failed.
+    """
+    if not queries:
+        return []
+    if RETRIEVAL_BACKEND == "local":
+        def search_all() -> List[List[Dict] | Exception]:
+            results = []
+            for vector in vectors:
+                try:
+                    results.append(local_vector_search(vector, k, min_score=VECTOR_MIN_SCORE,
+                                                       include_embedding=include_embedding))
+                except Exception as e:
+                    results.append(e)
+            return results
+        return await asyncio.to_thread(search_all)
+
+    if RETRIEVAL_MODE == "hybrid":
+        bodies = []
+        for query, vector in zip(queries, vectors):
+            bodies.append(_knn_query(vector, HYBRID_KNN_K, include_embedding=include_embedding))
+            bodies.append(_lexical_query(query, HYBRID_LEXICAL_K, include_embedding=include_embedding))
+        legs = await _msearch(bodies, include_embedding=include_embedding)
+        results = [_fuse_legs(legs[2 * i], legs[2 * i + 1], k) for i in range(len(queries))]
+    elif _rescoring():
+        legs = await _msearch([_rescore_query(vector, k) for vector in vectors], include_embedding=True)
+        results = [hits if isinstance(hits, Exception) else rescore(vector, hits, k, include_embedding=include_embedding)
+                   for vector, hits in zip(vectors, legs)]
+    else:
+        bodies = [_knn_query(vector, k, include_embedding=include_embedding) for vector in vectors]
+        results = await _msearch(bodies, include_embedding=include_embedding)
+    logger.debug("Batched search succeeded.", queries=len(queries))
+    return results
@@ -0,0 +1,173 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from text_rag.config import (
+    CACHE_VERSION,
+    COMPLETION_MODEL,
+    EMBEDDING_MODEL,
+    EMBEDDING_OUTPUT_DIM,
+    OPENSEARCH_INDEX,
+    RERANK_MODEL,
+    SEMANTIC_CACHE_ENABLED,
+    SEMANTIC_CACHE_MAX_ENTRIES,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_NEAR_MISS_MARGIN,
+    SEMANTIC_CACHE_TTL,
+)
+from text_rag.metrics import CACHE_HITS, CACHE_MISSES
+from text_rag.logger import get_logger
+
+logger = get_logger("text_rag.semantic_cache")
+
+
+class SemanticCache:
+    """
+    Bounded in-process cache of answered queries, looked up by embedding similarity.
+
+    Embeddings are L2-normalised and stored as rows of a preallocated float32 matrix,
+    so a lookup is a single matrix-vector product. Entries are evicted in LRU order
+    once `max_entries` is reached, and expire `ttl` seconds after they were added.
+    `scope` partitions entries (e.g. by k/n) so a response is only reused for requests
+    with the same retrieval parameters; `version` is part of every scope, so entries
+    written for another index or model never match.
+
+    Near-misses (similar, but below the threshold) are misses; `stats()` reports them
+    separately as well.
+    """
+
+    def __init__(self, max_entries: int, threshold: float, near_miss_margin: float = 0.05,
+                 ttl: float = SEMANTIC_CACHE_TTL, version: str = ""):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.near_miss_margin = near_miss_margin
+        self.ttl = ttl
+        self.version = version
+        self._matrix: Optional[np.ndarray] = None
+        self._slots: "OrderedDict[int, Dict[str, Any]]" = OrderedDict()
+        self._free: List[int] = list(range(max_entries - 1, -1, -1))
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.near_misses = 0
+
+    @staticmethod
+    def _normalize(vector: List[float]) -> Optional[np.ndarray]:
+        v = np.asarray(vector, dtype=np.float32)
+        norm = float(np.linalg.norm(v))
+        if v.ndim != 1 or norm == 0.0:
+            return None
+        return v / norm
+
+    def lookup(self, embedding: List[float], scope: str = "") -> Optional[Dict[str, Any]]:
+        """
+        Return the cached response whose query embedding is most similar to `embedding`,
+        if the cosine similarity is at or above the threshold. Otherwise return None.
+        """
+        q = self._normalize(embedding)
+        scope = f"{self.version}|{scope}"
+        with self._lock:
+            if q is None or self._matrix is None or not self._slots or q.shape[0] != self._matrix.shape[1]:
+                self.misses += 1
+                CACHE_MISSES.labels("semantic").inc()
+                return None
+
+            self._evict_expired(time.monotonic())
+            slots = [s for s, e in self._slots.items() if e["scope"] == scope]
+            if not slots:
+                self.misses += 1
+                CACHE_MISSES.labels("semantic").inc()
+                return None
+
+            sims = self._matrix[slots] @ q
+            best = int(np.argmax(sims))
+            score = float(sims[best])
+            slot = slots[best]
+
+            if score >= self.threshold:
+                self.hits += 1
+                CACHE_HITS.labels("semantic", "memory").inc()
+                self._slots.move_to_end(slot)
+                entry = self._slots[slot]
+                logger.debug("semantic cache hit", similarity=round(score, 4))
+                return entry["response"]
+
+            self.misses += 1
+            CACHE_MISSES.labels("semantic").inc()
+            if score >= self.threshold - self.near_miss_margin:
+                self.near_misses += 1
+                logger.debug("semantic cache near-miss", similarity=round(score, 4), threshold=self.threshold)
+            return None
+
+    def _evict_expired(self, now: float) -> None:
+        # entries are in LRU order, not insertion order, so every one is checked
+        for slot in [s for s, e in self._slots.items() if e["expires"] <= now]:
+            del self._slots[slot]
+            self._free.append(slot)
+
+    def add(self, query: str, embedding: List[float], response: Dict[str, Any], scope: str = "") -> None:
+        q = self._normalize(embedding)
+        if q is None:
+            return
+        with self._lock:
+            if self._matrix is None:
+                self._matrix = np.zeros((self.max_entries, q.shape[0]), dtype=np.float32)
+            elif q.shape[0] != self._matrix.shape[1]:
+                # Embedding model/dimension changed; the old vectors are not comparable.
+                logger.info("semantic cache dimension changed, clearing entries")
+                self._matrix = np.zeros((self.max_entries, q.shape[0]), dtype=np.float32)
+                self._slots.clear()
+                self._free = list(range(self.max_entries - 1, -1, -1))
+
+            if self._free:
+                slot = self._free.pop()
+            else:
+                slot, _ = self._slots.popitem(last=False)
+
+            self._matrix[slot] = q
+            self._slots[slot] = {"query": query, "scope": f"{self.version}|{scope}", "response": response,
+                                 "expires": time.monotonic() + self.ttl}
+
+    def clear(self) -> None:
+        with self._lock:
+            self._matrix = None
+            self._slots.clear()
+            self._free = list(range(self.max_entries - 1, -1, -1))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._slots),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "near_misses": self.near_misses,
+        }
+
+
+_semantic_cache: Optional[SemanticCache] = None
+
+
+def _version() -> str:
+    """Everything a cached response depends on besides the query and k/n."""
+    return f"v{CACHE_VERSION}:{OPENSEARCH_INDEX}:{EMBEDDING_MODEL}:{EMBEDDING_OUTPUT_DIM}:{RERANK_MODEL}:{COMPLETION_MODEL}"
+
+
+def get_semantic_cache() -> Optional[SemanticCache]:
+    """Return the process-wide semantic cache, or None when disabled."""
+    global _semantic_cache
+    if not SEMANTIC_CACHE_ENABLED:
+        return None
+    if _semantic_cache is None:
+        _semantic_cache = SemanticCache(
+            max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+            threshold=SEMANTIC_CACHE_THRESHOLD,
+            near_miss_margin=SEMANTIC_CACHE_NEAR_MISS_MARGIN,
+            ttl=SEMANTIC_CACHE_TTL,
+            version=_version(),
+        )
+    return _semantic_cache
@@ -0,0 +1,105 @@
+"""
+Production entry point (`rag_server`, the Dockerfile.prod entrypoint).
+
+Runs `text_rag.api:app` under uvicorn without reload, in SERVER_WORKERS processes
+(0 = one per CPU available to the container), with uvloop and httptools when they
+are installed (`pip install text-rag[server]`). Each worker pre-warms its clients
+and connection pools and only then reports ready on /readyz, which is what the
+load balancer health check should use; /healthz stays a plain liveness probe.
+
+With several workers, Prometheus metrics are written to PROMETHEUS_MULTIPROC_DIR
+(a fresh temporary directory unless set) and /metrics aggregates every worker.
+Admission and stage limits (MAX_CONCURRENT_TASKS, ADMISSION_MAX_QUEUE,
+STAGE_CONCURRENCY_*), the L1 cache and the semantic cache are per process: the
+task-wide figures are the configured values times the worker count.
+"""
+import glob
+import importlib.util
+import os
+import tempfile
+
+import uvicorn
+
+from text_rag.config import (
+    API_HOST,
+    API_PORT,
+    MAX_CONCURRENT_TASKS,
+    SERVER_WORKERS,
+    SERVER_BACKLOG,
+    SERVER_KEEPALIVE_TIMEOUT,
+    SERVER_GRACEFUL_TIMEOUT,
+    SERVER_LOG_LEVEL,
+)
+from text_rag.logger import get_logger
+
+logger = get_logger("text_rag.server")
+
+
+def _installed(module: str) -> bool:
+    return importlib.util.find_spec(module) is not None
+
+
+def _cgroup_cpus() -> float | None:
+    """CPU quota of the container (cgroup v2), e.g. 2.0 for a 2 vCPU Fargate task."""
+    try:
+        with open("/sys/fs/cgroup/cpu.max") as f:
+            quota, period = f.read().split()
+        return None if quota == "max" else int(quota) / int(period)
+    except (OSError, ValueError):
+        return None
+
+
+def worker_count() -> int:
+    if SERVER_WORKERS > 0:
+        return SERVER_WORKERS
+    try:
+        cpus = len(os.sched_getaffinity(0))
+    except AttributeError:
+        cpus = os.cpu_count() or 1
+    quota = _cgroup_cpus()
+    if quota is not None:
+        cpus = min(cpus, max(1, int(quota)))
+    return max(1, cpus)
+
+
+def _multiprocess_metrics_dir() -> str:
+    """Set up PROMETHEUS_MULTIPROC_DIR before any worker imports prometheus_client."""
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if path:
+        os.makedirs(path, exist_ok=True)
+        # files left by a previous run would be summed into this one
+        for stale in glob.glob(os.path.join(path, "*.db")):
+            os.remove(stale)
+    else:
+        path = os.environ["PROMETHEUS_MULTIPROC_DIR"] = tempfile.mkdtemp(prefix="rag-metrics-")
+    return path
+
+
+def main():
+    workers = worker_count()
+    if workers > 1:
+        logger.info(f"aggregating metrics of {workers} workers in {_multiprocess_metrics_dir()}; "
+                    f"limits are per worker (MAX_CONCURRENT_TASKS={MAX_CONCURRENT_TASKS} each, "
+                    f"{MAX_CONCURRENT_TASKS * workers} in total)")
+    loop = "uvloop" if _installed("uvloop") else "asyncio"
+    http = "httptools" if _installed("httptools") else "h11"
+    logger.info(f"starting {workers} worker(s) on {API_HOST}:{API_PORT} (loop={loop}, http={http})")
+    uvicorn.run(
+        "text_rag.api:app",
+        host=API_HOST,
+        port=API_PORT,
+        workers=workers,
+        loop=loop,
+        http=http,
+        backlog=SERVER_BACKLOG,
+        timeout_keep_alive=SERVER_KEEPALIVE_TIMEOUT,
+        timeout_graceful_shutdown=SERVER_GRACEFUL_TIMEOUT,
+        log_level=SERVER_LOG_LEVEL,
+        access_log=False,
+        proxy_headers=True,
+        forwarded_allow_ips="*",
+    )
+
+
+if __name__ == "__main__":
+    main()
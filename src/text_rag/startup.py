@@ -0,0 +1,78 @@
+"""
+Startup timing and readiness of an API process.
+
+Imported first by `text_rag.api`, so the clock covers the heavy imports. Phases are
+recorded as they finish; `set_ready()` logs the breakdown, exports it as
+rag_startup_seconds{phase} and flips /readyz.
+"""
+import os
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional
+
+from text_rag.logger import get_logger
+
+logger = get_logger("text_rag.startup")
+
+
+def _process_age() -> Optional[float]:
+    """Seconds since this process was exec'd (Linux), i.e. including interpreter startup."""
+    try:
+        with open("/proc/self/stat", "rb") as f:
+            # field 22 (starttime, in clock ticks since boot) follows the parenthesised command name
+            start_ticks = int(f.read().rsplit(b")", 1)[1].split()[19])
+        with open("/proc/uptime", "rb") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+_age = _process_age()
+_started = time.perf_counter() - (_age or 0.0)
+_last = time.perf_counter()
+phases: Dict[str, float] = {"interpreter": round(_age, 4)} if _age is not None else {}
+_ready = False
+
+
+def elapsed() -> float:
+    return time.perf_counter() - _started
+
+
+def mark(name: str) -> None:
+    """Record the time since the previous mark as sequential phase `name`."""
+    global _last
+    now = time.perf_counter()
+    phases[name] = round(now - _last, 4)
+    _last = now
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    """Record the duration of the enclosed block; for steps that overlap (e.g. concurrent pre-warming)."""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        phases[name] = round(time.perf_counter() - started, 4)
+
+
+def set_ready() -> None:
+    global _ready
+    from text_rag.metrics import STARTUP_SECONDS
+
+    mark("prewarm")
+    phases["total"] = round(elapsed(), 4)
+    for name, seconds in phases.items():
+        STARTUP_SECONDS.labels(name).set(seconds)
+    _ready = True
+    logger.info(f"ready in {phases['total'] * 1000:.0f} ms (pid {os.getpid()}): "
+                + ", ".join(f"{name}={seconds * 1000:.0f}ms" for name, seconds in phases.items()))
+
+
+def is_ready() -> bool:
+    return _ready
+
+
+def report() -> Dict[str, object]:
+    return {"ready": _ready, "pid": os.getpid(), "uptime_s": round(elapsed(), 3), "phases": dict(phases)}
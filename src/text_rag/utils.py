@@ -1,12 +1,88 @@
-import json
+import asyncio
 import os
-from text_rag.aws_clients import bedrock_client
-from text_rag.config import EMBEDDING_MODEL, OPENAI_API_KEY
+import random
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+from text_rag.clients import get_registry
+from text_rag.config import (
+    EMBEDDING_MODEL,
+    EMBEDDING_OUTPUT_DIM,
+    RETRY_BACKOFF_BASE,
+    RETRY_BACKOFF_MAX,
+    VECTOR_DATA_TYPE,
+    VECTOR_INT8_SCALE,
+)
+from text_rag.metrics import PROVIDER_ERRORS
 from text_rag.logger import get_logger
-from openai import OpenAI
 
 logger = get_logger("text_rag.utils")
 
+# Rough token estimate (~4 characters per token for English BPE vocabularies);
+# good enough for budgeting without pulling in a tokenizer.
+CHARS_PER_TOKEN = 4
+
+
+def retry_backoff(attempt: int) -> float:
+    """Exponential backoff with full jitter, capped at RETRY_BACKOFF_MAX."""
+    return random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * 2 ** attempt))
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut `text` to roughly `max_tokens`, preferring a word boundary."""
+    limit = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= limit:
+        return text
+    cut = text.rfind(" ", 0, limit)
+    return text[:cut if cut > limit // 2 else limit].rstrip()
+
+def quantize_int8(vector: List[float], scale: float = VECTOR_INT8_SCALE) -> List[int]:
+    """Scale a unit vector into OpenSearch's byte range [-128, 127]; cosine ranking survives the rounding."""
+    return np.clip(np.rint(np.asarray(vector, dtype=np.float32) * scale), -128, 127).astype(np.int8).tolist()
+
+
+def index_vector(vector: List[float]) -> List[float] | List[int]:
+    """The form of a vector stored in and queried against the kNN field (see VECTOR_DATA_TYPE)."""
+    return quantize_int8(vector) if VECTOR_DATA_TYPE == "byte" else vector
+
+
+def knn_engine(data_type: Optional[str] = None) -> str:
+    """OpenSearch k-NN engine of the "embedding" field: byte vectors need lucene, float vectors use faiss."""
+    return "lucene" if (data_type or VECTOR_DATA_TYPE) == "byte" else "faiss"
+
+
+def cosine_score(cosine, engine: Optional[str] = None):
+    """
+    Map a cosine similarity (float or ndarray) onto the _score OpenSearch reports for the
+    cosinesimil space, so VECTOR_MIN_SCORE means the same for rescored and local hits.
+    Lucene scores (1 + cos) / 2; faiss and nmslib score 1 / (1 + d) with d = 1 - cos.
+    """
+    if (engine or knn_engine()) == "lucene":
+        return (1.0 + cosine) / 2.0
+    return 1.0 / (2.0 - cosine)
+
+
+def _dimensions() -> Optional[int]:
+    return int(EMBEDDING_OUTPUT_DIM) if EMBEDDING_OUTPUT_DIM else None
+
+
+def _openai_embedding_args() -> Dict[str, Any]:
+    # only text-embedding-3 models accept `dimensions`; leave EMBEDDING_OUTPUT_DIM empty for older ones
+    return {"dimensions": _dimensions()} if _dimensions() else {}
+
+
+def _bedrock_embedding_payload(text: str) -> Dict[str, Any]:
+    # Titan text embeddings v2 take dimensions 256, 512 or 1024
+    payload: Dict[str, Any] = {"inputText": text, "normalize": True}
+    if _dimensions():
+        payload["dimensions"] = _dimensions()
+    return payload
+
 # async def embed_text(text: str) -> list:
 #     client = bedrock_client()
 #     payload = {"input": text}
@@ -26,38 +102,26 @@ async def invoke_bedrock_embedding(text: str):
     Calls Bedrock to get embeddings for provided text.
     Returns list[float]
     """
-    # Convert to the invocation shape your model expects.
-    # Many embedding models accept: {"input": "<text>"} or a JSON wrapper.
-    #client = await get_aboto3_client("bedrock-runtime")
-
-    async with bedrock_client() as br:
-        try:
-            model_id = EMBEDDING_MODEL
-            # Prepare input; model-specific. This is generic JSON body.
-            payload = {"input": text}
-            resp = await br.invoke_model(
-                modelId=model_id,
-                contentType="application/json",
-                accept="application/json",
-                body=json.dumps(payload).encode("utf-8"),
-            )
-            # resp is a streaming/binary body. Read and parse
-            body_bytes = await resp['body'].read()
-            data = json.loads(body_bytes.decode("utf-8"))
-            # Assume model returns {"embeddings": [ ... ]} or {"embedding":[...]}
-            if "embedding" in data:
-                return data["embedding"]
-            if "embeddings" in data:
-                return data["embeddings"]
-            # If model returns text, attempt to parse numeric list
-            if isinstance(data, dict):
-                # try common keys
-                for key in data:
-                    if isinstance(data[key], list):
-                        return data[key]
-            #raise RuntimeError(f"Unexpected bedrock response: {data}")
-        except Exception as dre:
-            logger.error(f'Failed to embed the text - {dre}')
+    bedrock = get_registry().bedrock_async()
+    try:
+        # Titan text embedding models take {"inputText": "<text>"}
+        payload = _bedrock_embedding_payload(text)
+        data = await bedrock.invoke_model(EMBEDDING_MODEL, payload)
+        # Assume model returns {"embeddings": [ ... ]} or {"embedding":[...]}
+        if "embedding" in data:
+            return data["embedding"]
+        if "embeddings" in data:
+            return data["embeddings"]
+        # If model returns text, attempt to parse numeric list
+        if isinstance(data, dict):
+            # try common keys
+            for key in data:
+                if isinstance(data[key], list):
+                    return data[key]
+        #raise RuntimeError(f"Unexpected bedrock response: {data}")
+    except Exception as dre:
+        PROVIDER_ERRORS.labels("bedrock", "embedding").inc()
+        logger.error(f'Failed to embed the text - {dre}')
 
 
 async def invoke_embedding_model(text: str):
@@ -70,18 +134,45 @@ async def invoke_embedding_model(text: str):
 
     if mode == "openai":
         # OpenAI API (requires OPENAI_API_KEY in env)
-        logger.info("Initializing Open API model")
-        client = OpenAI(api_key=OPENAI_API_KEY)
-        response = client.embeddings.create(
+        logger.debug("Initializing Open API model")
+        client = get_registry().openai()
+        response = await client.embeddings.create(
             model=EMBEDDING_MODEL,
-            input=text
+            input=text,
+            **_openai_embedding_args(),
         )
         return response.data[0].embedding
 
     elif mode == "bedrock":
         # AWS Bedrock
-        logger.info("Initializing Bedrock API model")
-        output = invoke_bedrock_embedding(text)
+        logger.debug("Initializing Bedrock API model")
+        output = await invoke_bedrock_embedding(text)
         return output
     else:
         raise ValueError(f"Unknown MODEL_PROVIDER: {mode}")
+
+
+async def invoke_embedding_batch(texts: List[str]) -> List[Optional[List[float]]]:
+    """
+    Embed several texts with as few provider calls as possible.
+
+    OpenAI accepts a list input, so the whole batch is one request. Bedrock text
+    embedding models take a single inputText, so the batch is fanned out over the
+    async Bedrock adapter instead. Results are returned in input order.
+    """
+    mode = os.getenv("MODEL_PROVIDER", "bedrock").lower()
+
+    if mode == "openai":
+        client = get_registry().openai()
+        response = await client.embeddings.create(
+            model=EMBEDDING_MODEL,
+            input=texts,
+            **_openai_embedding_args(),
+        )
+        ordered = sorted(response.data, key=lambda d: d.index)
+        return [d.embedding for d in ordered]
+
+    elif mode == "bedrock":
+        return list(await asyncio.gather(*(invoke_bedrock_embedding(t) for t in texts)))
+    else:
+        raise ValueError(f"Unknown MODEL_PROVIDER: {mode}")
@@ -0,0 +1,66 @@
+import asyncio
+from typing import Awaitable, Callable
+
+import orjson
+
+from text_rag import startup
+from text_rag.clients import get_registry
+from text_rag.config import (
+    OPENSEARCH_HOST,
+    RETRIEVAL_BACKEND,
+    PREWARM_CONNECTIONS,
+    PREWARM_TIMEOUT,
+)
+from text_rag.logger import get_logger
+
+logger = get_logger("text_rag.warmup")
+
+
+async def _step(name: str, warm: Callable[[], Awaitable[object]]) -> None:
+    try:
+        with startup.phase(f"prewarm_{name}"):
+            await warm()
+    except Exception as e:
+        # a provider blip must not keep the task out of service; requests will retry the connection
+        logger.warning(f"pre-warming {name} failed - {e}")
+
+
+async def _redis() -> None:
+    from text_rag.cache import get_redis
+    await (await get_redis()).ping()
+
+
+async def _search() -> None:
+    if RETRIEVAL_BACKEND == "local":
+        from text_rag.local_index import get_local_index
+        await asyncio.to_thread(get_local_index)
+        return
+    from text_rag.retriever import _post
+    if not OPENSEARCH_HOST.startswith("http://localhost"):
+        # resolves the credential chain (instance metadata on Fargate) once, off the loop
+        await asyncio.to_thread(get_registry().frozen_credentials)
+    body = orjson.dumps({"size": 0, "query": {"match_none": {}}})
+    await asyncio.gather(*(_post("_search", body) for _ in range(PREWARM_CONNECTIONS)))
+
+
+async def _models() -> None:
+    from text_rag.utils import invoke_embedding_batch
+    # concurrent calls open several pooled connections to the provider used by every model stage
+    await asyncio.gather(*(invoke_embedding_batch([f"warmup {i}"]) for i in range(PREWARM_CONNECTIONS)))
+
+
+async def prewarm() -> None:
+    """
+    Import the provider SDKs, resolve credentials and open keep-alive connections to
+    Redis, OpenSearch and the model provider, then mark the process ready. Steps run
+    concurrently and are bounded by PREWARM_TIMEOUT; failures are logged, not fatal.
+    """
+    try:
+        await asyncio.wait_for(asyncio.gather(
+            _step("redis", _redis),
+            _step("search", _search),
+            _step("models", _models),
+        ), PREWARM_TIMEOUT)
+    except asyncio.TimeoutError:
+        logger.warning(f"pre-warming did not finish within {PREWARM_TIMEOUT:.0f}s")
+    startup.set_ready()
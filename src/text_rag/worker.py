@@ -1,38 +1,385 @@
 import asyncio
-from text_rag.retriever import vector_search
-from text_rag.reranker import invoke_reranking_model
-from text_rag.generator import invoke_generator_model
-from text_rag.utils import invoke_embedding_model
-from text_rag.config import RETRIEVAL_K, RERANK_TOP_N
-from text_rag.cache import get_cached_response, set_cached_response
+import time
+from typing import Any, AsyncIterator, Dict, List, Tuple
+from text_rag.retriever import search, search_many
+from text_rag.reranker import PartialRerank, invoke_reranking_model
+from text_rag.generator import invoke_generator_model, stream_generator_model
+from text_rag.embedder import get_embedding_batcher
+from text_rag.context import pack_context
+from text_rag.adaptive import plan_retrieval
+from text_rag.config import (
+    RETRIEVAL_K,
+    RERANK_TOP_N,
+    SINGLE_FLIGHT_ENABLED,
+    RERANK_MODE,
+    BATCH_MAX_CONCURRENCY,
+    BUDGET_GENERATION_MS,
+    BUDGET_RERANK_MIN_MS,
+    BUDGET_ANSWER_MIN_MS,
+)
+from text_rag.cache import (
+    get_cached_response,
+    set_cached_response,
+    get_cached_embedding,
+    set_cached_embedding,
+    get_cached_hits,
+    set_cached_hits,
+    get_cached_rerank,
+    set_cached_rerank,
+    get_cached_answer,
+    set_cached_answer,
+)
+from text_rag.semantic_cache import get_semantic_cache
+from text_rag.local_cache import query_flight
+from text_rag.admission import stage_limits
+from text_rag.deadline import Deadline
+from text_rag.metrics import TIME_TO_FIRST_TOKEN, stage_timer, observe_stage
 from text_rag.logger import get_logger
 
 logger = get_logger("text_rag.worker")
 
-async def handle_query(query: str, k: int = None, n: int = None, do_reflection: bool = False):
-    #check cache
-    cached = await get_cached_response(query)
-    if cached:
-        return cached
+class EmbeddingFailed(Exception):
+    """The provider returned no embedding for the query (it has already logged and counted the error)."""
+
+    def __init__(self):
+        super().__init__("embedding failed for the query")
+
+async def embed_query(query: str):
+    with stage_timer("embedding"):
+        embedding = await get_cached_embedding(query)
+        if embedding is None:
+            async with stage_limits["embedding"].slot():
+                embedding = await get_embedding_batcher().embed(query)
+            if embedding:
+                await set_cached_embedding(query, embedding)
+    return embedding
+
+async def retrieve(query: str, query_embedding, k: int):
+    with stage_timer("vector_search"):
+        if RERANK_MODE == "local":
+            # the local reranker needs each hit's vector; those payloads are too large to cache
+            async with stage_limits["vector_search"].slot():
+                return await search(query, query_embedding, k, include_embedding=True)
+        hits = await get_cached_hits(query_embedding, k, query)
+        if hits is None:
+            async with stage_limits["vector_search"].slot():
+                hits = await search(query, query_embedding, k)
+            await set_cached_hits(query_embedding, k, hits, query)
+    return hits
+
+async def rerank(query: str, candidates: list, n: int, query_embedding=None):
+    with stage_timer("rerank"):
+        if RERANK_MODE == "local":
+            # in-process rerank is cheaper than a cache round trip
+            return await invoke_reranking_model(query, candidates, n, query_embedding=query_embedding)
+        candidate_ids = [str(c['doc_id']) for c in candidates]
+        ranked_indices = await get_cached_rerank(query, candidate_ids, n)
+        if ranked_indices is None:
+            # a PartialRerank propagates uncached
+            async with stage_limits["rerank"].slot():
+                ranked_indices = await invoke_reranking_model(query, candidates, n)
+            await set_cached_rerank(query, candidate_ids, n, ranked_indices)
+    return ranked_indices
 
+async def generate(query: str, top_chunks: list):
+    with stage_timer("generation"):
+        chunk_ids = [str(c['doc_id']) for c in top_chunks]
+        answer = await get_cached_answer(query, chunk_ids)
+        if answer is None:
+            with stage_timer("context"):
+                context, _ = pack_context(top_chunks)
+            async with stage_limits["generation"].slot():
+                answer = await invoke_generator_model(query, context)
+            if answer and not str(answer).startswith("[error]"):
+                await set_cached_answer(query, chunk_ids, answer)
+    return answer
+
+async def handle_query(query: str, k: int = None, n: int = None, do_reflection: bool = False,
+                       budget_ms: int = None):
     k = k or RETRIEVAL_K
     n = n or RERANK_TOP_N
+    deadline = Deadline(budget_ms)
+
+    with stage_timer("handle_query"):
+        if not SINGLE_FLIGHT_ENABLED:
+            return await _run_query(query, k, n, deadline)
+        # identical concurrent queries with the same budget share a single pipeline execution (and
+        # the leader's deadline); a caller with a longer budget never gets a shorter one's degradations
+        return await query_flight.do(f"{k}:{n}:{deadline.budget_ms}:{query}",
+                                     lambda: _run_query(query, k, n, deadline))
+
+def _sources(top_chunks: list) -> list:
+    return [{"doc_id": c['doc_id'], "score": c['score'], "text": c['text']} for c in top_chunks]
+
+async def _rerank_within_budget(query: str, candidates: list, n: int, query_embedding,
+                                deadline: Deadline) -> list:
+    """Rerank with whatever the budget leaves after reserving generation; fall back to the vector order."""
+    vector_order = list(range(min(n, len(candidates))))
+    timeout = deadline.timeout(reserve_ms=BUDGET_GENERATION_MS)
+    if timeout is not None and timeout * 1000 < BUDGET_RERANK_MIN_MS:
+        deadline.degrade("rerank_skipped", "rerank", "budget")
+        return vector_order
+    try:
+        return await asyncio.wait_for(rerank(query, candidates, n, query_embedding=query_embedding), timeout)
+    except asyncio.TimeoutError:
+        deadline.degrade("rerank_skipped", "rerank", "timeout")
+    except PartialRerank as e:
+        deadline.degrade("rerank_partial", "rerank", e.reason)
+        return e.ranked
+    except Exception as e:
+        logger.error(f"rerank failed, keeping vector order - {e}")
+        deadline.degrade("rerank_skipped", "rerank", "error")
+    return vector_order
+
+def _fit_context(top_chunks: list, deadline: Deadline) -> list:
+    """Halve the context when generation no longer has its full reserve; fewer input tokens, faster answer."""
+    if len(top_chunks) > 1 and deadline.remaining_ms() < BUDGET_GENERATION_MS:
+        deadline.degrade("context_reduced", "generation", "budget")
+        return top_chunks[:max(1, len(top_chunks) // 2)]
+    return top_chunks
+
+async def _prepare(query: str, k: int, n: int, deadline: Deadline = None):
+    """
+    Run every stage up to (not including) generation within the request's deadline.
+
+    Returns (cached_response, query_embedding, top_chunks); cached_response is set
+    when the full answer was served from the response or semantic cache.
+    """
+    deadline = deadline or Deadline(0)
+    #check cache
+    with stage_timer("cache_lookup"):
+        cached = await get_cached_response(query, k, n)
+    if cached:
+        return cached, None, None
 
     #embedding
-    query_embedding = await invoke_embedding_model(query)
+    query_embedding = await deadline.run("embedding", embed_query(query))
+    if not query_embedding:
+        raise EmbeddingFailed()
+
+    #check semantic cache
+    semantic_cache = get_semantic_cache()
+    if semantic_cache is not None:
+        cached = semantic_cache.lookup(query_embedding, scope=f"{k}:{n}")
+        if cached:
+            return cached, query_embedding, None
 
     #retrieve top-k
-    raw_candidates = await vector_search(query_embedding, k)
+    raw_candidates = await deadline.run("vector_search", retrieve(query, query_embedding, k))
     if not raw_candidates:
         logger.info("No documents found")
-        return {"answer": "No documents found.", "sources": []}
+        return {"answer": "No documents found.", "sources": []}, query_embedding, None
     #candidate_texts = [c['chunk'] for c in raw_candidates]
 
+    #decide from the score distribution: skip rerank, or widen k
+    plan = plan_retrieval(raw_candidates, k, n)
+    if not plan.rerank:
+        return None, query_embedding, raw_candidates[:plan.n]
+    if plan.k > k:
+        raw_candidates = await deadline.run("vector_search", retrieve(query, query_embedding, plan.k)) or raw_candidates
+
     #rerank
-    ranked_indices = await invoke_reranking_model(query, raw_candidates, n)
+    ranked_indices = await _rerank_within_budget(query, raw_candidates, plan.n, query_embedding, deadline)
     top_chunks = [raw_candidates[i] for i in ranked_indices]
+    return None, query_embedding, top_chunks
+
+async def _finalize(query: str, k: int, n: int, query_embedding, top_chunks: list, answer: str,
+                    degraded: list = None) -> dict:
+    response = {"answer": answer, "sources": _sources(top_chunks), "degraded": degraded or []}
+    # degraded responses are a product of this request's budget, not of the query
+    if answer is not None and not str(answer).startswith("[error]") and not degraded:
+        await set_cached_response(query, response, k, n)
+        semantic_cache = get_semantic_cache()
+        if semantic_cache is not None:
+            semantic_cache.add(query, query_embedding, response, scope=f"{k}:{n}")
+    return response
+
+async def _run_query(query: str, k: int, n: int, deadline: Deadline):
+    cached, query_embedding, top_chunks = await _prepare(query, k, n, deadline)
+    if cached:
+        return cached
+
+    #generate what the remaining budget allows: full context, reduced context or sources only
+    top_chunks = _fit_context(top_chunks, deadline)
+    answer = None
+    if deadline.remaining_ms() < BUDGET_ANSWER_MIN_MS:
+        deadline.degrade("answer_omitted", "generation", "budget")
+    else:
+        try:
+            answer = await asyncio.wait_for(generate(query, top_chunks), deadline.timeout())
+        except asyncio.TimeoutError:
+            deadline.degrade("answer_omitted", "generation", "timeout")
+    return await _finalize(query, k, n, query_embedding, top_chunks, answer, deadline.degraded)
+
+async def stream_query(query: str, k: int = None, n: int = None,
+                       budget_ms: int = None) -> AsyncIterator[Tuple[str, Any]]:
+    """
+    Streaming variant of handle_query.
+
+    Yields ("sources", [...]) as soon as reranking finishes, then ("token", str) for each
+    answer delta and finally ("done", {...}). Cached answers are sent as a single token.
+    The answer and response caches are populated once the stream completes.
+
+    The budget covers everything up to the first token; once tokens flow the stream
+    runs to completion. Degradations are listed in the "done" event.
+    """
+    k = k or RETRIEVAL_K
+    n = n or RERANK_TOP_N
+    started = time.perf_counter()
+    deadline = Deadline(budget_ms)
+
+    cached, query_embedding, top_chunks = await _prepare(query, k, n, deadline)
+    if cached:
+        yield "sources", cached.get("sources", [])
+        yield "token", cached.get("answer", "")
+        yield "done", {"cached": True, "degraded": []}
+        return
+
+    top_chunks = _fit_context(top_chunks, deadline)
+    yield "sources", _sources(top_chunks)
+    if deadline.remaining_ms() < BUDGET_ANSWER_MIN_MS:
+        deadline.degrade("answer_omitted", "generation", "budget")
+        yield "done", {"cached": False, "degraded": deadline.degraded}
+        return
+
+    chunk_ids = [str(c['doc_id']) for c in top_chunks]
+    answer = await get_cached_answer(query, chunk_ids)
+    if answer is not None:
+        yield "token", answer
+        yield "done", {"cached": True, "degraded": deadline.degraded}
+        await _finalize(query, k, n, query_embedding, top_chunks, answer, deadline.degraded)
+        return
+
+    with stage_timer("context"):
+        context, _ = pack_context(top_chunks)
+    parts = []
+    ttft = None
+    generation_started = time.perf_counter()
+    async with stage_limits["generation"].slot():
+        stream = stream_generator_model(query, context)
+        try:
+            # the budget bounds the wait for the first delta; after that the stream runs to completion
+            try:
+                delta = await asyncio.wait_for(anext(stream), deadline.timeout())
+            except StopAsyncIteration:
+                delta = None
+            except asyncio.TimeoutError:
+                delta = None
+                deadline.degrade("answer_omitted", "generation", "timeout")
+            if delta is not None:
+                ttft = time.perf_counter() - started
+                TIME_TO_FIRST_TOKEN.observe(ttft)
+                logger.info("time to first token", ttft_ms=round(ttft * 1000, 1))
+                parts.append(delta)
+                yield "token", delta
+                async for delta in stream:
+                    parts.append(delta)
+                    yield "token", delta
+        finally:
+            await stream.aclose()
+
+    observe_stage("generation", time.perf_counter() - generation_started)
+
+    answer = "".join(parts).strip()
+    # here _finalize only populates the response caches; an empty answer must not be served from them
+    if answer:
+        await set_cached_answer(query, chunk_ids, answer)
+        await _finalize(query, k, n, query_embedding, top_chunks, answer, deadline.degraded)
+    yield "done", {"cached": False, "ttft_ms": round(ttft * 1000, 1) if ttft is not None else None,
+                   "degraded": deadline.degraded}
+
+
+async def _retrieve_many(queries: List[str], embeddings: List[list], k: int) -> List[Any]:
+    """Batched `retrieve`: cached hits are reused and all misses share one _msearch."""
+    if RERANK_MODE == "local":
+        try:
+            async with stage_limits["vector_search"].slot():
+                return await search_many(queries, embeddings, k, include_embedding=True)
+        except Exception as e:
+            return [e] * len(queries)
+
+    hits = list(await asyncio.gather(*(get_cached_hits(e, k, q) for q, e in zip(queries, embeddings))))
+    misses = [i for i, h in enumerate(hits) if h is None]
+    if misses:
+        try:
+            async with stage_limits["vector_search"].slot():
+                fetched = await search_many([queries[i] for i in misses], [embeddings[i] for i in misses], k)
+        except Exception as e:
+            fetched = [e] * len(misses)
+        for i, result in zip(misses, fetched):
+            hits[i] = result
+            if not isinstance(result, Exception):
+                await set_cached_hits(embeddings[i], k, result, queries[i])
+    return hits
+
+async def handle_batch(queries: List[str], k: int = None, n: int = None,
+                       concurrency: int = None) -> AsyncIterator[Tuple[int, Dict]]:
+    """
+    Run many queries through handle_query's stages as batches.
+
+    Embeddings go through the micro-batcher (few provider calls for the whole
+    batch), retrieval for every query is a single `_msearch`, and rerank +
+    generation fan out under a concurrency cap. Yields (index, result) as each
+    query finishes; a failing query yields {"error": ...} without affecting the rest.
+    """
+    k = k or RETRIEVAL_K
+    n = n or RERANK_TOP_N
+    concurrency = min(concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY)
+
+    def failed(e) -> Dict:
+        return {"error": str(e) or e.__class__.__name__}
+
+    #check cache
+    cached = await asyncio.gather(*(get_cached_response(q, k, n) for q in queries))
+    pending = []
+    for i, response in enumerate(cached):
+        if response:
+            yield i, response
+        else:
+            pending.append(i)
+    if not pending:
+        return
+
+    #embedding
+    embeddings = await asyncio.gather(*(embed_query(queries[i]) for i in pending), return_exceptions=True)
+    ready = []
+    for i, embedding in zip(pending, embeddings):
+        if isinstance(embedding, BaseException) or not embedding:
+            yield i, failed(embedding or EmbeddingFailed())
+        else:
+            ready.append((i, embedding))
+    if not ready:
+        return
+
+    #retrieve top-k for every query in one round trip
+    hits_list = await _retrieve_many([queries[i] for i, _ in ready], [e for _, e in ready], k)
+
+    semaphore = asyncio.Semaphore(concurrency)
 
-    #generate
-    answer = await invoke_generator_model(query, top_chunks)
+    async def complete(i: int, query_embedding, hits) -> Tuple[int, Dict]:
+        async with semaphore:
+            try:
+                if isinstance(hits, Exception):
+                    raise hits
+                if not hits:
+                    return i, {"answer": "No documents found.", "sources": []}
+                degraded = []
+                try:
+                    ranked_indices = await rerank(queries[i], hits, n, query_embedding=query_embedding)
+                except PartialRerank as e:
+                    ranked_indices = e.ranked
+                    degraded.append("rerank_partial")
+                top_chunks = [hits[j] for j in ranked_indices]
+                answer = await generate(queries[i], top_chunks)
+                return i, await _finalize(queries[i], k, n, query_embedding, top_chunks, answer, degraded)
+            except Exception as e:
+                logger.error(f"batch query {i} failed - {e}")
+                return i, failed(e)
 
-    return {"answer": answer, "sources": [{"doc_id": c['doc_id'], "score": c['score'], "text": c['text']} for c in top_chunks]}
+    tasks = [asyncio.ensure_future(complete(i, e, h)) for (i, e), h in zip(ready, hits_list)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
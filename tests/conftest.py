@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# the in-memory Redis stand-in shared with the load test
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
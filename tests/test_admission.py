@@ -0,0 +1,60 @@
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+from text_rag import api
+from text_rag.admission import Limiter, Overloaded
+
+
+def test_rejects_when_queue_is_full():
+    limiter = Limiter("test", 1, max_queue=1)
+
+    async def run():
+        held = await limiter.acquire()
+        waiter = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        with pytest.raises(Overloaded) as raised:
+            await limiter.acquire()
+        limiter.release(held)
+        limiter.release(await waiter)
+        return raised.value
+
+    error = asyncio.run(run())
+    assert error.limiter == "test"
+    assert error.retry_after >= 1
+    assert limiter.stats()["rejected"] == 1
+    assert limiter.stats()["admitted"] == 2
+
+
+def test_rejects_after_queue_timeout():
+    limiter = Limiter("test", 1, max_queue=5, queue_timeout=0.01)
+
+    async def run():
+        held = await limiter.acquire()
+        try:
+            await limiter.acquire()
+        finally:
+            limiter.release(held)
+
+    with pytest.raises(Overloaded):
+        asyncio.run(run())
+    assert limiter.waiting == 0
+
+
+def test_retry_after_grows_with_the_queue():
+    limiter = Limiter("test", 2)
+    limiter._avg_hold = 2.0
+    assert limiter.retry_after() == 1
+    limiter.waiting = 4
+    assert limiter.retry_after() == 5
+
+
+def test_overloaded_request_gets_429_with_retry_after(monkeypatch):
+    full = Limiter("admission", 1, max_queue=0)
+    full.in_flight = 1
+    full._avg_hold = 3.0
+    monkeypatch.setattr(api, "admission", full)
+    response = TestClient(api.app).post("/generate", json={"query": "q"})
+    assert response.status_code == 429
+    assert response.headers["Retry-After"] == "3"
@@ -0,0 +1,71 @@
+import asyncio
+
+import pytest
+
+from fake_redis import InMemoryRedis
+from text_rag import cache
+from text_rag.local_cache import l1_cache
+from text_rag.metrics import CACHE_HITS, CACHE_MISSES
+
+EMBEDDING = [0.25, -0.5, 0.125]
+SOURCES = [{"doc_id": "d1", "score": 0.9, "text": "first chunk " * 200}, {"doc_id": "d2", "score": 0.8, "text": "second"}]
+
+# (layer, set coroutine, get coroutine, value)
+LAYERS = [
+    ("embedding", lambda v: cache.set_cached_embedding("q", v), lambda: cache.get_cached_embedding("q"), EMBEDDING),
+    ("rerank", lambda v: cache.set_cached_rerank("q", ["d1", "d2"], 2, v),
+     lambda: cache.get_cached_rerank("q", ["d1", "d2"], 2), [1, 0]),
+    ("answer", lambda v: cache.set_cached_answer("q", ["d1"], v), lambda: cache.get_cached_answer("q", ["d1"]),
+     "the answer"),
+    ("response", lambda v: cache.set_cached_response("q", v, 5, 2), lambda: cache.get_cached_response("q", 5, 2),
+     {"answer": "a", "sources": SOURCES, "degraded": []}),
+    ("retrieval", lambda v: cache.set_cached_hits(EMBEDDING, 5, v, "q"),
+     lambda: cache.get_cached_hits(EMBEDDING, 5, "q"), SOURCES),
+]
+
+
+@pytest.fixture(autouse=True)
+def fake_redis(monkeypatch):
+    redis = InMemoryRedis()
+    monkeypatch.setattr(cache, "_redis", redis)
+    l1_cache.clear()
+    yield redis
+    l1_cache.clear()
+
+
+def hits(layer, tier):
+    return CACHE_HITS.labels(layer, tier)._value.get()
+
+
+@pytest.mark.parametrize("layer,put,get,value", LAYERS, ids=[layer[0] for layer in LAYERS])
+def test_round_trip_through_redis_and_l1(layer, put, get, value):
+    async def run():
+        await put(value)
+        l1_cache.clear()
+        redis_before, l1_before = hits(layer, "redis"), hits(layer, "l1")
+        assert await get() == value
+        assert hits(layer, "redis") == redis_before + 1
+        # the Redis hit was promoted to L1
+        assert await get() == value
+        assert hits(layer, "l1") == l1_before + 1
+    asyncio.run(run())
+
+
+@pytest.mark.parametrize("layer,put,get,value", LAYERS, ids=[layer[0] for layer in LAYERS])
+def test_miss(layer, put, get, value):
+    before = CACHE_MISSES.labels(layer)._value.get()
+    assert asyncio.run(get()) is None
+    assert CACHE_MISSES.labels(layer)._value.get() == before + 1
+
+
+def test_expired_chunk_is_a_miss(fake_redis):
+    async def run():
+        await cache.set_cached_response("q", {"answer": "a", "sources": SOURCES}, 5, 2)
+        l1_cache.clear()
+        del fake_redis._data[cache._chunk_key("d1")]
+        hits_before = hits("response", "redis")
+        misses_before = CACHE_MISSES.labels("response")._value.get()
+        assert await cache.get_cached_response("q", 5, 2) is None
+        assert hits("response", "redis") == hits_before
+        assert CACHE_MISSES.labels("response")._value.get() == misses_before + 1
+    asyncio.run(run())
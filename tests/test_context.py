@@ -0,0 +1,21 @@
+from text_rag.context import pack_context
+
+
+def words(start, count):
+    return " ".join(f"w{i}" for i in range(start, start + count))
+
+
+def test_duplicate_chunk_is_dropped():
+    packed, stats = pack_context([{"doc_id": "a", "text": words(0, 100)}, {"doc_id": "b", "text": words(0, 100)}])
+    assert [c["doc_id"] for c in packed] == ["a"]
+    assert stats["duplicates"] == 1
+
+
+def test_dedup_compares_with_the_packed_text():
+    long_chunk = {"doc_id": "a", "text": words(0, 700)}
+    # the tail of chunk a, which does not fit in a's 200-token slice of the context
+    tail = {"doc_id": "b", "text": words(500, 200)}
+    packed, stats = pack_context([long_chunk, tail], chunk_max_tokens=200)
+    assert [c["doc_id"] for c in packed] == ["a", "b"]
+    assert stats["duplicates"] == 0
+    assert "w650" in packed[1]["text"]
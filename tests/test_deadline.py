@@ -0,0 +1,39 @@
+import asyncio
+
+import pytest
+
+from text_rag.deadline import Deadline, DeadlineExceeded
+from text_rag.metrics import FALLBACKS
+
+
+def test_unbounded_budget():
+    deadline = Deadline(0)
+    assert not deadline.bounded
+    assert deadline.timeout(reserve_ms=500) is None
+
+
+def test_timeout_leaves_the_reserve():
+    deadline = Deadline(1000)
+    assert 0.4 < deadline.timeout(reserve_ms=500) <= 0.5
+    assert deadline.timeout(reserve_ms=5000) == 0.0
+
+
+def test_degrade_is_reported_and_counted():
+    deadline = Deadline(1000)
+    before = FALLBACKS.labels("rerank", "budget")._value.get()
+    deadline.degrade("rerank_skipped", "rerank", "budget")
+    assert deadline.degraded == ["rerank_skipped"]
+    assert FALLBACKS.labels("rerank", "budget")._value.get() == before + 1
+
+
+def test_run_raises_when_the_budget_runs_out():
+    deadline = Deadline(10)
+    with pytest.raises(DeadlineExceeded) as raised:
+        asyncio.run(deadline.run("embedding", asyncio.sleep(1)))
+    assert raised.value.stage == "embedding"
+
+
+def test_run_returns_within_budget():
+    async def fast():
+        return "ok"
+    assert asyncio.run(Deadline(1000).run("embedding", fast())) == "ok"
@@ -0,0 +1,142 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+
+import orjson
+import pytest
+
+from text_rag import ingest
+from text_rag.ingest import BulkWriter, ObjectIndexer
+from text_rag.page_state import content_hash, page_id
+
+
+class FakeBody:
+    def __init__(self, lines):
+        self.lines = lines
+
+    def iter_lines(self, chunk_size=None):
+        return iter(self.lines)
+
+    def close(self):
+        pass
+
+
+class FakeS3:
+    def __init__(self, pages):
+        self.lines = [orjson.dumps({"doc_id": "doc", "page": page, "text": f"page {page} text"}) for page in pages]
+
+    def get_object(self, Bucket, Key):
+        return {"Body": FakeBody(self.lines)}
+
+
+class RecordingWriter(BulkWriter):
+    """Accepts every operation without OpenSearch and remembers the indexed ids."""
+
+    def __init__(self):
+        super().__init__(min_bytes=1 << 20, max_bytes=1 << 22)
+        self.ids = []
+
+    async def _send(self, ops):
+        for action, source in ops:
+            if source is not None:
+                self.ids.append(orjson.loads(action)["index"]["_id"])
+                self.indexed += 1
+        return []
+
+
+class MemoryState:
+    def __init__(self):
+        self.pages = {}
+
+    async def get_many(self, page_ids):
+        return {pid: self.pages[pid] for pid in page_ids if pid in self.pages}
+
+    async def put_many(self, pages):
+        self.pages.update(pages)
+
+
+def failing_embedder(fail_calls):
+    calls = 0
+
+    async def embed(texts):
+        nonlocal calls
+        calls += 1
+        if calls in fail_calls:
+            raise RuntimeError("provider error")
+        return [[0.1, 0.2] for _ in texts]
+    return embed
+
+
+def run_indexer(monkeypatch, pages, fail_calls=()):
+    monkeypatch.setattr(ingest, "invoke_embedding_batch", failing_embedder(set(fail_calls)))
+    writer, state = RecordingWriter(), MemoryState()
+
+    async def run():
+        with ThreadPoolExecutor(1) as pool:
+            indexer = ObjectIndexer(pool, s3=FakeS3(pages), writer=writer, embed_batch_size=2,
+                                    embed_concurrency=1, skip_unchanged=True, state=state)
+            return await indexer.run("bucket", "key")
+    return run, writer, state
+
+
+def test_all_batches_indexed(monkeypatch):
+    run, writer, state = run_indexer(monkeypatch, range(6))
+    stats = asyncio.run(run())
+    assert stats["indexed"] == 6
+    assert set(state.pages) == {page_id("doc", p) for p in range(6)}
+
+
+def test_failed_embedding_batch_fails_the_object(monkeypatch):
+    run, writer, state = run_indexer(monkeypatch, range(6), fail_calls={1})
+    with pytest.raises(RuntimeError, match="1 embedding batches failed"):
+        asyncio.run(run())
+    assert len(writer.ids) == 4
+
+
+def test_page_state_only_for_indexed_pages(monkeypatch):
+    run, writer, state = run_indexer(monkeypatch, range(6), fail_calls={1})
+    with pytest.raises(RuntimeError):
+        asyncio.run(run())
+    # the first batch (pages 0 and 1) failed; those pages must be re-embedded on retry
+    assert set(state.pages) == {page_id("doc", p) for p in range(2, 6)}
+
+
+def test_no_page_state_when_bulk_fails(monkeypatch):
+    run, writer, state = run_indexer(monkeypatch, range(6))
+
+    async def rejected(ops):
+        raise RuntimeError("_bulk failed: 400")
+    monkeypatch.setattr(writer, "_send", rejected)
+    with pytest.raises(RuntimeError, match="_bulk failed"):
+        asyncio.run(run())
+    assert state.pages == {}
+
+
+def test_content_hash_scoped_to_index_and_vector_type():
+    base = content_hash("some  text", data_type="float", index="a")
+    assert content_hash("some text", data_type="float", index="a") == base
+    assert content_hash("some text", data_type="byte", index="a") != base
+    assert content_hash("some text", data_type="float", index="b") != base
+
+
+def test_worker_counts_unhandled_message_errors(monkeypatch):
+    from text_rag.metrics import INGEST_MESSAGES
+
+    async def run():
+        worker = ingest.IngestWorker(sqs=object(), s3=object(), max_in_flight=1, pool_workers=1)
+
+        async def dlq_unavailable(message, reason):
+            raise RuntimeError("dlq unavailable")
+        monkeypatch.setattr(worker, "_dead_letter", dlq_unavailable)
+        await worker._slots.acquire()
+        task = asyncio.create_task(worker.handle_message({"ReceiptHandle": "r", "Body": "not json"}))
+        worker._tasks.add(task)
+        task.add_done_callback(worker._done)
+        await asyncio.gather(task, return_exceptions=True)
+        await asyncio.sleep(0)
+        worker.pool.shutdown()
+        return worker
+
+    before = INGEST_MESSAGES.labels("error")._value.get()
+    worker = asyncio.run(run())
+    assert INGEST_MESSAGES.labels("error")._value.get() == before + 1
+    assert not worker._tasks and not worker._slots.locked()
@@ -0,0 +1,98 @@
+import asyncio
+
+import pytest
+
+from text_rag import local_cache
+from text_rag.local_cache import ByteLRU, SingleFlight
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(local_cache.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_evicts_least_recently_used_by_bytes(clock):
+    lru = ByteLRU(max_bytes=30, default_ttl=60)
+    for key in ("a", "b", "c"):
+        lru.set(key, b"x" * 9)  # 10 bytes with the key
+    assert lru.get("a") == b"x" * 9
+    lru.set("d", b"x" * 9)
+    assert lru.get("b") is None
+    assert [lru.get(k) is not None for k in ("a", "c", "d")] == [True, True, True]
+    assert lru.stats()["size_bytes"] == 30
+    assert lru.stats()["evictions"] == 1
+
+
+def test_oversized_values_are_not_cached(clock):
+    lru = ByteLRU(max_bytes=10, default_ttl=60)
+    lru.set("a", b"x" * 20)
+    assert lru.get("a") is None
+    assert lru.stats()["size_bytes"] == 0
+
+
+def test_ttl_is_capped_by_default(clock):
+    lru = ByteLRU(max_bytes=100, default_ttl=60)
+    lru.set("short", b"1", ttl=5)
+    lru.set("long", b"2", ttl=600)
+    clock[0] += 10
+    assert lru.get("short") is None
+    assert lru.get("long") == b"2"
+    clock[0] += 60
+    assert lru.get("long") is None
+    assert lru.stats()["entries"] == 0
+    assert (lru.hits, lru.misses) == (1, 2)
+
+
+def test_single_flight_coalesces_concurrent_calls():
+    flight = SingleFlight()
+    calls = 0
+
+    async def work():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return calls
+
+    async def run():
+        return await asyncio.gather(*(flight.do("q", work) for _ in range(5)))
+
+    assert asyncio.run(run()) == [1] * 5
+    assert flight.stats() == {"in_flight": 0, "executions": 1, "coalesced": 4}
+
+
+def test_single_flight_shares_errors_and_forgets_the_key():
+    flight = SingleFlight()
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("provider error")
+
+    async def ok():
+        return "ok"
+
+    async def run():
+        results = await asyncio.gather(flight.do("q", fail), flight.do("q", fail), return_exceptions=True)
+        return results, await flight.do("q", ok)
+
+    results, retried = asyncio.run(run())
+    assert [str(r) for r in results] == ["provider error"] * 2
+    assert retried == "ok"
+
+
+def test_cancelled_follower_does_not_cancel_the_leader():
+    flight = SingleFlight()
+
+    async def work():
+        await asyncio.sleep(0.02)
+        return "done"
+
+    async def run():
+        leader = asyncio.ensure_future(flight.do("q", work))
+        follower = asyncio.ensure_future(flight.do("q", work))
+        await asyncio.sleep(0)
+        follower.cancel()
+        return await leader
+
+    assert asyncio.run(run()) == "done"
@@ -0,0 +1,32 @@
+import asyncio
+
+import pytest
+
+from text_rag import reranker
+from text_rag.reranker import PartialRerank, sharded_rerank
+
+CANDIDATES = [{"doc_id": i, "text": f"chunk {i}", "score": 0.9 - i / 100} for i in range(9)]
+
+
+async def by_doc_id(query, docs):
+    return [d["doc_id"] / 10 for d in docs]
+
+
+async def middle_shard_fails(query, docs):
+    if docs[0]["doc_id"] == 3:
+        raise RuntimeError("provider error")
+    return await by_doc_id(query, docs)
+
+
+def test_merges_shards_by_relevance(monkeypatch):
+    monkeypatch.setattr(reranker, "RERANK_SHARD_SIZE", 3)
+    assert asyncio.run(sharded_rerank("q", [dict(c) for c in CANDIDATES], 4, by_doc_id)) == [8, 7, 6, 5]
+
+
+def test_failed_shard_ranks_below_scored_candidates(monkeypatch):
+    monkeypatch.setattr(reranker, "RERANK_SHARD_SIZE", 3)
+    with pytest.raises(PartialRerank) as raised:
+        asyncio.run(sharded_rerank("q", [dict(c) for c in CANDIDATES], 8, middle_shard_fails))
+    # kNN scores (0.87..0.85) would outrank every relevance score if they were merged
+    assert raised.value.ranked == [8, 7, 6, 2, 1, 0, 3, 4]
+    assert raised.value.failed == 1
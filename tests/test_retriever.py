@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+
+from text_rag import retriever, utils
+from text_rag.ingest import index_definition
+from text_rag.local_index import LocalVectorIndex, build_index
+from text_rag.utils import cosine_score, knn_engine
+
+
+@pytest.mark.parametrize("cosine, lucene, faiss", [(1.0, 1.0, 1.0), (0.0, 0.5, 0.5), (0.5, 0.75, 2 / 3),
+                                                   (-1.0, 0.0, 1 / 3)])
+def test_cosine_score_matches_engine_scale(cosine, lucene, faiss):
+    assert cosine_score(cosine, "lucene") == pytest.approx(lucene)
+    assert cosine_score(cosine, "faiss") == pytest.approx(faiss)
+    assert cosine_score(cosine, "nmslib") == pytest.approx(faiss)
+
+
+@pytest.mark.parametrize("data_type", ["float", "byte"])
+def test_engine_follows_index_definition(data_type):
+    engine = index_definition(dim=4, data_type=data_type)["mappings"]["properties"]["embedding"]["method"]["engine"]
+    assert knn_engine(data_type) == engine
+
+
+@pytest.mark.parametrize("data_type, expected", [("float", 1 / 1.5), ("byte", 0.75)])
+def test_rescore_uses_index_scale(monkeypatch, data_type, expected):
+    monkeypatch.setattr(utils, "VECTOR_DATA_TYPE", data_type)
+    monkeypatch.setattr(retriever, "VECTOR_MIN_SCORE", 0.0)
+    # cos 60 degrees = 0.5
+    hits = [{"doc_id": "a", "text": "a", "score": 0.1, "embedding": [0.5, np.sqrt(3) / 2]}]
+    assert retriever.rescore([1.0, 0.0], hits, 1)[0]["score"] == pytest.approx(expected)
+
+
+@pytest.mark.parametrize("data_type, expected", [("float", 1 / 1.5), ("byte", 0.75)])
+def test_local_index_uses_index_scale(monkeypatch, tmp_path, data_type, expected):
+    monkeypatch.setattr(utils, "VECTOR_DATA_TYPE", data_type)
+    build_index([{"doc_id": "a", "text": "a", "embedding": [0.5, np.sqrt(3) / 2]}], str(tmp_path))
+    hits = LocalVectorIndex(str(tmp_path)).search([1.0, 0.0], 1)
+    assert hits[0]["score"] == pytest.approx(expected, rel=1e-5)
+
+
+def hits(*doc_ids):
+    return [{"doc_id": d, "text": d, "score": 1.0} for d in doc_ids]
+
+
+def test_rrf_rewards_agreement_between_lists():
+    fused = retriever.reciprocal_rank_fusion([hits("a", "b", "c"), hits("c", "b", "d")], [1.0, 1.0], 4, rrf_k=60)
+    # b is second in both lists; c is first in one and third in the other
+    assert [h["doc_id"] for h in fused] == ["c", "b", "a", "d"]
+    assert fused[0]["score"] == pytest.approx(1 / 61 + 1 / 63)
+
+
+def test_rrf_weights_and_top_k():
+    fused = retriever.reciprocal_rank_fusion([hits("a", "b"), hits("b", "a")], [1.0, 2.0], 1, rrf_k=60)
+    assert [h["doc_id"] for h in fused] == ["b"]
+
+
+def test_rrf_keeps_the_first_copy_of_a_hit():
+    vector_leg = [{"doc_id": "a", "text": "a", "score": 0.9, "embedding": [1.0]}]
+    fused = retriever.reciprocal_rank_fusion([vector_leg, hits("a")], [1.0, 1.0], 1)
+    assert fused[0]["embedding"] == [1.0]
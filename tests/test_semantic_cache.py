@@ -0,0 +1,51 @@
+from text_rag import semantic_cache
+from text_rag.semantic_cache import SemanticCache
+
+RESPONSE = {"answer": "42"}
+
+
+def make_cache(**kwargs):
+    return SemanticCache(max_entries=4, threshold=0.95, near_miss_margin=0.1, **kwargs)
+
+
+def test_hit_within_scope():
+    cache = make_cache()
+    cache.add("q", [1.0, 0.0], RESPONSE, scope="5:3")
+    assert cache.lookup([1.0, 0.01], scope="5:3") == RESPONSE
+    assert cache.lookup([1.0, 0.01], scope="10:3") is None
+
+
+def test_entries_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(semantic_cache.time, "monotonic", lambda: now[0])
+    cache = make_cache(ttl=60)
+    cache.add("q", [1.0, 0.0], RESPONSE)
+    now[0] += 61
+    assert cache.lookup([1.0, 0.0]) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_other_version_never_matches():
+    old, new = make_cache(version="index-a"), make_cache(version="index-b")
+    old.add("q", [1.0, 0.0], RESPONSE)
+    # same slots, different version: as if the process switched index or model
+    new._matrix, new._slots, new._free = old._matrix, old._slots, old._free
+    assert new.lookup([1.0, 0.0]) is None
+
+
+def test_near_misses_are_counted_as_misses():
+    cache = make_cache()
+    cache.add("q", [1.0, 0.0], RESPONSE)
+    assert cache.lookup([1.0, 0.4]) is None  # cosine ~0.93: within the margin
+    assert cache.lookup([0.0, 1.0]) is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["near_misses"]) == (0, 2, 1)
+
+
+def test_clear_accepts_a_new_dimension():
+    cache = make_cache()
+    cache.add("q", [1.0, 0.0], RESPONSE)
+    cache.clear()
+    assert cache.lookup([1.0, 0.0]) is None
+    cache.add("q", [1.0, 0.0, 0.0], RESPONSE)
+    assert cache.lookup([1.0, 0.0, 0.0]) == RESPONSE
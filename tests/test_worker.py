@@ -0,0 +1,21 @@
+import asyncio
+
+import pytest
+
+from text_rag import worker
+from text_rag.worker import EmbeddingFailed
+
+
+async def no_response(query, k, n):
+    return None
+
+
+async def no_embedding(query):
+    return None
+
+
+def test_missing_embedding_is_a_query_error(monkeypatch):
+    monkeypatch.setattr(worker, "get_cached_response", no_response)
+    monkeypatch.setattr(worker, "embed_query", no_embedding)
+    with pytest.raises(EmbeddingFailed):
+        asyncio.run(worker._prepare("q", 5, 3))